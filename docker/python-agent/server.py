@@ -2,38 +2,108 @@
 Simple HTTP server to expose Python agents via REST API
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
 import json
+import queue
 import sys
 import os
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(data) -> bytes:
+    """Encode a JSON payload"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+# Hot fixed-shape responses are assembled from pre-encoded fragments, so
+# only the variable value goes through the encoder
+_EXECUTE_PREFIX = b'{"status":"success","response":'
+_CHUNK_PREFIX = b'{"chunk":'
+_STREAM_SUCCESS_LINE = _dumps({'status': 'success'}) + b'\n'
+
 
 # Add agents to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
 
-from chat_agent import ChatAgent
+# Larger request bodies are rejected before any of it is read
+MAX_BODY_BYTES = int(os.getenv('MAX_BODY_BYTES', '1048576'))
+
+
+class RequestBodyError(Exception):
+    """Request body can't be accepted; carries the HTTP status to return"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
 
 
 class AgentRequestHandler(BaseHTTPRequestHandler):
     """HTTP request handler for agent"""
 
+    # Keep connections open between requests so chatty clients don't pay
+    # for a new TCP handshake on every call
+    protocol_version = 'HTTP/1.1'
+
+    # A kept-alive connection holds a pool worker for as long as it's open,
+    # so a few idle clients could starve /health and new requests; drop a
+    # connection once it has been idle (or stalled mid-request) this long
+    timeout = float(os.getenv('KEEPALIVE_TIMEOUT', '2'))
+
     # Initialize agent (shared across requests)
     agent = None
 
+    # Requests are served on their own threads; the shared agent (and its
+    # conversation history) is only ever touched under this lock so a slow
+    # LLM call doesn't block /health or /history. Turns of the one shared
+    # conversation still run one at a time, since each reply depends on the
+    # last; responses are written to clients outside the lock.
+    agent_lock = threading.Lock()
+
+    # Complete /health responses (status line, headers and body), keyed by
+    # (agent name, connection closing). The agent name changes once, when
+    # the agent is first initialized, which also picks the new entry.
+    health_responses = {}
+
     @classmethod
     def initialize_agent(cls):
         """Initialize the agent"""
-        if cls.agent is None:
-            cls.agent = ChatAgent({
-                'system_prompt': os.getenv('SYSTEM_PROMPT', 'You are a helpful assistant.'),
-                'max_history': int(os.getenv('MAX_HISTORY', '20'))
-            })
-            cls.agent.initialize()
+        if cls.agent is not None:
+            return
+
+        with cls.agent_lock:
+            if cls.agent is None:
+                # Imported here so the server binds and answers /health
+                # without loading the agent stack
+                from chat_agent import ChatAgent
+
+                agent = ChatAgent({
+                    'system_prompt': os.getenv('SYSTEM_PROMPT', 'You are a helpful assistant.'),
+                    'max_history': int(os.getenv('MAX_HISTORY', '20'))
+                })
+                agent.initialize()
+                cls.agent = agent
 
     def do_POST(self):
         """Handle POST requests"""
         if self.path == '/execute':
             self._handle_execute()
-        elif self.path == '/health':
+            return
+        if self.path == '/execute/stream':
+            self._handle_execute_stream()
+            return
+
+        # The body is never read on these paths, so the connection can't
+        # be reused for the next request
+        self.close_connection = True
+        if self.path == '/health':
             self._handle_health()
         else:
             self._send_error(404, 'Not Found')
@@ -47,13 +117,40 @@ class AgentRequestHandler(BaseHTTPRequestHandler):
         else:
             self._send_error(404, 'Not Found')
 
+    def _read_json_body(self):
+        """
+        Read and decode the JSON request body
+
+        Raises:
+            RequestBodyError: If Content-Length is missing, invalid or over
+                MAX_BODY_BYTES, or the body ends early
+        """
+        try:
+            content_length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            raise RequestBodyError(400, 'Invalid Content-Length')
+
+        if content_length <= 0:
+            raise RequestBodyError(400, 'Missing request body')
+        if content_length > MAX_BODY_BYTES:
+            raise RequestBodyError(413, 'Payload too large')
+
+        # Read straight into one preallocated buffer
+        body = bytearray(content_length)
+        view = memoryview(body)
+        received = 0
+        while received < content_length:
+            count = self.rfile.readinto(view[received:])
+            if not count:
+                raise RequestBodyError(400, 'Incomplete request body')
+            received += count
+
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+
     def _handle_execute(self):
         """Execute agent with provided message"""
         try:
-            # Read request body
-            content_length = int(self.headers['Content-Length'])
-            body = self.rfile.read(content_length)
-            data = json.loads(body)
+            data = self._read_json_body()
 
             message = data.get('message')
             if not message:
@@ -62,38 +159,127 @@ class AgentRequestHandler(BaseHTTPRequestHandler):
 
             # Execute agent
             self.initialize_agent()
-            response = self.agent.execute(message)
+            with self.agent_lock:
+                response = self.agent.execute(message)
 
             # Send response
-            self._send_json({
-                'status': 'success',
-                'response': response
-            })
+            self._send_payload(_EXECUTE_PREFIX + _dumps(response) + b'}')
+
+        except RequestBodyError as e:
+            # The body was not (fully) read, so the connection can't be reused
+            self.close_connection = True
+            self._send_error(e.status, str(e))
 
         except Exception as e:
+            # The body may only have been partially read
+            self.close_connection = True
             self._send_error(500, str(e))
 
+    def _handle_execute_stream(self):
+        """
+        Execute agent and stream the response as it's generated
+
+        The body is newline-delimited JSON sent with chunked transfer
+        encoding: one {"chunk": ...} line per response chunk, then a final
+        {"status": ...} line.
+        """
+        try:
+            data = self._read_json_body()
+        except RequestBodyError as e:
+            self.close_connection = True
+            self._send_error(e.status, str(e))
+            return
+        except Exception as e:
+            self.close_connection = True
+            self._send_error(400, str(e))
+            return
+
+        message = data.get('message')
+        if not message:
+            self._send_error(400, 'Missing message field')
+            return
+
+        self.initialize_agent()
+
+        # The turn runs under the lock on its own thread and hands lines over
+        # through a queue, so a slow client never holds up other requests
+        lines = queue.SimpleQueue()
+        threading.Thread(target=self._stream_turn, args=(message, lines), daemon=True).start()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        while True:
+            line = lines.get()
+            if line is None:
+                break
+            self._write_chunk(line)
+
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _stream_turn(self, message, lines):
+        """Run a streamed turn, queueing each response line and then None"""
+        with self.agent_lock:
+            try:
+                for chunk in self.agent.execute(message, stream=True):
+                    lines.put(_CHUNK_PREFIX + _dumps(chunk) + b'}\n')
+                lines.put(_STREAM_SUCCESS_LINE)
+            except Exception as e:
+                # Headers are already out, so report the failure in-band
+                lines.put(_dumps({'status': 'error', 'message': str(e)}) + b'\n')
+        lines.put(None)
+
+    def _write_chunk(self, data: bytes):
+        """Write one chunk of a chunked-encoded response"""
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
     def _handle_health(self):
         """Health check endpoint"""
-        self._send_json({
-            'status': 'healthy',
-            'agent': self.agent.name if self.agent else 'not initialized'
-        })
+        agent_name = self.agent.name if self.agent else 'not initialized'
+        key = (agent_name, self.close_connection)
+
+        response = self.health_responses.get(key)
+        if response is None:
+            body = _dumps({'status': 'healthy', 'agent': agent_name})
+            # Date/Server headers are left out so the bytes never go stale
+            response = (
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: application/json\r\n'
+                b'Content-Length: %d\r\n'
+                b'Connection: %s\r\n'
+                b'\r\n%s'
+            ) % (len(body), b'close' if self.close_connection else b'keep-alive', body)
+            self.health_responses[key] = response
+
+        # Probes hit this constantly, so it's a single write
+        self.log_request(200)
+        self.wfile.write(response)
 
     def _handle_history(self):
         """Get chat history"""
         self.initialize_agent()
+        with self.agent_lock:
+            history = list(self.agent.get_history())
         self._send_json({
             'status': 'success',
-            'history': self.agent.get_history()
+            'history': history
         })
 
     def _send_json(self, data, status=200):
         """Send JSON response"""
+        self._send_payload(_dumps(data), status)
+
+    def _send_payload(self, payload: bytes, status=200):
+        """Send an already-encoded JSON response body"""
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Connection', 'close' if self.close_connection else 'keep-alive')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(payload)
 
     def _send_error(self, status, message):
         """Send error response"""
@@ -107,13 +293,33 @@ class AgentRequestHandler(BaseHTTPRequestHandler):
         print(f"{self.address_string()} - {format % args}")
 
 
-def run_server(port=8080):
+class PooledHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that serves connections on a fixed-size thread pool"""
+
+    def __init__(self, server_address, handler_class, workers):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='agent-server'
+        )
+
+    def process_request(self, request, client_address):
+        """Queue the connection for the pool instead of spawning a thread"""
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+def run_server(port=8080, workers=8):
     """Run the HTTP server"""
     print(f"Starting agent server on port {port}...")
-    server = HTTPServer(('0.0.0.0', port), AgentRequestHandler)
-    print(f"Server running at http://0.0.0.0:{port}")
+    server = PooledHTTPServer(('0.0.0.0', port), AgentRequestHandler, workers)
+    print(f"Server running at http://0.0.0.0:{port} ({workers} workers)")
     print("Endpoints:")
     print("  POST /execute - Execute agent")
+    print("  POST /execute/stream - Execute agent, streaming the response")
     print("  GET  /health  - Health check")
     print("  GET  /history - Get chat history")
 
@@ -121,9 +327,11 @@ def run_server(port=8080):
         server.serve_forever()
     except KeyboardInterrupt:
         print("\nShutting down server...")
-        server.shutdown()
+    finally:
+        server.server_close()
 
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', '8080'))
-    run_server(port)
+    workers = int(os.getenv('WORKERS', '8'))
+    run_server(port, workers)
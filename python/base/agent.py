@@ -4,10 +4,165 @@ Provides common functionality for all Python agents
 """
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+import logging.handlers
+import atexit
 import json
+import math
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+    """Encode bounded histories (deques) as lists"""
+    if isinstance(obj, deque):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Runs of digits too long for orjson, which reads integers beyond 64 bits as
+# (lossy) floats
+_LONG_DIGITS = re.compile(rb'\d{19}')
+
+
+def _has_non_finite(obj: Any) -> bool:
+    """Whether obj holds a NaN or infinite float, which orjson would write as null"""
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, float):
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, deque)):
+            stack.extend(item)
+    return False
+
+
+def _dumps(obj: Any, indent: bool = True) -> bytes:
+    """Encode obj as JSON, using orjson when it's installed and can encode obj exactly"""
+    if orjson is not None and not _has_non_finite(obj):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_json_default, option=option)
+        except TypeError:
+            # e.g. integers beyond 64 bits, which json handles
+            pass
+    return json.dumps(obj, indent=2 if indent else None, default=_json_default).encode()
+
+
+def _loads(data: bytes) -> Any:
+    """Decode JSON, using orjson when it's installed and can decode data exactly"""
+    if orjson is not None and not _LONG_DIGITS.search(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. the NaN and Infinity literals json writes
+            pass
+    return json.loads(data)
+
+
+# Shared by every agent's handler; loggers already set up are remembered
+# so later instances with the same name skip handler setup
+_LOG_FORMATTER = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_configured_loggers = set()
+
+# With config['async_logging'], agents log through a queue drained by one
+# background listener, so formatting and stream I/O happen off the caller's
+# thread
+_log_queue = None
+_log_listener_lock = threading.Lock()
+
+
+def _queue_log_handler() -> logging.Handler:
+    """Get a handler feeding the shared background log listener"""
+    global _log_queue
+    with _log_listener_lock:
+        if _log_queue is None:
+            _log_queue = queue.SimpleQueue()
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(_LOG_FORMATTER)
+            listener = logging.handlers.QueueListener(_log_queue, stream_handler)
+            listener.start()
+            # Flush whatever is still queued at shutdown
+            atexit.register(listener.stop)
+    return logging.handlers.QueueHandler(_log_queue)
+
+
+# Read-only config shared by every agent created without one
+_DEFAULT_CONFIG = MappingProxyType({'log_level': logging.INFO})
+
+
+class _StateDict(dict):
+    """
+    Agent state dictionary that tracks which keys have been written
+
+    Every change bumps ``version`` and records it against the key in
+    ``key_versions``, so consumers can compare versions to find what changed
+    since they last looked. The dict can't see a value changed in place
+    (e.g. ``state['messages'].append(...)``); call ``mark_dirty(key)`` after
+    such an edit.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self.key_versions: Dict[Any, int] = {}
+        for key in self:
+            self._touch(key)
+
+    def _touch(self, key) -> None:
+        self.version += 1
+        self.key_versions[key] = self.version
+
+    def mark_dirty(self, key) -> None:
+        """Record that the value under key was changed in place"""
+        self._touch(key)
+
+    def __setitem__(self, key, value):
+        self._touch(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._touch(key)
+        super().__delitem__(key)
+
+    def setdefault(self, key, default=None):
+        self._touch(key)
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        self._touch(key)
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._touch(key)
+        return key, value
+
+    def clear(self):
+        for key in self:
+            self._touch(key)
+        super().clear()
 
 
 class BaseAgent(ABC):
@@ -22,6 +177,17 @@ class BaseAgent(ABC):
     - Lifecycle hooks
     """
 
+    # Base attributes live in slots for cheaper access. Subclasses that don't
+    # declare __slots__ still get a __dict__ for their own attributes.
+    __slots__ = (
+        'name', 'config', 'logger', '_initialized',
+        '_state',
+        '_journal_path', '_journal_version', '_journal_prefix', '_journal_saves',
+        '_prefix_tokens', '_prefix_cache_id',
+        '_sem_cache', '_uncached_execute',
+        '_ts_cache',
+    )
+
     def __init__(self, config: Optional[Dict[str, Any]] = None, name: Optional[str] = None):
         """
         Initialize the agent
@@ -31,23 +197,94 @@ class BaseAgent(ABC):
             name: Agent name (defaults to class name)
         """
         self.name = name or self.__class__.__name__
-        self.config = config or {}
+        self.config = config if config else _DEFAULT_CONFIG
         self.state = {}
+        self._prefix_tokens: List[int] = []
+        self._prefix_cache_id: Optional[str] = None
+        self._ts_cache: Tuple[int, str] = (0, '')
         self.logger = self._setup_logger()
         self._initialized = False
 
+        self._sem_cache = None
+        cache_config = self.config.get('semantic_cache') or {}
+        if cache_config.get('enabled'):
+            self._enable_semantic_cache(cache_config)
+
+    def _enable_semantic_cache(self, cache_config: Dict[str, Any]) -> None:
+        """Route execute() through the semantic response cache"""
+        try:
+            from .semantic_cache import SemanticCache
+            self._sem_cache = SemanticCache.for_agent(
+                cache_config.get('agent_id', self.name),
+                cache_config
+            )
+        except ImportError:
+            self.logger.warning(
+                "Semantic cache disabled. Install with: pip install sentence-transformers hnswlib"
+            )
+            return
+
+        # Shadow the class method on this instance only, so agents without
+        # the cache pay nothing
+        self._uncached_execute = self.execute
+        self.execute = self._semantic_execute
+
+    def _semantic_execute(self, *args, **kwargs) -> Any:
+        """execute() wrapper that serves near-duplicate text inputs from the cache"""
+        # Only plain text calls are cacheable; anything else goes straight through
+        if kwargs or len(args) != 1 or not isinstance(args[0], str):
+            return self._uncached_execute(*args, **kwargs)
+
+        embedding = self._sem_cache.embed(args[0])
+        hit, response = self._sem_cache.lookup(embedding)
+        if hit:
+            self.logger.debug("Semantic cache hit")
+            return response
+
+        response = self._uncached_execute(*args)
+        self._sem_cache.insert(embedding, response)
+        return response
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """Persistent state dictionary"""
+        return self._state
+
+    @state.setter
+    def state(self, value: Dict[str, Any]) -> None:
+        self._state = _StateDict(value)
+
+        # The on-disk journal described the old dict
+        self._journal_path: Optional[str] = None
+        self._journal_version = 0
+        self._journal_prefix: Optional[str] = None
+        self._journal_saves = 0
+
+    def update_config(self, **changes: Any) -> None:
+        """
+        Change config values
+
+        Agents created without a config share a read-only default, so it is
+        copied on the first change.
+        """
+        if isinstance(self.config, MappingProxyType):
+            self.config = dict(self.config)
+        self.config.update(changes)
+
     def _setup_logger(self) -> logging.Logger:
         """Setup logger for this agent"""
         logger = logging.getLogger(self.name)
         logger.setLevel(self.config.get('log_level', logging.INFO))
 
-        if not logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
+        if self.name not in _configured_loggers:
+            if not logger.handlers:
+                if self.config.get('async_logging'):
+                    handler = _queue_log_handler()
+                else:
+                    handler = logging.StreamHandler()
+                    handler.setFormatter(_LOG_FORMATTER)
+                logger.addHandler(handler)
+            _configured_loggers.add(self.name)
 
         return logger
 
@@ -56,10 +293,10 @@ class BaseAgent(ABC):
         if self._initialized:
             return
 
-        self.logger.info(f"Initializing {self.name}")
+        self.logger.info("Initializing %s", self.name)
         self._initialize()
         self._initialized = True
-        self.logger.info(f"{self.name} initialized successfully")
+        self.logger.info("%s initialized successfully", self.name)
 
     @abstractmethod
     def _initialize(self) -> None:
@@ -77,7 +314,7 @@ class BaseAgent(ABC):
 
     def cleanup(self) -> None:
         """Cleanup resources (called when agent is done)"""
-        self.logger.info(f"Cleaning up {self.name}")
+        self.logger.info("Cleaning up %s", self.name)
         self._cleanup()
         self._initialized = False
 
@@ -85,27 +322,148 @@ class BaseAgent(ABC):
         """Override this to add custom cleanup logic"""
         pass
 
+    def bind_prefix_cache(self, cache_id: Optional[str], tokens: Optional[List[int]] = None) -> None:
+        """
+        Record the prompt prefix the LLM backend has already processed
+
+        Subclasses call this after each turn with the provider's cache handle
+        (and token ids, if the backend exposes them) so the next call can
+        reuse the cached prefix and only send the new tokens.
+
+        Args:
+            cache_id: Provider cache handle (None to clear)
+            tokens: Token ids covered by the cached prefix
+        """
+        self._prefix_cache_id = cache_id
+        self._prefix_tokens = list(tokens) if tokens else []
+
+    def active_prefix(self) -> Tuple[List[int], Optional[str]]:
+        """Get the cached prefix tokens and cache handle bound to this agent"""
+        return self._prefix_tokens, self._prefix_cache_id
+
+    def _timestamp(self) -> str:
+        """
+        Current time for state snapshots, formatted once per second
+
+        Set config['precise_timestamps'] for microsecond timestamps.
+        """
+        if self.config.get('precise_timestamps'):
+            return datetime.now().isoformat()
+
+        now = int(time.time())
+        if now != self._ts_cache[0]:
+            self._ts_cache = (now, datetime.fromtimestamp(now).isoformat())
+        return self._ts_cache[1]
+
     def get_state(self) -> Dict[str, Any]:
         """Get current agent state"""
         return {
             'name': self.name,
             'initialized': self._initialized,
             'state': self.state,
-            'timestamp': datetime.now().isoformat()
+            'prefix_cache_id': self._prefix_cache_id,
+            'timestamp': self._timestamp()
         }
 
     def save_state(self, filepath: str) -> None:
-        """Save agent state to file"""
-        with open(filepath, 'w') as f:
-            json.dump(self.get_state(), f, indent=2)
-        self.logger.info(f"State saved to {filepath}")
+        """
+        Save agent state to file
+
+        With config['state_journal'] enabled, saves after the first only
+        append the state keys that changed to a journal next to the file
+        (``<filepath>.log``). A full snapshot is rewritten every
+        config['state_journal_compact_every'] saves (default 100).
+
+        The journal only sees keys that were assigned or passed to
+        ``state.mark_dirty()``; a value edited in place without marking it
+        reaches disk at the next full snapshot.
+        """
+        if self.config.get('state_journal'):
+            compact_every = self.config.get('state_journal_compact_every', 100)
+            if (
+                self._journal_path == filepath
+                and self._journal_saves < compact_every
+                and os.path.exists(filepath)
+            ):
+                self._append_journal(filepath + '.log')
+                self.logger.info("State changes journaled to %s.log", filepath)
+                return
+
+        self.compact_state(filepath)
+        self.logger.info("State saved to %s", filepath)
+
+    def compact_state(self, filepath: str) -> None:
+        """Write a full state snapshot and discard its journal"""
+        payload = _dumps(self.get_state())
+        with open(filepath, 'wb') as f:
+            f.write(payload)
+
+        journal_path = filepath + '.log'
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+
+        self._mark_journaled(filepath)
+
+    def _append_journal(self, journal_path: str) -> None:
+        """Append one line per state key changed since the last save"""
+        timestamp = self._timestamp()
+        lines = []
+
+        for key, version in self._state.key_versions.items():
+            if version <= self._journal_version:
+                continue
+            if key in self._state:
+                entry = {'op': 'set', 'k': key, 'v': self._state[key], 'ts': timestamp}
+            else:
+                entry = {'op': 'del', 'k': key, 'ts': timestamp}
+            lines.append(_dumps(entry, indent=False))
+
+        if self._prefix_cache_id != self._journal_prefix:
+            entry = {'op': 'prefix', 'v': self._prefix_cache_id, 'ts': timestamp}
+            lines.append(_dumps(entry, indent=False))
+
+        if lines:
+            with open(journal_path, 'ab') as f:
+                f.write(b'\n'.join(lines) + b'\n')
+
+        self._journal_version = self._state.version
+        self._journal_prefix = self._prefix_cache_id
+        self._journal_saves += 1
+
+    def _mark_journaled(self, filepath: str) -> None:
+        """Record that the file at filepath matches the current state"""
+        self._journal_path = filepath
+        self._journal_version = self._state.version
+        self._journal_prefix = self._prefix_cache_id
+        self._journal_saves = 0
 
     def load_state(self, filepath: str) -> None:
-        """Load agent state from file"""
-        with open(filepath, 'r') as f:
-            saved_state = json.load(f)
-            self.state = saved_state.get('state', {})
-        self.logger.info(f"State loaded from {filepath}")
+        """Load agent state from file, replaying its journal if there is one"""
+        with open(filepath, 'rb') as f:
+            saved_state = _loads(f.read())
+
+        state = saved_state.get('state', {})
+        prefix_cache_id = saved_state.get('prefix_cache_id')
+
+        journal_path = filepath + '.log'
+        if os.path.exists(journal_path):
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = _loads(line)
+                    if entry['op'] == 'set':
+                        state[entry['k']] = entry['v']
+                    elif entry['op'] == 'del':
+                        state.pop(entry['k'], None)
+                    elif entry['op'] == 'prefix':
+                        prefix_cache_id = entry['v']
+
+        self.state = state
+        # Token ids aren't persisted; the backend re-derives them from the handle
+        self.bind_prefix_cache(prefix_cache_id)
+        self._mark_journaled(filepath)
+        self.logger.info("State loaded from %s", filepath)
 
     def __enter__(self):
         """Context manager entry"""
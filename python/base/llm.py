@@ -0,0 +1,33 @@
+"""
+Shared LLM clients
+
+Clients are created once per API key and reused by every agent, so
+re-initializing an agent (or running many agents) doesn't set up a new
+HTTP connection pool each time.
+"""
+
+import functools
+
+
+@functools.cache
+def get_anthropic_client(api_key):
+    """
+    Get the shared Anthropic client for an API key
+
+    Raises:
+        ImportError: If the anthropic package is not installed
+    """
+    import anthropic
+    return anthropic.Anthropic(api_key=api_key)
+
+
+@functools.cache
+def get_openai_client(api_key):
+    """
+    Get the shared OpenAI client for an API key
+
+    Raises:
+        ImportError: If the openai package is not installed
+    """
+    import openai
+    return openai.OpenAI(api_key=api_key)
@@ -0,0 +1,110 @@
+"""
+Semantic Cache - Reuse agent responses for near-duplicate inputs
+
+Inputs are embedded with sentence-transformers and looked up in an
+in-process hnswlib index. A cached response is returned when the cosine
+similarity to a previous input reaches the configured threshold.
+
+A hit skips the agent's execute() entirely, so side effects such as
+ChatAgent history updates don't happen for cached responses.
+
+Requires: pip install sentence-transformers hnswlib
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class SemanticCache:
+    """
+    In-process embedding cache of agent responses
+
+    Example:
+        cache = SemanticCache.for_agent('support-bot', {'threshold': 0.9})
+        embedding = cache.embed('Where is my order?')
+        hit, response = cache.lookup(embedding)
+        if not hit:
+            response = agent_call()
+            cache.insert(embedding, response)
+    """
+
+    # agent_id -> cache, so agents sharing an id share entries and
+    # different ids stay isolated
+    _registry: Dict[str, 'SemanticCache'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        model: str = 'all-MiniLM-L6-v2',
+        max_elements: int = 10000
+    ):
+        """
+        Create an empty cache
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            model: sentence-transformers model name
+            max_elements: Initial index capacity (grows as needed)
+
+        Raises:
+            ImportError: If sentence-transformers or hnswlib is not installed
+        """
+        from sentence_transformers import SentenceTransformer
+        import hnswlib
+
+        self.threshold = threshold
+        self._model = SentenceTransformer(model)
+        self._index = hnswlib.Index(space='cosine', dim=self._model.get_sentence_embedding_dimension())
+        self._index.init_index(max_elements=max_elements, ef_construction=200, M=16)
+        self._capacity = max_elements
+        self._responses = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_agent(cls, agent_id: str, config: Optional[Dict[str, Any]] = None) -> 'SemanticCache':
+        """Get (or create) the cache shared by all agents with this id"""
+        with cls._registry_lock:
+            if agent_id not in cls._registry:
+                config = config or {}
+                cls._registry[agent_id] = cls(
+                    threshold=config.get('threshold', 0.95),
+                    model=config.get('model', 'all-MiniLM-L6-v2'),
+                    max_elements=config.get('max_elements', 10000)
+                )
+            return cls._registry[agent_id]
+
+    def embed(self, text: str) -> Any:
+        """Embed text as a normalized vector"""
+        return self._model.encode([text], normalize_embeddings=True)[0]
+
+    def lookup(self, embedding: Any) -> Tuple[bool, Any]:
+        """
+        Find a cached response for an embedding
+
+        Returns:
+            (hit, response) - response is None on a miss
+        """
+        with self._lock:
+            if not self._responses:
+                return False, None
+
+            labels, distances = self._index.knn_query([embedding], k=1)
+
+        label, distance = labels[0][0], distances[0][0]
+        if 1.0 - distance >= self.threshold:
+            return True, self._responses[label]
+        return False, None
+
+    def insert(self, embedding: Any, response: Any) -> None:
+        """Cache a response under an embedding"""
+        with self._lock:
+            if len(self._responses) >= self._capacity:
+                self._capacity *= 2
+                self._index.resize_index(self._capacity)
+
+            self._index.add_items([embedding], [len(self._responses)])
+            self._responses.append(response)
+
+    def __len__(self) -> int:
+        return len(self._responses)
@@ -0,0 +1,113 @@
+"""Tests for BaseAgent state persistence"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from base.agent import BaseAgent
+
+
+class _Agent(BaseAgent):
+    def _initialize(self):
+        self.state['messages'] = []
+        self.state['user'] = 'alice'
+
+    def execute(self, message):
+        self.state['messages'].append(message)
+
+
+class TestStatePersistence(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'state.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _load(self, config=None):
+        agent = _Agent(config)
+        agent.load_state(self.path)
+        return agent
+
+    def test_held_reference_changes_are_saved(self):
+        agent = _Agent()
+        agent.initialize()
+        msgs = agent.state['messages']
+        agent.save_state(self.path)
+        msgs.append('hello')
+        agent.save_state(self.path)
+
+        self.assertEqual(self._load().state['messages'], ['hello'])
+
+    def test_marked_changes_are_journaled(self):
+        config = {'state_journal': True}
+        agent = _Agent(config)
+        agent.initialize()
+        msgs = agent.state['messages']
+        agent.save_state(self.path)
+        msgs.append('hello')
+        agent.state.mark_dirty('messages')
+        agent.save_state(self.path)
+
+        self.assertTrue(os.path.exists(self.path + '.log'))
+        self.assertEqual(self._load(config).state['messages'], ['hello'])
+
+    def test_unchanged_keys_are_not_journaled(self):
+        config = {'state_journal': True}
+        agent = _Agent(config)
+        agent.initialize()
+        for i in range(50):
+            agent.execute(str(i))
+        agent.save_state(self.path)
+        for _ in range(50):
+            agent.save_state(self.path)
+
+        self.assertFalse(os.path.exists(self.path + '.log'))
+
+        agent.state['user'] = 'bob'
+        agent.save_state(self.path)
+        with open(self.path + '.log') as f:
+            lines = f.readlines()
+        self.assertEqual([json.loads(line)['k'] for line in lines], ['user'])
+
+    def test_unmarked_changes_reach_the_next_snapshot(self):
+        config = {'state_journal': True, 'state_journal_compact_every': 1}
+        agent = _Agent(config)
+        agent.initialize()
+        agent.save_state(self.path)
+        agent.state['messages'].append('hello')
+        agent.save_state(self.path)
+        agent.save_state(self.path)
+
+        self.assertEqual(self._load(config).state['messages'], ['hello'])
+
+    def test_snapshot_matches_json_dump(self):
+        agent = _Agent()
+        agent.initialize()
+        agent.execute({'role': 'user', 'content': 'hi'})
+        agent.save_state(self.path)
+        agent.state['user'] = 'bob'
+        agent.save_state(self.path)
+
+        with open(self.path) as f:
+            text = f.read()
+        self.assertEqual(text, json.dumps(json.loads(text), indent=2))
+        self.assertEqual(self._load().state['user'], 'bob')
+
+    def test_non_finite_and_big_numbers_round_trip(self):
+        agent = _Agent()
+        agent.state['stats'] = {'nan': float('nan'), 'inf': float('inf'), 'big': 2 ** 70}
+        agent.save_state(self.path)
+
+        stats = self._load().state['stats']
+        self.assertNotEqual(stats['nan'], stats['nan'])
+        self.assertEqual(stats['inf'], float('inf'))
+        self.assertEqual(stats['big'], 2 ** 70)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,10 +18,160 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from base.agent import BaseAgent
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Tuple
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from heapq import nlargest
+from operator import itemgetter
+import asyncio
+import atexit
+import functools
+import hashlib
 import json
+import threading
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import aiofiles
+except ImportError:
+    aiofiles = None
+
+
+def _digest(data: bytes) -> str:
+    """Fast non-cryptographic digest used for report cache keys"""
+    if xxhash is not None:
+        return xxhash.xxh3_64(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+# Day names accepted in report_days
+_DAY_MAP = {
+    'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3,
+    'Friday': 4, 'Saturday': 5, 'Sunday': 6
+}
+
+# One event loop thread shared by every reporter agent. API fetches run on
+# it so their HTTP client (and its open connections) outlives each report,
+# and with config['async_file_writes'] report files are written on it, so
+# concurrent reports overlap their writes instead of each blocking its caller
+_background_loop_instance = None
+_writer_pending = set()
+_writer_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared background loop, starting it on first use"""
+    global _background_loop_instance
+    with _writer_lock:
+        if _background_loop_instance is None:
+            _background_loop_instance = asyncio.new_event_loop()
+            threading.Thread(
+                target=_background_loop_instance.run_forever,
+                name='report-background',
+                daemon=True
+            ).start()
+            # Don't lose queued reports at shutdown
+            atexit.register(_flush_file_writes)
+    return _background_loop_instance
+
+
+# asyncpg pools by DSN, created on and only used from the background loop
+_async_pools = {}
+
+
+async def _async_pool(dsn: str):
+    """Get the shared asyncpg pool for a DSN"""
+    pool = _async_pools.get(dsn)
+    if pool is None:
+        import asyncpg
+        pool = _async_pools[dsn] = await asyncpg.create_pool(dsn)
+    return pool
+
+
+@functools.cache
+def _api_client(http2: bool, max_connections: int):
+    """HTTP client for order APIs, only ever used on the background loop"""
+    import httpx
+    return httpx.AsyncClient(http2=http2, limits=httpx.Limits(max_connections=max_connections))
+
+
+def _flush_file_writes() -> None:
+    """Wait for queued report writes to finish"""
+    with _writer_lock:
+        pending = list(_writer_pending)
+    for future in pending:
+        try:
+            future.result()
+        except Exception:
+            pass
+
+
+# Text report rules
+_EQ70 = "=" * 70
+_DASH70 = "-" * 70
+
+# HTML report fragments, formatted with str.format (literal braces doubled)
+_HTML_HEAD = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Cake Production Report</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        h1 {{ color: #333; }}
+        table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
+        th, td {{ border: 1px solid #ddd; padding: 12px; text-align: left; }}
+        th {{ background-color: #4CAF50; color: white; }}
+        tr:nth-child(even) {{ background-color: #f2f2f2; }}
+        .summary {{ background-color: #e7f3e7; padding: 15px; margin: 20px 0; border-radius: 5px; }}
+        .total {{ font-size: 1.2em; font-weight: bold; color: #4CAF50; }}
+    </style>
+</head>
+<body>
+    <h1>🎂 Cake Production Report</h1>
+
+    <div class="summary">
+        <p><strong>Report Generated:</strong> {generated}</p>
+        <p><strong>Period:</strong> {start} to {end}</p>
+        <p><strong>Total Orders:</strong> {total_orders}</p>
+        <p class="total">TOTAL CAKES TO PRODUCE: {total_cakes} cakes</p>
+        {buffer_note}
+    </div>
+
+    <h2>Production Requirements</h2>
+    <table>
+        <tr>
+            <th>Cake Type</th>
+            <th>Quantity</th>
+        </tr>
+"""
+
+_HTML_ROW = """
+        <tr>
+            <td>{cake_type}</td>
+            <td>{quantity}</td>
+        </tr>
+"""
+
+_HTML_TAIL = """
+    </table>
+</body>
+</html>
+"""
 
 
 class CakeProductionReporterAgent(BaseAgent):
@@ -69,6 +219,7 @@ class CakeProductionReporterAgent(BaseAgent):
         self.state['report_format'] = self.config.get('report_format', 'text')
         self.state['include_details'] = self.config.get('include_details', True)
         self.state['buffer_percentage'] = self.config.get('buffer_percentage', 10)  # Safety buffer
+        self.state['report_top_k'] = self.config.get('report_top_k')  # None lists every cake type
 
         # Delivery configuration
         self.state['delivery_method'] = self.config.get('delivery_method', 'file')
@@ -76,9 +227,18 @@ class CakeProductionReporterAgent(BaseAgent):
         self.state['email_to'] = self.config.get('email_to', [])
         self.state['email_from'] = self.config.get('email_from', '')
 
+        # Parsed schedule, see _schedule()
+        self._schedule_cache = None
+
         # Report history
         self.state['last_report_date'] = None
-        self.state['report_history'] = []
+        self.state['report_history'] = deque(maxlen=100)  # Oldest reports drop off
+
+        # Recently formatted reports, so re-running a report over the same
+        # data (e.g. a scheduler retry) skips formatting. Kept off self.state
+        # so it isn't saved with the agent state.
+        self._report_cache = OrderedDict()
+        self._report_cache_size = self.config.get('report_cache_size', 32)
 
     def execute(
         self,
@@ -100,59 +260,73 @@ class CakeProductionReporterAgent(BaseAgent):
         if not self._initialized:
             self.initialize()
 
+        # One clock reading for the whole report, so the period, report body,
+        # history entry and file name all agree
+        now = datetime.now()
+        state = self.state
+
         # Determine date range
         if not start_date:
-            if self.state['last_report_date']:
-                start_date = self.state['last_report_date']
+            last_report_date = state['last_report_date']
+            if last_report_date:
+                start_date = last_report_date
             else:
-                start_date = datetime.now() - timedelta(days=7)
+                start_date = now - timedelta(days=7)
 
         if not end_date:
-            end_date = datetime.now()
+            end_date = now
 
         self.logger.info(f"Generating report for {start_date.date()} to {end_date.date()}")
 
         # Fetch orders
+        total_orders = None
         if custom_orders is not None:
             orders = custom_orders
+        elif self._can_aggregate_in_database():
+            # Order rows aren't needed, so let the database do the grouping
+            orders = []
+            production_data, total_orders = self._fetch_aggregated_from_database(start_date, end_date)
         else:
             orders = self._fetch_orders(start_date, end_date)
 
-        # Process orders
-        production_data = self._aggregate_orders(orders)
+        if total_orders is None:
+            total_orders = len(orders)
+            # Process orders
+            production_data = self._aggregate_orders(orders)
 
         # Add safety buffer
         production_data = self._apply_buffer(production_data)
+        total_cakes = sum(production_data.values())
 
         # Generate report
-        report_text = self._generate_report(production_data, start_date, end_date, orders)
+        report_text = self._cached_generate_report(production_data, start_date, end_date, orders, total_orders, now, total_cakes)
 
         # Create report package
         report = {
-            'date': datetime.now().isoformat(),
+            'date': now.isoformat(),
             'period_start': start_date.isoformat(),
             'period_end': end_date.isoformat(),
-            'total_orders': len(orders),
+            'total_orders': total_orders,
             'production_data': production_data,
             'report_text': report_text
         }
 
         # Deliver report
-        self._deliver_report(report)
+        self._deliver_report(report, now)
 
         # Update state
-        self.state['last_report_date'] = end_date
-        self.state['report_history'].append({
-            'date': datetime.now().isoformat(),
-            'total_orders': len(orders),
-            'total_cakes': sum(production_data.values())
+        state['last_report_date'] = end_date
+        history = state['report_history']
+        if not isinstance(history, deque):
+            # Restored by load_state() as a plain list
+            history = state['report_history'] = deque(history, maxlen=100)
+        history.append({
+            'date': report['date'],
+            'total_orders': total_orders,
+            'total_cakes': total_cakes
         })
 
-        # Keep only last 100 reports in history
-        if len(self.state['report_history']) > 100:
-            self.state['report_history'] = self.state['report_history'][-100:]
-
-        self.logger.info(f"Report generated: {sum(production_data.values())} total cakes")
+        self.logger.info(f"Report generated: {total_cakes} total cakes")
 
         return report
 
@@ -171,6 +345,13 @@ class CakeProductionReporterAgent(BaseAgent):
             # Custom function provided
             orders = self.state['fetch_function'](start_date, end_date)
 
+        elif data_source == 'database' and self.config.get('db_async_dsn'):
+            # PostgreSQL via asyncpg, one query per period partition
+            orders = asyncio.run_coroutine_threadsafe(
+                self._afetch_from_database(start_date, end_date),
+                _background_loop()
+            ).result()
+
         elif data_source == 'database' and self.state['db_connection']:
             # Database query
             orders = self._fetch_from_database(start_date, end_date)
@@ -197,34 +378,162 @@ class CakeProductionReporterAgent(BaseAgent):
         """)
 
         cursor = conn.cursor()
-        cursor.execute(query, (start_date, end_date))
+        cursor.arraysize = self.config.get('db_fetch_size', 1000)
+        self._execute_query(cursor, query, (start_date, end_date))
 
+        # Stream rows in batches instead of materializing the whole result
         orders = []
-        for row in cursor.fetchall():
-            orders.append({
-                'cake_type': row[0],
-                'quantity': row[1],
-                'order_date': row[2]
-            })
+        while rows := cursor.fetchmany():
+            orders.extend(
+                {'cake_type': row[0], 'quantity': row[1], 'order_date': row[2]}
+                for row in rows
+            )
 
         return orders
 
+    async def _afetch_from_database(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+        """
+        Fetch orders from PostgreSQL, querying each partition concurrently
+
+        The period is split into db_partition_days slices queried in parallel
+        over a pooled asyncpg connection set, so their round trips overlap.
+        Slices are half-open, so db_async_query must filter with
+        order_date >= $1 AND order_date < $2.
+        """
+        pool = await _async_pool(self.config['db_async_dsn'])
+        query = self.config.get('db_async_query', """
+            SELECT cake_type, quantity, order_date
+            FROM orders
+            WHERE order_date >= $1 AND order_date < $2
+        """)
+
+        step = timedelta(days=self.config.get('db_partition_days', 1))
+        # The period itself includes end_date
+        stop = end_date + timedelta(microseconds=1)
+        bounds = []
+        lower = start_date
+        while lower < stop:
+            upper = min(lower + step, stop)
+            bounds.append((lower, upper))
+            lower = upper
+
+        results = await asyncio.gather(*[pool.fetch(query, lower, upper) for lower, upper in bounds])
+
+        return [
+            {'cake_type': row[0], 'quantity': row[1], 'order_date': row[2]}
+            for rows in results
+            for row in rows
+        ]
+
+    def _execute_query(self, cursor, query: str, params: Tuple) -> None:
+        """
+        Run a report query, reusing its server-side prepared statement
+
+        psycopg 3 is asked to prepare the statement, so the server parses and
+        plans it once per connection. sqlite3 already keeps a per-connection
+        cache of compiled statements keyed by the SQL text, and other drivers
+        run the query as given.
+        """
+        if type(cursor).__module__.startswith('psycopg.'):
+            cursor.execute(query, params, prepare=self.config.get('db_prepare', True))
+        else:
+            cursor.execute(query, params)
+
+    def _can_aggregate_in_database(self) -> bool:
+        """
+        Check whether production totals can be computed by the database
+
+        Only possible when the report doesn't list individual orders, and
+        either db_aggregate_query is set or db_query is the default (a custom
+        db_query may filter orders in ways the default aggregate query doesn't).
+        """
+        return (
+            self.state['data_source'] == 'database'
+            and self.state['db_connection'] is not None
+            and not self.state['include_details']
+            and ('db_aggregate_query' in self.config or 'db_query' not in self.config)
+        )
+
+    def _fetch_aggregated_from_database(
+        self,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Tuple[Dict[str, int], int]:
+        """
+        Fetch per-cake totals from database, grouped by the database
+
+        Returns: ({cake_type: total_quantity}, total_orders)
+        """
+        conn = self.state['db_connection']
+        query = self.config.get('db_aggregate_query', """
+            SELECT cake_type, SUM(quantity), COUNT(*)
+            FROM orders
+            WHERE order_date >= ? AND order_date <= ?
+            GROUP BY cake_type
+        """)
+
+        cursor = conn.cursor()
+        self._execute_query(cursor, query, (start_date, end_date))
+
+        production_data = {}
+        total_orders = 0
+        for cake_type, quantity, count in cursor.fetchall():
+            production_data[cake_type] = quantity
+            total_orders += count
+
+        self.logger.info(f"Fetched totals for {total_orders} orders")
+        return production_data, total_orders
+
     def _fetch_from_api(self, start_date: datetime, end_date: datetime) -> List[Dict]:
         """Fetch orders from API"""
-        import requests
-
         endpoint = self.state['api_endpoint']
         params = {
             'start_date': start_date.isoformat(),
             'end_date': end_date.isoformat()
         }
 
+        return asyncio.run_coroutine_threadsafe(
+            self._afetch_pages(endpoint, params),
+            _background_loop()
+        ).result()
+
+    async def _afetch_pages(self, endpoint: str, params: Dict[str, Any]) -> List[Dict]:
+        """
+        Fetch all pages of orders from API
+
+        An API returning a list is treated as unpaginated. A paginated API
+        returns {'orders': [...], 'total_pages': N} for the first page; the
+        remaining pages are then requested concurrently over one client.
+        """
+        page_param = self.config.get('api_page_param', 'page')
         headers = self.config.get('api_headers', {})
+        client = _api_client(
+            self.config.get('api_http2', False),
+            self.config.get('api_max_connections', 32)
+        )
 
-        response = requests.get(endpoint, params=params, headers=headers)
+        response = await client.get(endpoint, params=params, headers=headers)
         response.raise_for_status()
+        data = response.json()
 
-        return response.json()
+        if isinstance(data, list):
+            return data
+
+        orders = list(data['orders'])
+        total_pages = data.get('total_pages', 1)
+        if total_pages <= 1:
+            return orders
+
+        responses = await asyncio.gather(*[
+            client.get(endpoint, params={**params, page_param: page}, headers=headers)
+            for page in range(2, total_pages + 1)
+        ])
+
+        for response in responses:
+            response.raise_for_status()
+            orders.extend(response.json()['orders'])
+
+        return orders
 
     def _aggregate_orders(self, orders: List[Dict]) -> Dict[str, int]:
         """
@@ -232,6 +541,15 @@ class CakeProductionReporterAgent(BaseAgent):
 
         Returns: {cake_type: total_quantity}
         """
+        # Building a DataFrame only pays off for larger order lists
+        if pd is not None and len(orders) >= self.config.get('vectorize_min_rows', 1000):
+            df = pd.DataFrame.from_records(orders, columns=['cake_type', 'quantity'])
+            quantity = df['quantity'].fillna(1)
+            if quantity.dtype.kind == 'f' and (quantity % 1 == 0).all():
+                # Missing quantities make the column float; keep whole counts as ints
+                quantity = quantity.astype('int64')
+            return quantity.groupby(df['cake_type'].fillna('Unknown'), sort=False).sum().to_dict()
+
         aggregation = defaultdict(int)
 
         for order in orders:
@@ -256,78 +574,182 @@ class CakeProductionReporterAgent(BaseAgent):
         self.logger.info(f"Applied {buffer_pct}% safety buffer")
         return buffered
 
+    def _cached_generate_report(
+        self,
+        production_data: Dict[str, int],
+        start_date: datetime,
+        end_date: datetime,
+        orders: List[Dict],
+        total_orders: int,
+        now: Optional[datetime] = None,
+        total_cakes: Optional[int] = None
+    ) -> str:
+        """
+        Generate formatted report, reusing a cached one for identical input
+
+        The key covers everything the report renders: the production data,
+        period, order count, the listed orders and the report settings. The
+        "Report Generated" time isn't part of it: the report is cached split
+        around that timestamp, and a hit is joined with the current one.
+        """
+        if self._report_cache_size <= 0:
+            return self._generate_report(production_data, start_date, end_date, orders, total_orders, now, total_cakes)
+
+        if now is None:
+            now = datetime.now()
+        generated = now.strftime('%Y-%m-%d %H:%M')
+
+        state = self.state
+        include_details = state['include_details']
+        report_format = state['report_format']
+        payload = json.dumps(
+            [production_data, total_orders, orders[:20] if include_details else None],
+            default=str
+        ).encode()
+        # Text and HTML reports only show the period's dates, so a default
+        # period ending now still hits for the rest of the day
+        if report_format == 'json':
+            period = (start_date, end_date)
+        else:
+            period = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        key = (
+            _digest(payload),
+            period,
+            state['buffer_percentage'],
+            report_format,
+            state['report_top_k'],
+            include_details
+        )
+
+        cache = self._report_cache
+        parts = cache.get(key)
+        if parts is not None:
+            cache.move_to_end(key)
+            self.logger.info("Reusing cached report")
+            return generated.join(parts)
+
+        report_text = self._generate_report(production_data, start_date, end_date, orders, total_orders, now, total_cakes)
+        # The timestamp comes before anything else in text and HTML reports
+        # that could contain it; JSON reports have none and stay whole
+        cache[key] = report_text.split(generated, 1)
+        if len(cache) > self._report_cache_size:
+            cache.popitem(last=False)
+
+        return report_text
+
     def _generate_report(
         self,
         production_data: Dict[str, int],
         start_date: datetime,
         end_date: datetime,
-        orders: List[Dict]
+        orders: List[Dict],
+        total_orders: Optional[int] = None,
+        now: Optional[datetime] = None,
+        total_cakes: Optional[int] = None
     ) -> str:
         """Generate formatted report"""
         report_format = self.state['report_format']
+        if total_orders is None:
+            total_orders = len(orders)
+        if now is None:
+            now = datetime.now()
+        if total_cakes is None:
+            total_cakes = sum(production_data.values())
 
         if report_format == 'html':
-            return self._generate_html_report(production_data, start_date, end_date, orders)
+            return self._generate_html_report(production_data, start_date, end_date, orders, total_orders, now, total_cakes)
         elif report_format == 'json':
-            return json.dumps({
+            report = {
                 'production': production_data,
                 'period': {
                     'start': start_date.isoformat(),
                     'end': end_date.isoformat()
                 },
-                'total_orders': len(orders),
-                'total_cakes': sum(production_data.values())
-            }, indent=2)
+                'total_orders': total_orders,
+                'total_cakes': total_cakes
+            }
+            if orjson is not None:
+                return orjson.dumps(
+                    report,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                ).decode()
+            return json.dumps(report, indent=2)
         else:
-            return self._generate_text_report(production_data, start_date, end_date, orders)
+            return self._generate_text_report(production_data, start_date, end_date, orders, total_orders, now, total_cakes)
+
+    def _rank_cakes(self, production_data: Dict[str, int]) -> List[Tuple[str, int]]:
+        """
+        Cake types by quantity (descending), limited to report_top_k if set
+
+        With a limit well below the number of cake types, a heap selects the
+        top ones without sorting the rest.
+        """
+        top_k = self.state['report_top_k']
+        if top_k is None or top_k >= len(production_data):
+            return sorted(production_data.items(), key=itemgetter(1), reverse=True)
+        return nlargest(top_k, production_data.items(), key=itemgetter(1))
 
     def _generate_text_report(
         self,
         production_data: Dict[str, int],
         start_date: datetime,
         end_date: datetime,
-        orders: List[Dict]
+        orders: List[Dict],
+        total_orders: Optional[int] = None,
+        now: Optional[datetime] = None,
+        total_cakes: Optional[int] = None
     ) -> str:
         """Generate plain text report"""
-        buffer_pct = self.state['buffer_percentage']
-
-        lines = []
-        lines.append("=" * 70)
-        lines.append("CAKE PRODUCTION REPORT")
-        lines.append("=" * 70)
-        lines.append(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        lines.append(f"Period: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-        lines.append(f"Total Orders: {len(orders)}")
-        lines.append("")
-
-        lines.append("PRODUCTION REQUIREMENTS:")
-        lines.append("-" * 70)
+        state = self.state
+        buffer_pct = state['buffer_percentage']
+        include_details = state['include_details']
+        if total_orders is None:
+            total_orders = len(orders)
+        if now is None:
+            now = datetime.now()
+        if total_cakes is None:
+            total_cakes = sum(production_data.values())
+
+        lines = [
+            _EQ70,
+            "CAKE PRODUCTION REPORT",
+            _EQ70,
+            f"Report Generated: {now.strftime('%Y-%m-%d %H:%M')}",
+            f"Period: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}",
+            f"Total Orders: {total_orders}",
+            "",
+            "PRODUCTION REQUIREMENTS:",
+            _DASH70
+        ]
 
         if not production_data:
             lines.append("No cakes to produce this period.")
         else:
-            # Sort by quantity (descending)
-            sorted_cakes = sorted(production_data.items(), key=lambda x: x[1], reverse=True)
+            sorted_cakes = self._rank_cakes(production_data)
 
-            for cake_type, quantity in sorted_cakes:
-                lines.append(f"  {cake_type:<40} {quantity:>5} cakes")
+            lines.extend([f"  {cake_type:<40} {quantity:>5} cakes" for cake_type, quantity in sorted_cakes])
 
-        lines.append("-" * 70)
-        lines.append(f"TOTAL CAKES TO PRODUCE: {sum(production_data.values())} cakes")
+            if len(sorted_cakes) < len(production_data):
+                lines.append(f"  ... and {len(production_data) - len(sorted_cakes)} more cake types")
+
+        lines.append(_DASH70)
+        lines.append(f"TOTAL CAKES TO PRODUCE: {total_cakes} cakes")
 
         if buffer_pct > 0:
             lines.append(f"(Includes {buffer_pct}% safety buffer)")
 
-        lines.append("=" * 70)
+        lines.append(_EQ70)
 
-        if self.state['include_details']:
+        if include_details:
             lines.append("")
             lines.append("ORDER DETAILS:")
-            lines.append("-" * 70)
+            lines.append(_DASH70)
 
             for i, order in enumerate(orders[:20], 1):  # Show first 20
                 order_date = order.get('order_date', 'N/A')
-                if isinstance(order_date, datetime):
+                # Exact type check first; subclasses (e.g. pandas Timestamp)
+                # still take the isinstance() path
+                if type(order_date) is datetime or isinstance(order_date, datetime):
                     order_date = order_date.strftime('%Y-%m-%d')
 
                 lines.append(
@@ -338,7 +760,7 @@ class CakeProductionReporterAgent(BaseAgent):
             if len(orders) > 20:
                 lines.append(f"  ... and {len(orders) - 20} more orders")
 
-        lines.append("=" * 70)
+        lines.append(_EQ70)
 
         return "\n".join(lines)
 
@@ -347,86 +769,95 @@ class CakeProductionReporterAgent(BaseAgent):
         production_data: Dict[str, int],
         start_date: datetime,
         end_date: datetime,
-        orders: List[Dict]
+        orders: List[Dict],
+        total_orders: Optional[int] = None,
+        now: Optional[datetime] = None,
+        total_cakes: Optional[int] = None
     ) -> str:
         """Generate HTML report"""
         buffer_pct = self.state['buffer_percentage']
-
-        html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Cake Production Report</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; }}
-        h1 {{ color: #333; }}
-        table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
-        th, td {{ border: 1px solid #ddd; padding: 12px; text-align: left; }}
-        th {{ background-color: #4CAF50; color: white; }}
-        tr:nth-child(even) {{ background-color: #f2f2f2; }}
-        .summary {{ background-color: #e7f3e7; padding: 15px; margin: 20px 0; border-radius: 5px; }}
-        .total {{ font-size: 1.2em; font-weight: bold; color: #4CAF50; }}
-    </style>
-</head>
-<body>
-    <h1>🎂 Cake Production Report</h1>
-
-    <div class="summary">
-        <p><strong>Report Generated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-        <p><strong>Period:</strong> {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}</p>
-        <p><strong>Total Orders:</strong> {len(orders)}</p>
-        <p class="total">TOTAL CAKES TO PRODUCE: {sum(production_data.values())} cakes</p>
-        {f'<p><em>(Includes {buffer_pct}% safety buffer)</em></p>' if buffer_pct > 0 else ''}
-    </div>
-
-    <h2>Production Requirements</h2>
-    <table>
-        <tr>
-            <th>Cake Type</th>
-            <th>Quantity</th>
-        </tr>
-"""
-
-        sorted_cakes = sorted(production_data.items(), key=lambda x: x[1], reverse=True)
-        for cake_type, quantity in sorted_cakes:
-            html += f"""
-        <tr>
-            <td>{cake_type}</td>
-            <td>{quantity}</td>
-        </tr>
-"""
-
-        html += """
-    </table>
-</body>
-</html>
-"""
-        return html
-
-    def _deliver_report(self, report: Dict[str, Any]) -> None:
+        if total_orders is None:
+            total_orders = len(orders)
+        if now is None:
+            now = datetime.now()
+        if total_cakes is None:
+            total_cakes = sum(production_data.values())
+
+        sorted_cakes = self._rank_cakes(production_data)
+
+        # One row fragment per cake type, joined once at the end
+        parts = [_HTML_HEAD.format(
+            generated=now.strftime('%Y-%m-%d %H:%M'),
+            start=start_date.strftime('%Y-%m-%d'),
+            end=end_date.strftime('%Y-%m-%d'),
+            total_orders=total_orders,
+            total_cakes=total_cakes,
+            buffer_note=f'<p><em>(Includes {buffer_pct}% safety buffer)</em></p>' if buffer_pct > 0 else ''
+        )]
+        parts.extend([_HTML_ROW.format(cake_type=cake_type, quantity=quantity) for cake_type, quantity in sorted_cakes])
+        parts.append(_HTML_TAIL)
+
+        return ''.join(parts)
+
+    def _deliver_report(self, report: Dict[str, Any], now: Optional[datetime] = None) -> None:
         """Deliver the report via configured method"""
         delivery_method = self.state['delivery_method']
 
         if delivery_method == 'file':
-            self._save_to_file(report)
+            self._save_to_file(report, now)
 
         if delivery_method == 'email' or 'email' in str(delivery_method):
             self._send_email(report)
 
-    def _save_to_file(self, report: Dict[str, Any]) -> None:
+    def _save_to_file(self, report: Dict[str, Any], now: Optional[datetime] = None) -> None:
         """Save report to file"""
         output_file = self.state['output_file']
 
         # Add timestamp to filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = (now or datetime.now()).strftime('%Y%m%d_%H%M%S')
         base, ext = os.path.splitext(output_file)
         timestamped_file = f"{base}_{timestamp}{ext}"
 
+        if self.config.get('async_file_writes', False):
+            future = asyncio.run_coroutine_threadsafe(
+                self._async_save_to_file(report, timestamped_file),
+                _background_loop()
+            )
+            with _writer_lock:
+                _writer_pending.add(future)
+            future.add_done_callback(self._file_write_done)
+            return
+
         with open(timestamped_file, 'w') as f:
             f.write(report['report_text'])
 
         self.logger.info(f"Report saved to {timestamped_file}")
 
+    async def _async_save_to_file(self, report: Dict[str, Any], path: str) -> None:
+        """Write report to file without blocking the writer loop"""
+        data = report['report_text'].encode()
+
+        if aiofiles is not None:
+            async with aiofiles.open(path, 'wb') as f:
+                await f.write(data)
+        else:
+            await asyncio.to_thread(self._write_bytes, path, data)
+
+        self.logger.info(f"Report saved to {path}")
+
+    @staticmethod
+    def _write_bytes(path: str, data: bytes) -> None:
+        """Blocking write used when aiofiles isn't installed"""
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _file_write_done(self, future) -> None:
+        """Forget a finished background write, logging any failure"""
+        with _writer_lock:
+            _writer_pending.discard(future)
+        if future.exception() is not None:
+            self.logger.error(f"Failed to save report: {future.exception()}")
+
     def _send_email(self, report: Dict[str, Any]) -> None:
         """Send report via email"""
         # This is a placeholder - integrate with your email system
@@ -447,26 +878,29 @@ class CakeProductionReporterAgent(BaseAgent):
         # with smtplib.SMTP(smtp_host, smtp_port) as server:
         #     server.send_message(msg)
 
+    def _schedule(self) -> Tuple[frozenset, int, int]:
+        """
+        Parsed (weekdays, hour, minute) for the configured schedule
+
+        Parsed once and reused until report_days or report_time change.
+        """
+        key = (tuple(self.state['report_days']), self.state['report_time'])
+        if self._schedule_cache is None or self._schedule_cache[0] != key:
+            report_days, report_time = key
+            target_days = frozenset(_DAY_MAP[day] for day in report_days if day in _DAY_MAP)
+            hour, minute = map(int, report_time.split(':'))
+            self._schedule_cache = (key, (target_days, hour, minute))
+        return self._schedule_cache[1]
+
     def get_next_report_date(self) -> datetime:
         """Calculate when the next report should run"""
         now = datetime.now()
-        report_days = self.state['report_days']
-        report_time = self.state['report_time']
-
-        # Map day names to numbers
-        day_map = {
-            'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3,
-            'Friday': 4, 'Saturday': 5, 'Sunday': 6
-        }
-
-        target_days = [day_map[day] for day in report_days if day in day_map]
+        target_days, hour, minute = self._schedule()
 
         # Find next occurrence
         for days_ahead in range(8):
             check_date = now + timedelta(days=days_ahead)
             if check_date.weekday() in target_days:
-                # Parse time
-                hour, minute = map(int, report_time.split(':'))
                 next_run = check_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
 
                 if next_run > now:
@@ -476,12 +910,24 @@ class CakeProductionReporterAgent(BaseAgent):
 
     def should_run_now(self) -> bool:
         """Check if report should run now"""
-        now = datetime.now()
-        next_run = self.get_next_report_date()
+        target_days, hour, minute = self._schedule()
+        if not target_days:
+            # get_next_report_date() falls back to now
+            return True
 
-        # Run if within 5 minutes of scheduled time
-        time_diff = abs((next_run - now).total_seconds())
-        return time_diff < 300
+        # Run if the next scheduled time is within 5 minutes, checked
+        # arithmetically against today's and tomorrow's slot
+        now = datetime.now()
+        until_today = (
+            (hour * 60 + minute) * 60
+            - (now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6)
+        )
+        if 0 < until_today < 300:
+            return now.weekday() in target_days
+        until_tomorrow = until_today + 86400
+        if 0 < until_tomorrow < 300:
+            return (now.weekday() + 1) % 7 in target_days
+        return False
 
     def start_scheduler(self) -> None:
         """
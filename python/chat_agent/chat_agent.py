@@ -9,7 +9,8 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from base.agent import BaseAgent
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import List, Dict, Any, Iterator, Optional, Union
 
 
 class ChatAgent(BaseAgent):
@@ -22,6 +23,8 @@ class ChatAgent(BaseAgent):
     - Message history
     - System prompts
     - Token counting (basic)
+    - Cache-friendly history windows ('append_reset' strategy)
+    - Streaming responses (execute(message, stream=True))
 
     Example:
         agent = ChatAgent({
@@ -35,34 +38,59 @@ class ChatAgent(BaseAgent):
 
     def _initialize(self) -> None:
         """Initialize chat agent"""
-        self.state['messages'] = []
         self.state['system_prompt'] = self.config.get(
             'system_prompt',
             'You are a helpful AI assistant.'
         )
         self.state['max_history'] = self.config.get('max_history', 20)
 
-        # Add system message
-        if self.state['system_prompt']:
-            self.state['messages'].append({
-                'role': 'system',
-                'content': self.state['system_prompt']
-            })
+        # 'sliding' drops the oldest message every turn once the window is
+        # full. 'append_reset' lets history grow to twice max_history and then
+        # cuts it back in one step, so the prompt prefix stays byte-identical
+        # between resets and provider prompt caches keep hitting.
+        strategy = self.config.get('history_strategy', 'sliding')
+        if strategy not in ('sliding', 'append_reset'):
+            raise ValueError(f"Unknown history_strategy: {strategy}")
+        self.state['history_strategy'] = strategy
+
+        # The system message is kept apart from the conversation, which is a
+        # ring buffer: with 'sliding', appending to a full window drops the
+        # oldest message in O(1) instead of copying the list every turn
+        self.state['system_message'] = (
+            {'role': 'system', 'content': self.state['system_prompt']}
+            if self.state['system_prompt'] else None
+        )
+        self.state['messages'] = self._new_history()
+
+        # Messages are numbered as they're added; window_start_id is the
+        # number of the oldest message still in history
+        self.state['message_count'] = 0
+        self.state['window_start_id'] = 0
+
+    def _new_history(self, messages=()) -> deque:
+        """Create the conversation buffer for the configured strategy"""
+        if self.state['history_strategy'] == 'sliding':
+            return deque(messages, maxlen=self.state['max_history'])
+        return deque(messages)
 
-    def execute(self, message: str, **kwargs) -> str:
+    def execute(self, message: str, stream: bool = False, **kwargs) -> Union[str, Iterator[str]]:
         """
         Send a message and get a response
 
         Args:
             message: User message
+            stream: Return an iterator of response chunks instead of a string
             **kwargs: Additional parameters (provider-specific)
 
         Returns:
-            Agent response
+            Agent response, or an iterator of response chunks when streaming
         """
         if not self._initialized:
             self.initialize()
 
+        if stream:
+            return self._stream_turn(message, **kwargs)
+
         # Add user message to history
         self.add_message('user', message)
 
@@ -99,51 +127,111 @@ class ChatAgent(BaseAgent):
         # import openai
         # response = openai.ChatCompletion.create(
         #     model=self.config.get('model', 'gpt-4'),
-        #     messages=self.state['messages']
+        #     messages=self.get_history()
         # )
         # return response.choices[0].message.content
 
         raise NotImplementedError(f"Provider '{provider}' not implemented")
 
+    def _stream_turn(self, message: str, **kwargs) -> Iterator[str]:
+        """Run one conversation turn, yielding the response as it's generated"""
+        self.add_message('user', message)
+
+        chunks = []
+        for chunk in self._generate_response_stream(message, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+
+        # History only records the reply once it's complete
+        self.add_message('assistant', ''.join(chunks))
+        self._trim_history()
+
+    def _generate_response_stream(self, message: str, **kwargs) -> Iterator[str]:
+        """
+        Generate a response as a stream of text chunks
+
+        Override this alongside _generate_response for providers that support
+        streaming. The default yields the full response as a single chunk.
+        """
+        yield self._generate_response(message, **kwargs)
+
     def add_message(self, role: str, content: str) -> None:
         """Add a message to chat history"""
         self.state['messages'].append({
             'role': role,
             'content': content
         })
+        self.state.mark_dirty('messages')
+        self.state['message_count'] = self.state.get('message_count', 0) + 1
 
     def _trim_history(self) -> None:
-        """Trim message history to max_history length"""
+        """Trim message history according to the configured strategy"""
+        messages = self.state['messages']
+        if not isinstance(messages, deque):
+            # Restored by load_state() as a plain list
+            self._upgrade_state()
+            messages = self.state['messages']
+
+        # 'sliding' is bounded by the deque itself; 'append_reset' cuts back
+        # to the latest max_history messages once it reaches twice that
         max_history = self.state['max_history']
+        if self.state['history_strategy'] == 'append_reset' and len(messages) > 2 * max_history:
+            for _ in range(len(messages) - max_history):
+                messages.popleft()
+            self.state.mark_dirty('messages')
+
+        self.state['window_start_id'] = self.state.get('message_count', 0) - len(messages)
 
-        # Always keep system message (index 0)
-        if len(self.state['messages']) > max_history + 1:
-            system_msg = self.state['messages'][0]
-            self.state['messages'] = (
-                [system_msg] +
-                self.state['messages'][-(max_history):]
-            )
+    def load_state(self, filepath: str) -> None:
+        """Load agent state from file, including files saved by older versions"""
+        super().load_state(filepath)
+        self._upgrade_state()
+
+    def _upgrade_state(self) -> None:
+        """
+        Bring restored state up to date and turn its history back into a deque
+
+        State saved before the system message was kept apart has it at the
+        start of 'messages', and lacks the keys added since.
+        """
+        state = self.state
+        messages = list(state.get('messages', []))
+        if 'system_message' not in state:
+            system_msg = None
+            if messages and messages[0].get('role') == 'system':
+                system_msg = messages.pop(0)
+            state['system_message'] = system_msg
+        if 'system_prompt' not in state:
+            state['system_prompt'] = state['system_message']['content'] if state['system_message'] else ''
+        if 'max_history' not in state:
+            state['max_history'] = self.config.get('max_history', 20)
+        if 'history_strategy' not in state:
+            state['history_strategy'] = self.config.get('history_strategy', 'sliding')
+        if 'message_count' not in state:
+            state['message_count'] = len(messages)
+        state['messages'] = self._new_history(messages)
+        state['window_start_id'] = state['message_count'] - len(state['messages'])
 
     def clear_history(self) -> None:
         """Clear chat history (except system message)"""
-        system_msg = self.state['messages'][0] if self.state['messages'] else None
-        self.state['messages'] = [system_msg] if system_msg else []
+        self.state['messages'].clear()
+        self.state.mark_dirty('messages')
+        self.state['window_start_id'] = self.state.get('message_count', 0)
         self.logger.info("Chat history cleared")
 
     def get_history(self) -> List[Dict[str, str]]:
-        """Get chat history"""
-        return self.state['messages']
+        """Get chat history, starting with the system message"""
+        system_msg = self.state['system_message']
+        history = list(self.state['messages'])
+        return [system_msg] + history if system_msg else history
 
     def set_system_prompt(self, prompt: str) -> None:
         """Update system prompt"""
         self.state['system_prompt'] = prompt
-        if self.state['messages'] and self.state['messages'][0]['role'] == 'system':
-            self.state['messages'][0]['content'] = prompt
-        else:
-            self.state['messages'].insert(0, {
-                'role': 'system',
-                'content': prompt
-            })
+        self.state['system_message'] = {
+            'role': 'system',
+            'content': prompt
+        }
         self.logger.info("System prompt updated")
 
 
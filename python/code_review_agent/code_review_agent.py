@@ -2,6 +2,7 @@
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from base.agent import BaseAgent
+from base.llm import get_anthropic_client
 
 class CodeReviewAgent(BaseAgent):
     def _initialize(self):
@@ -12,8 +13,7 @@ class CodeReviewAgent(BaseAgent):
     def _init_llm(self):
         if self.state['llm_provider'] == 'anthropic':
             try:
-                import anthropic
-                self.state['client'] = anthropic.Anthropic(api_key=self.state['llm_api_key'])
+                self.state['client'] = get_anthropic_client(self.state['llm_api_key'])
             except: self.state['client'] = None
     
     def execute(self, code: str, language: str = 'python') -> dict:
@@ -2,25 +2,44 @@
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from base.agent import BaseAgent
+from base.llm import get_anthropic_client
 from typing import List, Dict
+import asyncio
+import json
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MODEL = 'claude-3-5-sonnet-20241022'
+
+# Asked of every chunk when a cohort is split, so the answers can be merged
+CHUNK_FORMAT = """Format as JSON: {"segments": [{"name": ..., "criteria": ..., "recommendations": ..., "estimated_size": <number>, "customers": [<emails>]}]}"""
 
 class CustomerSegmentationAgent(BaseAgent):
     def _initialize(self):
         self.state['llm_provider'] = self.config.get('llm_provider', 'anthropic')
         self.state['llm_api_key'] = self.config.get('llm_api_key', os.getenv('LLM_API_KEY'))
+        self.state['chunk_size'] = self.config.get('chunk_size', 50)  # Customers per LLM call
+        self.state['max_concurrency'] = self.config.get('max_concurrency', 8)
+        self.state['vectorize_min_rows'] = self.config.get('vectorize_min_rows', 1000)  # numpy fallback threshold
         self._init_llm()
     
     def _init_llm(self):
         if self.state['llm_provider'] == 'anthropic':
             try:
-                import anthropic
-                self.state['client'] = anthropic.Anthropic(api_key=self.state['llm_api_key'])
+                self.state['client'] = get_anthropic_client(self.state['llm_api_key'])
             except: self.state['client'] = None
     
     def execute(self, customers: List[Dict]) -> Dict:
         if not self._initialized: self.initialize()
         
         # Simple RFM segmentation fallback
+        if not self.state['client'] and np is not None and len(customers) >= self.state['vectorize_min_rows']:
+            segments = self._rfm_segments_np(customers)
+            if segments is not None:
+                return {"segments": segments, "method": "simple_rfm"}
         if not self.state['client']:
             segments = {"high_value": [], "medium_value": [], "at_risk": [], "new": []}
             for c in customers:
@@ -30,13 +49,64 @@ class CustomerSegmentationAgent(BaseAgent):
                 else: segments["new"].append(c['email'])
             return {"segments": segments, "method": "simple_rfm"}
         
+        # Larger cohorts are split into chunks segmented in parallel
+        size = self.state['chunk_size']
+        if len(customers) > size:
+            chunks = [customers[i:i + size] for i in range(0, len(customers), size)]
+            try:
+                texts = asyncio.run(self._segment_chunks(chunks))
+            except:
+                return {"error": "Segmentation failed"}
+            return {
+                "segmentation": self._merge_segmentations(texts),
+                "total_customers": len(customers),
+                "chunks": len(chunks)
+            }
+
         # AI-powered segmentation
+        try:
+            resp = self.state['client'].messages.create(
+                model=MODEL,
+                max_tokens=1500,
+                messages=[{'role': 'user', 'content': self._build_prompt(customers, len(customers))}]
+            )
+            return {"segmentation": resp.content[0].text, "total_customers": len(customers)}
+        except:
+            return {"error": "Segmentation failed"}
+
+    def _rfm_segments_np(self, customers: List[Dict]):
+        """
+        The RFM fallback's segments as numpy masks, or None to leave it to the loop
+
+        Only plain numbers are vectorized; anything else (None, numeric
+        strings, Decimals) goes through the loop, which compares them as
+        Python does. The masks are negated comparisons so NaN lands in
+        "new", as it does in the loop.
+        """
+        totals = [c.get('total_spent', 0) for c in customers]
+        if not set(map(type, totals)) <= {int, float, bool}:
+            return None
+        try:
+            spent = np.array(totals, dtype=np.float64)
+        except OverflowError:
+            return None
+        emails = np.array([c['email'] for c in customers], dtype=object)
+        high = spent > 500
+        above_new = spent > 100
+        return {
+            "high_value": emails[high].tolist(),
+            "medium_value": emails[above_new & ~high].tolist(),
+            "at_risk": [],
+            "new": emails[~above_new].tolist()
+        }
+
+    def _build_prompt(self, customers: List[Dict], total: int, output_format: str = "Format as JSON.") -> str:
         customer_summary = "\n".join([
             f"- {c.get('email')}: ${c.get('total_spent', 0)}, {c.get('order_count', 0)} orders, last: {c.get('last_order_days', 'N/A')} days ago"
-            for c in customers[:50]  # Limit to avoid token limits
+            for c in customers
         ])
-        
-        prompt = f"""Segment these {len(customers)} customers into meaningful groups:
+
+        return f"""Segment these {total} customers into meaningful groups:
 
 {customer_summary}
 
@@ -52,16 +122,48 @@ For each segment:
 - Marketing recommendations
 - Estimated size
 
-Format as JSON."""
-        
-        try:
-            resp = self.state['client'].messages.create(
-                model='claude-3-5-sonnet-20241022',
-                max_tokens=1500,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
-            return {"segmentation": resp.content[0].text, "total_customers": len(customers)}
-        except:
-            return {"error": "Segmentation failed"}
+{output_format}"""
+
+    async def _segment_chunks(self, chunks: List[List[Dict]]) -> List[str]:
+        """Segment all chunks concurrently on one async client"""
+        import anthropic
+
+        limit = asyncio.Semaphore(self.state['max_concurrency'])
+
+        async with anthropic.AsyncAnthropic(api_key=self.state['llm_api_key']) as client:
+            async def _segment_chunk(chunk):
+                async with limit:
+                    resp = await client.messages.create(
+                        model=MODEL,
+                        max_tokens=1500,
+                        messages=[{'role': 'user', 'content': self._build_prompt(chunk, len(chunk), CHUNK_FORMAT)}]
+                    )
+                return resp.content[0].text
+
+            return await asyncio.gather(*[_segment_chunk(c) for c in chunks])
+
+    def _merge_segmentations(self, texts: List[str]) -> str:
+        """Union segments with the same name across chunks; raw texts if any isn't JSON"""
+        merged = {}
+        for text in texts:
+            try:
+                body = text.strip()
+                if body.startswith('```'):
+                    body = body.split('\n', 1)[1].rsplit('```', 1)[0]
+                segments = json.loads(body)['segments']
+            except:
+                return "\n\n".join(texts)
+
+            for seg in segments:
+                name = seg.get('name', 'Unnamed')
+                if name not in merged:
+                    merged[name] = dict(seg, customers=list(seg.get('customers', [])))
+                    continue
+                existing = merged[name]
+                existing['customers'].extend(seg.get('customers', []))
+                if isinstance(existing.get('estimated_size'), (int, float)) and isinstance(seg.get('estimated_size'), (int, float)):
+                    existing['estimated_size'] += seg['estimated_size']
+
+        return json.dumps({"segments": list(merged.values())}, indent=2)
 
 __all__ = ['CustomerSegmentationAgent']
@@ -13,9 +13,347 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from base.agent import BaseAgent
-from typing import Any, Dict, List, Callable, Optional
+from typing import Any, Dict, Iterator, List, Callable, Optional
+import ast
+import builtins
+import collections.abc
+import inspect
+import itertools
 import json
 import csv
+import math
+import multiprocessing
+import operator
+import pickle
+import re
+import textwrap
+import types
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+
+# Operators allowed in column expressions. Each works on plain values and
+# on pandas Series alike, so one expression serves both execution paths.
+_COLUMN_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+}
+
+# pyarrow.compute equivalents, for expressions over Arrow tables
+_ARROW_OPS = {
+    '==': 'equal',
+    '!=': 'not_equal',
+    '<': 'less',
+    '<=': 'less_equal',
+    '>': 'greater',
+    '>=': 'greater_equal',
+    '+': 'add',
+    '-': 'subtract',
+    '*': 'multiply',
+    '/': 'divide',
+}
+
+# Numeric lists at least this long get their stats from one NumPy array
+_NP_STATS_MIN_ROWS = 1024
+
+# load_csv() suggests iter_csv()/load_csv_arrow() for files larger than this
+_LARGE_CSV_BYTES = 10 * 1024 * 1024
+
+# Runs of digits too long for orjson, which reads integers beyond 64 bits as
+# (lossy) floats
+_LONG_DIGITS = re.compile(rb'\d{19}')
+
+
+def _has_non_finite(data: Any) -> bool:
+    """Whether data holds a NaN or infinite float, which orjson would write as null"""
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, float):
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif np is not None and isinstance(item, np.ndarray) and item.dtype.kind in 'fc':
+            if not np.isfinite(item).all():
+                return True
+    return False
+
+
+def _json_default(obj: Any) -> Any:
+    """Encode NumPy arrays and scalars, which orjson handles natively, for json"""
+    if np is not None and isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ColumnExpr:
+    """
+    A ``row[column] <op> value`` expression
+
+    Callable on a single record like any other filter, and evaluable over a
+    whole DataFrame column for the vectorized path.
+    """
+
+    def __init__(self, column: str, op: str, value: Any):
+        if op not in _COLUMN_OPS:
+            raise ValueError(f"Unsupported operator: {op}")
+        self.column = column
+        self.op = op
+        self.value = value
+        self._func = _COLUMN_OPS[op]
+        self.__name__ = f"{column} {op} {value!r}"
+
+    def __call__(self, row: Dict[str, Any]) -> Any:
+        return self._func(row[self.column], self.value)
+
+    def evaluate(self, df: Any) -> Any:
+        """Evaluate over a DataFrame, returning a Series"""
+        return self._func(df[self.column], self.value)
+
+    def evaluate_arrow(self, table: Any) -> Any:
+        """Evaluate over a pyarrow Table, returning a ChunkedArray"""
+        column = table[self.column]
+        # Arrow divides integers like //, Python's / always gives floats
+        if self.op == '/' and pa.types.is_integer(column.type):
+            column = column.cast(pa.float64())
+        return pc.call_function(_ARROW_OPS[self.op], [column, pa.scalar(self.value)])
+
+
+class ColumnAssign:
+    """Transformation that stores a ColumnExpr result in a target column"""
+
+    def __init__(self, target: str, expr: ColumnExpr):
+        self.target = target
+        self.expr = expr
+        self.__name__ = f"{target} = {expr.__name__}"
+
+    def __call__(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return {**row, self.target: self.expr(row)}
+
+    def apply(self, df: Any) -> None:
+        """Assign the column in place on a DataFrame"""
+        df[self.target] = self.expr.evaluate(df)
+
+    def apply_arrow(self, table: Any) -> Any:
+        """Return the pyarrow Table with the column assigned"""
+        values = self.expr.evaluate_arrow(table)
+        index = table.schema.get_field_index(self.target)
+        if index == -1:
+            return table.append_column(self.target, values)
+        return table.set_column(index, self.target, values)
+
+
+# Record value types the pandas path round-trips exactly. Columns holding
+# anything else (None, dates, a mix of types) run per record instead.
+_CLEAN_TYPES = (int, float, bool, str)
+_NUMBER_TYPES = (int, float, bool)
+
+# Integers NumPy converts to float64 without rounding
+_EXACT_FLOAT_INT = 2 ** 53
+
+
+def _clean_column(data: List[Dict], key: Any) -> Optional[list]:
+    """Get one key's values from every record, or None if they aren't all of one of _CLEAN_TYPES"""
+    values = list(map(operator.itemgetter(key), data))
+    kinds = set(map(type, values))
+    if len(kinds) != 1 or kinds.pop() not in _CLEAN_TYPES:
+        return None
+    return values
+
+
+def _expr_type(kind: Optional[type], expr: ColumnExpr) -> Optional[type]:
+    """
+    Get the type of expr over a column of kind values
+
+    Returns None where pandas could differ from Python, e.g. comparing
+    strings with numbers or dividing by zero (Python raises, pandas doesn't).
+    """
+    value_kind = type(expr.value)
+    if expr.op in ('==', '!=', '<', '<=', '>', '>='):
+        if kind is str:
+            return bool if value_kind is str else None
+        return bool if kind in _NUMBER_TYPES and value_kind in _NUMBER_TYPES else None
+    if kind is str:
+        return str if expr.op == '+' and value_kind is str else None
+    if kind not in _NUMBER_TYPES or value_kind not in (int, float):
+        return None
+    if expr.op == '/':
+        return float if expr.value else None
+    return float if float in (kind, value_kind) else int
+
+
+def _int64_exact(column: Any, expr: ColumnExpr) -> bool:
+    """
+    Check that expr over an integer column gives what Python ints would
+
+    int64 arithmetic wraps around where Python ints grow, and integers past
+    2**53 lose precision when mixed with floats.
+    """
+    if column.dtype.kind == 'f' or column.empty or isinstance(expr.value, str):
+        return True
+    if column.dtype.kind not in 'ib':
+        # e.g. ints too big for int64, stored as objects or uint64
+        return False
+
+    ends = (int(column.min()), int(column.max()))
+    value = expr.value
+    if isinstance(value, float) or expr.op == '/':
+        return all(abs(end) <= _EXACT_FLOAT_INT for end in ends) and (
+            isinstance(value, float) or abs(value) <= _EXACT_FLOAT_INT
+        )
+    if expr.op in ('+', '-', '*'):
+        # Monotonic in the column value, so the ends bound every result
+        return all(-2 ** 63 <= expr._func(end, value) < 2 ** 63 for end in ends)
+    return True
+
+
+# Source for compile_pipeline(): chain() applies every transformation to one
+# value (f0 first), kernel() runs it over an array in parallel
+_FUSED_SOURCE = """
+def chain(x):
+    return {expr}
+
+def kernel(a, out):
+    for i in prange(a.shape[0]):
+        out[i] = chain(a[i])
+"""
+
+
+def _is_arithmetic(node: ast.AST, arg: str, func_globals: Dict[str, Any]) -> bool:
+    """Check that an expression only uses arg, numeric constants and safe arithmetic"""
+    if isinstance(node, ast.Name):
+        return node.id == arg
+    if isinstance(node, ast.Constant):
+        return type(node.value) in (int, float)
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.UAdd, ast.USub)) and _is_arithmetic(node.operand, arg, func_globals)
+    if isinstance(node, ast.BinOp):
+        right = node.right
+        if isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)):
+            # NumPy gives inf/nan where Python raises ZeroDivisionError
+            if not (isinstance(right, ast.Constant) and type(right.value) in (int, float) and right.value):
+                return False
+        elif isinstance(node.op, ast.Pow):
+            # NumPy rejects negative integer powers of integer arrays
+            if not (isinstance(right, ast.Constant) and type(right.value) is int and right.value >= 0):
+                return False
+        elif not isinstance(node.op, (ast.Add, ast.Sub, ast.Mult)):
+            return False
+        return _is_arithmetic(node.left, arg, func_globals) and _is_arithmetic(right, arg, func_globals)
+    if isinstance(node, ast.Call):
+        return (
+            isinstance(node.func, ast.Name)
+            and node.func.id == 'abs'
+            and func_globals.get('abs', builtins.abs) is builtins.abs
+            and len(node.args) == 1
+            and not node.keywords
+            and _is_arithmetic(node.args[0], arg, func_globals)
+        )
+    return False
+
+
+def _is_elementwise(func: Callable) -> bool:
+    """
+    Check whether func is a plain arithmetic lambda like ``lambda x: x * 2 + 1``
+
+    Applied to a float64 array, such a lambda gives the same results as
+    applied item by item to Python floats, except where a floating-point
+    error occurs (e.g. overflow in ``**``, which Python raises on). It can
+    be used as a vectorized transformation on float lists as long as those
+    errors are caught.
+    """
+    code = getattr(func, '__code__', None)
+    if (
+        not isinstance(func, types.LambdaType)
+        or func.__name__ != '<lambda>'
+        or code.co_argcount != 1
+        or code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS)
+        or code.co_kwonlyargcount
+    ):
+        return False
+
+    try:
+        tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+    except (OSError, TypeError, SyntaxError):
+        # No source (e.g. the REPL), or a fragment of a larger statement
+        return False
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Lambda):
+            continue
+        # Several lambdas can share a line; find the one func was compiled from
+        compiled = compile(ast.Expression(body=node), '<lambda>', 'eval')
+        candidate = next(c for c in compiled.co_consts if isinstance(c, types.CodeType))
+        if (candidate.co_code, candidate.co_consts, candidate.co_names) != (code.co_code, code.co_consts, code.co_names):
+            continue
+
+        arg = node.args.args[0].arg
+        return (
+            any(isinstance(n, ast.Name) and n.id == arg for n in ast.walk(node.body))
+            and _is_arithmetic(node.body, arg, func.__globals__)
+        )
+    return False
+
+
+def _chain(first: Callable, then: Callable) -> Callable:
+    """Compose two transformations: then(first(x))"""
+    return lambda x: then(first(x))
+
+
+def _both(first: Callable, then: Callable) -> Callable:
+    """Combine two filters, evaluating then only if first passes"""
+    return lambda x: first(x) and then(x)
+
+
+# Pipeline of a parallel execute(), set in each worker process
+_worker_filters: List[Callable] = []
+_worker_transformations: List[Callable] = []
+
+
+def _init_worker(filters: List[Callable], transformations: List[Callable]) -> None:
+    """Pool initializer: receive the pipeline once per worker"""
+    global _worker_filters, _worker_transformations
+    _worker_filters = filters
+    _worker_transformations = transformations
+
+
+def _run_chunk(chunk: List) -> List:
+    """Filter and transform one chunk of a parallel execute()"""
+    result = [item for item in chunk if all(f(item) for f in _worker_filters)]
+    for transform in _worker_transformations:
+        result = [transform(item) for item in result]
+    return result
 
 
 class DataProcessorAgent(BaseAgent):
@@ -28,43 +366,186 @@ class DataProcessorAgent(BaseAgent):
     - Data filtering
     - Format conversion (JSON, CSV, etc.)
     - Statistics and aggregation
+    - Vectorized (pandas) execution for column expressions on large record lists
 
     Example:
         processor = DataProcessorAgent()
         processor.add_transformation(lambda x: x * 2)
         result = processor.execute([1, 2, 3, 4, 5])
         # Result: [2, 4, 6, 8, 10]
+
+        # Column expressions run through pandas on large record lists
+        processor = DataProcessorAgent()
+        processor.add_filter_expr('age', '>=', 18)
+        processor.add_transformation_expr('price', '*', 1.1, target='price_with_tax')
     """
 
     def _initialize(self) -> None:
         """Initialize data processor"""
+        # Record lists at least this long take the pandas path when possible
+        self.vectorize_min_rows = self.config.get('vectorize_min_rows', 1000)
+        # Treat plain arithmetic lambdas as vectorized (on float lists) without being told
+        self.auto_vectorize = self.config.get('auto_vectorize', False)
+        # execute(parallel=True) only uses worker processes from this size
+        self.parallel_min_rows = self.config.get('parallel_min_rows', 10000)
+        self.parallel_workers = self.config.get('parallel_workers') or os.cpu_count() or 1
         self.state['transformations'] = []
+        # The transformations that also accept whole NumPy arrays
+        self.state['np_transformations'] = []
+        # Those of them detected by auto_vectorize rather than flagged
+        self.state['auto_np_transformations'] = []
+        # (chain, kernel) built by compile_pipeline()
+        self.state['fused_kernel'] = None
+        # All transformations/filters as one callable, kept up to date as
+        # they're added so lists need one call per item
+        self.state['composed_transformation'] = None
+        self.state['composed_filter'] = None
         self.state['validators'] = []
         self.state['filters'] = []
         self.state['stats'] = {}
 
-    def add_transformation(self, func: Callable) -> 'DataProcessorAgent':
-        """Add a transformation function"""
+    def add_transformation(self, func: Callable, vectorized: bool = False) -> 'DataProcessorAgent':
+        """
+        Add a transformation function
+
+        Args:
+            func: Function applied to each item (or to the data, if it isn't a list)
+            vectorized: func works element-wise on a NumPy array too (e.g.
+                ``lambda x: x * 2``). When every transformation is vectorized,
+                numeric lists are transformed as one array instead of item by item.
+                With auto_vectorize on, lambdas of plain arithmetic on their
+                argument are detected from their source and need no flag.
+        """
+        if not self._initialized:
+            self.initialize()
         self.state['transformations'].append(func)
+        composed = self.state['composed_transformation']
+        self.state['composed_transformation'] = func if composed is None else _chain(composed, func)
+        if vectorized:
+            self.state['np_transformations'].append(func)
+        elif self.auto_vectorize and np is not None and _is_elementwise(func):
+            self.state['np_transformations'].append(func)
+            self.state['auto_np_transformations'].append(func)
+        # A compiled pipeline no longer matches
+        self.state['fused_kernel'] = None
         return self
 
+    def compile_pipeline(self) -> bool:
+        """
+        Fuse all transformations into one compiled loop with Numba
+
+        Each transformation must be a scalar function Numba can compile (plain
+        arithmetic lambdas or ``@numba.njit`` functions). Afterwards numeric
+        lists and arrays are transformed in a single parallel pass, without
+        intermediate lists. Adding a transformation drops the compiled
+        pipeline; call this again to rebuild it.
+
+        Numba compiles lazily, so a transformation it can't handle is only
+        found on the first run; that run logs a warning and drops back to the
+        normal path.
+
+        Returns:
+            True if the pipeline was built, False if Numba isn't installed or
+            there are no transformations
+        """
+        if not self._initialized:
+            self.initialize()
+        self.state['fused_kernel'] = None
+
+        transformations = self.state['transformations']
+        if not transformations:
+            return False
+
+        try:
+            import numba
+        except ImportError:
+            self.logger.warning("numba not installed, pipeline not compiled")
+            return False
+
+        try:
+            namespace = {'prange': numba.prange}
+            expr = 'x'
+            for i, func in enumerate(transformations):
+                if not isinstance(func, numba.core.dispatcher.Dispatcher):
+                    func = numba.njit(func)
+                namespace[f'f{i}'] = func
+                expr = f'f{i}({expr})'
+
+            exec(_FUSED_SOURCE.format(expr=expr), namespace)
+            # kernel() looks chain up in namespace when it's compiled, so it
+            # has to be the jitted version by then
+            namespace['chain'] = numba.njit(namespace['chain'])
+            kernel = numba.njit(parallel=True)(namespace['kernel'])
+        except Exception as e:
+            self.logger.warning(f"Could not compile pipeline: {e}")
+            return False
+
+        self.state['fused_kernel'] = (namespace['chain'], kernel)
+        return True
+
     def add_validator(self, func: Callable) -> 'DataProcessorAgent':
         """Add a validation function"""
+        if not self._initialized:
+            self.initialize()
         self.state['validators'].append(func)
         return self
 
     def add_filter(self, func: Callable) -> 'DataProcessorAgent':
         """Add a filter function"""
+        if not self._initialized:
+            self.initialize()
         self.state['filters'].append(func)
+        composed = self.state['composed_filter']
+        self.state['composed_filter'] = func if composed is None else _both(composed, func)
         return self
 
+    def add_filter_expr(self, column: str, op: str, value: Any) -> 'DataProcessorAgent':
+        """
+        Add a filter keeping records where ``record[column] <op> value``
+
+        Unlike opaque lambdas, expression filters can be vectorized.
+
+        Args:
+            column: Record key to compare
+            op: One of ==, !=, <, <=, >, >=
+            value: Value to compare against
+        """
+        return self.add_filter(ColumnExpr(column, op, value))
+
+    def add_transformation_expr(
+        self,
+        column: str,
+        op: str,
+        value: Any,
+        target: Optional[str] = None
+    ) -> 'DataProcessorAgent':
+        """
+        Add a transformation setting ``record[target] = record[column] <op> value``
+
+        Args:
+            column: Record key to read
+            op: One of +, -, *, /
+            value: Right-hand operand
+            target: Record key to write (defaults to column)
+        """
+        return self.add_transformation(ColumnAssign(target or column, ColumnExpr(column, op, value)))
+
     def execute(self, data: Any, **kwargs) -> Any:
         """
         Process data through the pipeline
 
         Args:
-            data: Input data
+            data: Input data. An iterator (e.g. from iter_csv) is processed
+                lazily: the result is an iterator too, and items are only
+                read as it's consumed.
             **kwargs: Additional options
+                validate (bool): Run validators first (default True)
+                calculate_stats (bool): Store statistics of the result
+                return_array (bool): Return the NumPy array from the vectorized
+                    numeric path instead of converting it back to a list
+                parallel (bool): Split large lists across worker processes;
+                    filters and transformations must be picklable unless
+                    processes are forked
 
         Returns:
             Processed data
@@ -75,21 +556,52 @@ class DataProcessorAgent(BaseAgent):
         result = data
         self.logger.info(f"Processing data: {type(data)}")
 
+        # Streams are filtered and transformed lazily, item by item
+        if isinstance(result, collections.abc.Iterator):
+            if kwargs.get('validate', True) and self.state['validators']:
+                raise ValueError(
+                    "Validators check the whole data set and can't run on an "
+                    "iterator; pass a list or validate=False"
+                )
+            return self._apply_stream(result)
+
         # Validate
         if kwargs.get('validate', True):
             self._validate(result)
 
-        # Filter
-        if self.state['filters']:
-            result = self._apply_filters(result)
+        # Set when the numeric paths transform the data as one NumPy array
+        array = None
+
+        # Records pandas can't process exactly fall through to the paths below
+        records = self._apply_vectorized(result) if self._can_vectorize(result) else None
+
+        if self._can_vectorize_arrow(result):
+            result = self._apply_arrow(result)
+        elif records is not None:
+            result = records
+        elif kwargs.get('parallel', False) and self._can_parallelize(result):
+            result = self._apply_parallel(result)
+        elif self._can_fuse(result):
+            result = self._apply_filters_and_transforms(result)
+        else:
+            # Filter
+            if self.state['filters']:
+                result = self._apply_filters(result)
 
-        # Transform
-        if self.state['transformations']:
-            result = self._apply_transformations(result)
+            # Transform
+            if self.state['transformations']:
+                array = self._apply_fused_kernel(result)
+                if array is None:
+                    array = self._apply_numeric_vectorized(result)
+                if array is None:
+                    result = self._apply_transformations(result)
+                else:
+                    result = array if kwargs.get('return_array', False) else array.tolist()
 
-        # Calculate stats if requested
+        # Calculate stats if requested, from the transformed array if there
+        # is one rather than converting the result again
         if kwargs.get('calculate_stats', False):
-            self.state['stats'] = self._calculate_stats(result)
+            self.state['stats'] = self._calculate_stats(result, array)
 
         self.logger.info("Data processing completed")
         return result
@@ -100,13 +612,272 @@ class DataProcessorAgent(BaseAgent):
             if not validator(data):
                 raise ValueError(f"Validation failed: {validator.__name__}")
 
+    def _can_vectorize(self, data: Any) -> bool:
+        """Check whether the pipeline can run as DataFrame column operations"""
+        if pd is None or not isinstance(data, list) or len(data) < self.vectorize_min_rows:
+            return False
+
+        if not (self.state['filters'] or self.state['transformations']):
+            return False
+        if not all(isinstance(f, ColumnExpr) for f in self.state['filters']):
+            return False
+        if not all(isinstance(t, ColumnAssign) for t in self.state['transformations']):
+            return False
+
+        # Every record must share one schema, otherwise pandas would fill in
+        # missing keys where the per-record path raises
+        if not isinstance(data[0], dict):
+            return False
+        keys = data[0].keys()
+        return all(isinstance(row, dict) and row.keys() == keys for row in data)
+
+    def _apply_vectorized(self, data: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Apply expression filters and transformations with pandas
+
+        Only the columns the expressions read go through pandas. Records are
+        built like the per-record path builds them: filtered records are the
+        input dicts, transformed ones are copies with the targets assigned.
+
+        Returns:
+            The processed records, or None if some column the expressions read
+            isn't cleanly typed enough for pandas to give the per-record
+            path's exact results
+        """
+        filters = self.state['filters']
+        transformations = self.state['transformations']
+
+        columns = {}
+        types = {}
+        for expr in [*filters, *(assign.expr for assign in transformations)]:
+            key = expr.column
+            if key not in types and key in data[0]:
+                values = _clean_column(data, key)
+                if values is None:
+                    return None
+                columns[key] = values
+                types[key] = type(values[0])
+        for expr in filters:
+            if _expr_type(types.get(expr.column), expr) is None:
+                return None
+        for assign in transformations:
+            kind = _expr_type(types.get(assign.expr.column), assign.expr)
+            if kind is None:
+                return None
+            types[assign.target] = kind
+
+        df = pd.DataFrame({
+            key: np.array(values, dtype=object if types[key] is str else None)
+            for key, values in columns.items()
+        })
+
+        if filters:
+            if not all(_int64_exact(df[expr.column], expr) for expr in filters):
+                return None
+            mask = filters[0].evaluate(df)
+            for expr in filters[1:]:
+                mask &= expr.evaluate(df)
+            df = df[mask].copy()
+            data = list(itertools.compress(data, mask.tolist()))
+
+        if not transformations:
+            return data
+
+        for assign in transformations:
+            if not _int64_exact(df[assign.expr.column], assign.expr):
+                return None
+            assign.apply(df)
+
+        result = list(map(dict, data))
+        for target in dict.fromkeys(assign.target for assign in transformations):
+            # tolist() gives plain Python values rather than NumPy scalars
+            for row, value in zip(result, df[target].tolist()):
+                row[target] = value
+        return result
+
+    def _apply_stream(self, data: Iterator) -> Iterator:
+        """Chain the filters and transformations onto an iterator"""
+        keep = self.state['composed_filter']
+        transform = self.state['composed_transformation']
+        if keep is not None and transform is not None:
+            return (transform(item) for item in data if keep(item))
+        if keep is not None:
+            return filter(keep, data)
+        if transform is not None:
+            return map(transform, data)
+        return data
+
+    def _can_vectorize_arrow(self, data: Any) -> bool:
+        """Check whether the pipeline can run as compute kernels on an Arrow table"""
+        if pa is None or not isinstance(data, pa.Table):
+            return False
+        return (
+            all(isinstance(f, ColumnExpr) for f in self.state['filters'])
+            and all(isinstance(t, ColumnAssign) for t in self.state['transformations'])
+        )
+
+    def _apply_arrow(self, table: Any) -> Any:
+        """Apply expression filters and transformations with pyarrow.compute"""
+        if self.state['filters']:
+            mask = self.state['filters'][0].evaluate_arrow(table)
+            for expr in self.state['filters'][1:]:
+                mask = pc.and_(mask, expr.evaluate_arrow(table))
+            table = table.filter(mask)
+
+        for assign in self.state['transformations']:
+            table = assign.apply_arrow(table)
+
+        return table
+
+    def _apply_fused_kernel(self, data: Any) -> Optional[Any]:
+        """
+        Transform a numeric list or array with the compiled pipeline
+
+        Returns:
+            The transformed array, or None if there's no compiled pipeline or
+            it doesn't apply to this data
+        """
+        fused = self.state['fused_kernel']
+        if fused is None or np is None:
+            return None
+        if isinstance(data, list):
+            if not data or type(data[0]) not in (int, float):
+                return None
+        elif not isinstance(data, np.ndarray):
+            return None
+
+        arr = np.asarray(data)
+        if arr.ndim != 1 or arr.size == 0 or arr.dtype.kind not in 'iuf':
+            return None
+
+        chain, kernel = fused
+        try:
+            # Compiles for this input type on first use; the first result
+            # also gives the output dtype
+            out = np.empty(arr.shape[0], dtype=np.asarray(chain(arr[0])).dtype)
+            kernel(arr, out)
+        except Exception as e:
+            self.logger.warning(f"Compiled pipeline failed, falling back: {e}")
+            self.state['fused_kernel'] = None
+            return None
+        return out
+
+    def _apply_numeric_vectorized(self, data: Any) -> Optional[Any]:
+        """
+        Transform a numeric list as one NumPy array
+
+        Returns:
+            The transformed array, or None if the list isn't numeric or some
+            transformation isn't vectorized
+
+        Detected (not flagged) transformations only run on lists of floats,
+        where NumPy's results match Python's: integer arrays would wrap
+        around where Python ints grow, and mixed lists would turn every
+        item into a float. If a floating-point error occurs, the list is
+        left to the per-item path, which raises or not just as Python does.
+        """
+        transformations = self.state['transformations']
+        if (
+            np is None
+            or not isinstance(data, list)
+            or not data
+            or type(data[0]) not in (int, float)
+            or len(self.state['np_transformations']) != len(transformations)
+        ):
+            return None
+
+        # The first item is only a hint; a mixed list (or ints too big for
+        # int64) doesn't give a numeric dtype
+        if self.state['auto_np_transformations']:
+            if set(map(type, data)) != {float}:
+                return None
+            try:
+                with np.errstate(all='raise'):
+                    arr = np.asarray(data, dtype=np.float64)
+                    for transform in transformations:
+                        arr = transform(arr)
+            except FloatingPointError:
+                return None
+            return arr
+
+        arr = np.asarray(data)
+        if arr.dtype.kind not in 'iuf':
+            return None
+
+        for transform in transformations:
+            arr = transform(arr)
+        return arr
+
+    def _can_parallelize(self, data: Any) -> bool:
+        """
+        Check whether a parallel execute() can use worker processes
+
+        Small lists aren't worth the process overhead, and a compiled pipeline
+        is faster anyway.
+        """
+        filters = self.state['filters']
+        transformations = self.state['transformations']
+        if (
+            not isinstance(data, list)
+            or len(data) < self.parallel_min_rows
+            or not (filters or transformations)
+            or self.state['fused_kernel'] is not None
+        ):
+            return False
+
+        # Forked workers inherit the pipeline; other start methods pickle it
+        if multiprocessing.get_start_method() != 'fork':
+            try:
+                pickle.dumps((filters, transformations))
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                self.logger.warning(f"Pipeline isn't picklable, running serially: {e}")
+                return False
+
+        return True
+
+    def _apply_parallel(self, data: List) -> List:
+        """
+        Filter and transform a list across worker processes
+
+        The list is split into contiguous chunks, so results keep their order.
+        """
+        filters = self.state['filters']
+        transformations = self.state['transformations']
+        workers = self.parallel_workers
+        # A few chunks per worker evens out uneven item costs
+        size = -(-len(data) // (workers * 4))
+        chunks = [data[i:i + size] for i in range(0, len(data), size)]
+
+        with multiprocessing.Pool(workers, _init_worker, (filters, transformations)) as pool:
+            results = pool.map(_run_chunk, chunks)
+
+        return [item for chunk in results for item in chunk]
+
+    def _can_fuse(self, data: Any) -> bool:
+        """
+        Check whether filters and transformations can run as one list pass
+
+        Left to the array paths when one of them could take the filtered list.
+        """
+        transformations = self.state['transformations']
+        if not (isinstance(data, list) and self.state['filters'] and transformations):
+            return False
+        if self.state['fused_kernel'] is not None:
+            return False
+        return np is None or len(self.state['np_transformations']) != len(transformations)
+
+    def _apply_filters_and_transforms(self, data: List) -> List:
+        """Filter and transform a list in one pass, without an intermediate list"""
+        keep = self.state['composed_filter']
+        transform = self.state['composed_transformation']
+        return [transform(item) for item in data if keep(item)]
+
     def _apply_filters(self, data: Any) -> Any:
         """Apply all filters to data"""
         if isinstance(data, list):
-            result = data
-            for filter_func in self.state['filters']:
-                result = [item for item in result if filter_func(item)]
-            return result
+            # One pass; an item is dropped at the first filter it fails
+            keep = self.state['composed_filter']
+            return [item for item in data if keep(item)]
         else:
             for filter_func in self.state['filters']:
                 if not filter_func(data):
@@ -115,6 +886,10 @@ class DataProcessorAgent(BaseAgent):
 
     def _apply_transformations(self, data: Any) -> Any:
         """Apply all transformations to data"""
+        if isinstance(data, list):
+            transform = self.state['composed_transformation']
+            return [transform(item) for item in data]
+
         result = data
 
         for transform in self.state['transformations']:
@@ -125,8 +900,27 @@ class DataProcessorAgent(BaseAgent):
 
         return result
 
-    def _calculate_stats(self, data: Any) -> Dict[str, Any]:
-        """Calculate basic statistics on data"""
+    def _calculate_stats(self, data: Any, array: Any = None) -> Dict[str, Any]:
+        """
+        Calculate basic statistics on data
+
+        Args:
+            data: Processed data
+            array: The same data as a 1-D NumPy array, if the pipeline built one
+        """
+        if array is None and np is not None and isinstance(data, np.ndarray):
+            if data.ndim == 1 and data.dtype.kind in 'iuf':
+                array = data
+
+        if array is not None:
+            stats = {
+                'count': array.size,
+                'type': type(array[0].item()).__name__ if array.size else 'empty'
+            }
+            if array.size:
+                stats.update(self._array_stats(array))
+            return stats
+
         if not isinstance(data, list):
             return {'type': type(data).__name__}
 
@@ -137,39 +931,138 @@ class DataProcessorAgent(BaseAgent):
 
         # Numeric stats
         if data and isinstance(data[0], (int, float)):
-            stats['min'] = min(data)
-            stats['max'] = max(data)
-            stats['sum'] = sum(data)
-            stats['avg'] = sum(data) / len(data)
+            numeric = self._numeric_stats(data)
+            if numeric is not None:
+                stats.update(numeric)
+
+        # Per-column summary for record lists
+        elif pd is not None and data and isinstance(data[0], dict):
+            numeric = pd.DataFrame.from_records(data).select_dtypes('number')
+            if not numeric.empty:
+                stats['columns'] = numeric.describe().to_dict()
 
         return stats
 
+    def _numeric_stats(self, data: List) -> Optional[Dict[str, Any]]:
+        """min/max/sum/avg of a numeric list, or None if not every item is a number"""
+        if np is not None and len(data) >= _NP_STATS_MIN_ROWS:
+            # The dtype checks the whole list, not just its first item
+            try:
+                arr = np.asarray(data)
+            except (TypeError, ValueError):
+                arr = None
+            if arr is not None and arr.dtype.kind in 'iuf':
+                return self._array_stats(arr)
+
+        if not all(isinstance(item, (int, float)) for item in data):
+            return None
+        total = sum(data)
+        return {'min': min(data), 'max': max(data), 'sum': total, 'avg': total / len(data)}
+
+    def _array_stats(self, arr: Any) -> Dict[str, Any]:
+        """min/max/sum/avg of a non-empty numeric NumPy array, as Python numbers"""
+        low = arr.min().item()
+        high = arr.max().item()
+        if arr.dtype.kind == 'f' or max(abs(low), abs(high)) * arr.size < 2 ** 63:
+            total = arr.sum().item()
+        else:
+            # An int64 sum could overflow
+            total = sum(arr.tolist())
+        return {'min': low, 'max': high, 'sum': total, 'avg': total / arr.size}
+
     def load_json(self, filepath: str) -> Any:
         """Load data from JSON file"""
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        if orjson is not None and not _LONG_DIGITS.search(content):
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                # e.g. the NaN and Infinity literals json writes
+                pass
+        return json.loads(content)
 
     def save_json(self, data: Any, filepath: str) -> None:
         """Save data to JSON file"""
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        content = None
+        if orjson is not None and not _has_non_finite(data):
+            try:
+                content = orjson.dumps(
+                    data,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                )
+            except TypeError:
+                # e.g. integers beyond 64 bits, which json handles
+                pass
+        if content is None:
+            content = json.dumps(data, indent=2, default=_json_default).encode()
+
+        with open(filepath, 'wb') as f:
+            f.write(content)
         self.logger.info(f"Data saved to {filepath}")
 
     def load_csv(self, filepath: str, **kwargs) -> List[Dict]:
         """Load data from CSV file"""
+        if os.path.getsize(filepath) > _LARGE_CSV_BYTES:
+            self.logger.warning(
+                f"{filepath} is large; iter_csv() streams it (or load_csv_arrow() "
+                f"loads it as a columnar table) with far less memory"
+            )
+        return list(self.iter_csv(filepath, **kwargs))
+
+    def iter_csv(self, filepath: str, **kwargs) -> Iterator[Dict]:
+        """
+        Read a CSV file one row at a time
+
+        Only the current row is held in memory. Pass the iterator to execute()
+        to process the file as a stream; the file is closed once it's
+        exhausted.
+        """
         with open(filepath, 'r') as f:
-            reader = csv.DictReader(f, **kwargs)
-            return list(reader)
+            yield from csv.DictReader(f, **kwargs)
+
+    def load_csv_arrow(self, filepath: str, **kwargs) -> Any:
+        """
+        Load a CSV file as a pyarrow Table
+
+        Columns are parsed and typed in parallel into contiguous arrays, rather
+        than one dict of strings per row. Expression filters and
+        transformations (add_filter_expr, add_transformation_expr) run on the
+        table with Arrow's compute kernels.
+
+        Args:
+            filepath: CSV file to read
+            **kwargs: Passed to pyarrow.csv.read_csv (read_options, parse_options,
+                convert_options)
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for load_csv_arrow: pip install pyarrow")
+        from pyarrow import csv as pacsv
+        return pacsv.read_csv(filepath, **kwargs)
 
     def save_csv(self, data: List[Dict], filepath: str, **kwargs) -> None:
         """Save data to CSV file"""
         if not data:
             return
 
+        keys = data[0].keys()
         with open(filepath, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=data[0].keys(), **kwargs)
-            writer.writeheader()
-            writer.writerows(data)
+            if all(row.keys() == keys for row in data):
+                # Every row has the header's keys, so rows can be written as
+                # tuples without DictWriter's per-row key checks
+                fieldnames = list(keys)
+                kwargs.pop('restval', None)
+                kwargs.pop('extrasaction', None)
+                writer = csv.writer(f, **kwargs)
+                writer.writerow(fieldnames)
+                if len(fieldnames) == 1:
+                    writer.writerows((row[fieldnames[0]],) for row in data)
+                else:
+                    writer.writerows(map(operator.itemgetter(*fieldnames), data))
+            else:
+                writer = csv.DictWriter(f, fieldnames=keys, **kwargs)
+                writer.writeheader()
+                writer.writerows(data)
         self.logger.info(f"Data saved to {filepath}")
 
     def get_stats(self) -> Dict[str, Any]:
@@ -179,6 +1072,11 @@ class DataProcessorAgent(BaseAgent):
     def reset_pipeline(self) -> None:
         """Clear all transformations, validators, and filters"""
         self.state['transformations'] = []
+        self.state['np_transformations'] = []
+        self.state['auto_np_transformations'] = []
+        self.state['fused_kernel'] = None
+        self.state['composed_transformation'] = None
+        self.state['composed_filter'] = None
         self.state['validators'] = []
         self.state['filters'] = []
         self.logger.info("Pipeline reset")
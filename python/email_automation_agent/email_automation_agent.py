@@ -10,10 +10,59 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from base.agent import BaseAgent
+from base.llm import get_anthropic_client, get_openai_client
 from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
 import re
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from collections import OrderedDict
+from email.message import EmailMessage
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+# Keywords are matched as substrings of the lowercased text; str's `in` is
+# faster than a regex alternation over these short lists
+
+# Keyword classification, checked in order; the first match wins
+_CATEGORY_KEYWORDS = (
+    ('order_inquiry', frozenset({'order', 'tracking', 'shipment', 'delivery'})),
+    ('complaint', frozenset({'complaint', 'disappointed', 'angry', 'terrible', 'worst'})),
+    ('refund_request', frozenset({'refund', 'return', 'money back'})),
+    ('product_question', frozenset({'product', 'item', 'available', 'stock'})),
+    ('spam', frozenset({'viagra', 'casino', 'lottery', 'click here'})),
+)
+
+# With pyahocorasick, one automaton finds every category keyword in a single
+# pass; each keyword maps to its category's index in _CATEGORY_KEYWORDS
+def _category_automaton() -> Any:
+    automaton = ahocorasick.Automaton()
+    for index, (_, keywords) in enumerate(_CATEGORY_KEYWORDS):
+        for word in keywords:
+            automaton.add_word(word, index)
+    automaton.make_automaton()
+    return automaton
+
+
+_CATEGORY_AUTOMATON = _category_automaton() if ahocorasick is not None else None
+
+# Sentiment indicators
+_NEGATIVE_WORDS = frozenset({'angry', 'disappointed', 'terrible', 'worst', 'horrible',
+                             'unacceptable', 'frustrated', 'upset', 'annoyed'})
+_POSITIVE_WORDS = frozenset({'thank', 'great', 'excellent', 'love', 'happy',
+                             'appreciate', 'wonderful', 'perfect'})
+
+# High priority indicators
+_HIGH_PRIORITY_WORDS = frozenset({'urgent', 'asap', 'immediately', 'emergency', 'critical'})
+
+# Data extraction: "#123", "order 123", "order #123" or "order number 123"
+_ORDER_RE = re.compile(r'(?:#|order\s+(?:#|number\s+)?)(\d+)', re.IGNORECASE)
+_TRACKING_RE = re.compile(r'(?:tracking|track)[\s:#]*([A-Z0-9]{10,})', re.IGNORECASE)
+_AMOUNT_RE = re.compile(r'\$(\d+(?:\.\d{2})?)')
+_DATE_RE = re.compile(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}')
 
 
 class EmailAutomationAgent(BaseAgent):
@@ -74,6 +123,13 @@ class EmailAutomationAgent(BaseAgent):
         # Email templates
         self.state['templates'] = self.config.get('templates', {})
 
+        # Concurrent LLM requests in execute_batch()
+        self.state['max_concurrency'] = self.config.get('max_concurrency', 8)
+
+        # LLM response bodies by prompt digest, least recently used first
+        self._response_cache = OrderedDict()
+        self._response_cache_size = self.config.get('response_cache_size', 1024)
+
         # Categories
         self.state['categories'] = [
             'order_inquiry',
@@ -95,16 +151,14 @@ class EmailAutomationAgent(BaseAgent):
 
         if provider == 'anthropic':
             try:
-                import anthropic
-                self.state['llm_client'] = anthropic.Anthropic(api_key=self.state['llm_api_key'])
+                self.state['llm_client'] = get_anthropic_client(self.state['llm_api_key'])
                 self.logger.info("Anthropic client initialized")
             except ImportError:
                 self.logger.warning("Anthropic package not installed")
                 self.state['llm_client'] = None
         elif provider == 'openai':
             try:
-                import openai
-                self.state['llm_client'] = openai.OpenAI(api_key=self.state['llm_api_key'])
+                self.state['llm_client'] = get_openai_client(self.state['llm_api_key'])
                 self.logger.info("OpenAI client initialized")
             except ImportError:
                 self.logger.warning("OpenAI package not installed")
@@ -129,6 +183,8 @@ class EmailAutomationAgent(BaseAgent):
             from_email: Sender's email address
             from_name: Sender's name (optional)
             **kwargs: Additional context
+                no_cache (bool): Always ask the LLM, even for an email it
+                    already answered
 
         Returns:
             Dictionary with:
@@ -145,6 +201,99 @@ class EmailAutomationAgent(BaseAgent):
         # Classify email
         category = self._classify_email(email_subject, email_body)
 
+        result = self._analyze_email(category, email_subject, email_body, from_email, from_name)
+
+        # Generate response
+        result['response'] = self._generate_response(
+            category=category,
+            subject=email_subject,
+            body=email_body,
+            from_name=from_name or from_email.split('@')[0],
+            extracted_data=result['extracted_data'],
+            sentiment=result['sentiment'],
+            use_cache=not kwargs.get('no_cache', False)
+        )
+
+        self.logger.info(f"Processed email: {category} | {result['priority']} priority | {result['sentiment']} sentiment")
+
+        return result
+
+    def execute_batch(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process many emails, with their LLM calls made concurrently
+
+        With the Anthropic provider every email is classified and answered
+        over one async client, at most ``max_concurrency`` requests at a time,
+        so a batch takes about as long as its slowest emails rather than the
+        sum of all of them. Otherwise emails are processed one by one.
+
+        Args:
+            emails: Dictionaries of execute() arguments (email_subject,
+                email_body, from_email and optionally from_name)
+
+        Returns:
+            One execute() result per email, in order
+        """
+        if not self._initialized:
+            self.initialize()
+
+        if not self.state['llm_client'] or self.state['llm_provider'] != 'anthropic':
+            return [self.execute(**email) for email in emails]
+
+        return asyncio.run(self._execute_batch_async(emails))
+
+    async def _execute_batch_async(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Process all emails concurrently on one async client"""
+        import anthropic
+
+        limit = asyncio.Semaphore(self.state['max_concurrency'])
+
+        async with anthropic.AsyncAnthropic(api_key=self.state['llm_api_key']) as client:
+            return await asyncio.gather(*[
+                self._process_one_async(client, limit, **email) for email in emails
+            ])
+
+    async def _process_one_async(
+        self,
+        client: Any,
+        limit: asyncio.Semaphore,
+        email_subject: str,
+        email_body: str,
+        from_email: str,
+        from_name: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async counterpart of execute() for one email"""
+        async with limit:
+            category = await self._classify_email_async(client, email_subject, email_body)
+
+        result = self._analyze_email(category, email_subject, email_body, from_email, from_name)
+
+        async with limit:
+            result['response'] = await self._generate_response_async(
+                client,
+                category=category,
+                subject=email_subject,
+                body=email_body,
+                from_name=from_name or from_email.split('@')[0],
+                extracted_data=result['extracted_data'],
+                sentiment=result['sentiment'],
+                use_cache=not kwargs.get('no_cache', False)
+            )
+
+        self.logger.info(f"Processed email: {category} | {result['priority']} priority | {result['sentiment']} sentiment")
+
+        return result
+
+    def _analyze_email(
+        self,
+        category: str,
+        email_subject: str,
+        email_body: str,
+        from_email: str,
+        from_name: Optional[str]
+    ) -> Dict[str, Any]:
+        """Build the result for a classified email, except for its response"""
         # Analyze sentiment
         sentiment = self._analyze_sentiment(email_body)
 
@@ -157,58 +306,42 @@ class EmailAutomationAgent(BaseAgent):
         # Check if should escalate
         should_escalate = self._should_escalate(category, sentiment, priority)
 
-        # Generate response
-        response = self._generate_response(
-            category=category,
-            subject=email_subject,
-            body=email_body,
-            from_name=from_name or from_email.split('@')[0],
-            extracted_data=extracted_data,
-            sentiment=sentiment
-        )
-
-        result = {
+        return {
             'category': category,
             'priority': priority,
             'sentiment': sentiment,
-            'response': response,
+            'response': None,
             'extracted_data': extracted_data,
             'should_escalate': should_escalate,
             'from_email': from_email,
             'from_name': from_name
         }
 
-        self.logger.info(f"Processed email: {category} | {priority} priority | {sentiment} sentiment")
-
-        return result
-
     def _classify_email(self, subject: str, body: str) -> str:
         """Classify email into category"""
         if not self.state['llm_client']:
             # Simple keyword-based classification
             text = (subject + ' ' + body).lower()
 
-            if any(word in text for word in ['order', 'tracking', 'shipment', 'delivery']):
-                return 'order_inquiry'
-            elif any(word in text for word in ['complaint', 'disappointed', 'angry', 'terrible', 'worst']):
-                return 'complaint'
-            elif any(word in text for word in ['refund', 'return', 'money back']):
-                return 'refund_request'
-            elif any(word in text for word in ['product', 'item', 'available', 'stock']):
-                return 'product_question'
-            elif any(word in text for word in ['viagra', 'casino', 'lottery', 'click here']):
-                return 'spam'
-            else:
-                return 'general_question'
+            if _CATEGORY_AUTOMATON is not None:
+                # The earliest category in the list wins, wherever it matched
+                best = len(_CATEGORY_KEYWORDS)
+                for _, index in _CATEGORY_AUTOMATON.iter(text):
+                    if index < best:
+                        best = index
+                        if best == 0:
+                            break
+                if best == len(_CATEGORY_KEYWORDS):
+                    return 'general_question'
+                return _CATEGORY_KEYWORDS[best][0]
+
+            for category, keywords in _CATEGORY_KEYWORDS:
+                if any(word in text for word in keywords):
+                    return category
+            return 'general_question'
 
         # Use LLM for classification
-        prompt = f"""Classify this email into one of these categories:
-{', '.join(self.state['categories'])}
-
-Subject: {subject}
-Body: {body}
-
-Respond with ONLY the category name, nothing else."""
+        prompt = self._classification_prompt(subject, body)
 
         try:
             if self.state['llm_provider'] == 'anthropic':
@@ -230,20 +363,35 @@ Respond with ONLY the category name, nothing else."""
         except:
             return 'general_question'
 
+    async def _classify_email_async(self, client: Any, subject: str, body: str) -> str:
+        """Classify email with the async Anthropic client"""
+        try:
+            response = await client.messages.create(
+                model=self.state['model'],
+                max_tokens=50,
+                messages=[{'role': 'user', 'content': self._classification_prompt(subject, body)}]
+            )
+            category = response.content[0].text.strip().lower()
+            return category if category in self.state['categories'] else 'general_question'
+        except:
+            return 'general_question'
+
+    def _classification_prompt(self, subject: str, body: str) -> str:
+        """Build the LLM classification prompt"""
+        return f"""Classify this email into one of these categories:
+{', '.join(self.state['categories'])}
+
+Subject: {subject}
+Body: {body}
+
+Respond with ONLY the category name, nothing else."""
+
     def _analyze_sentiment(self, text: str) -> str:
         """Analyze sentiment of email"""
         text_lower = text.lower()
 
-        # Negative indicators
-        negative_words = ['angry', 'disappointed', 'terrible', 'worst', 'horrible',
-                         'unacceptable', 'frustrated', 'upset', 'annoyed']
-
-        # Positive indicators
-        positive_words = ['thank', 'great', 'excellent', 'love', 'happy',
-                         'appreciate', 'wonderful', 'perfect']
-
-        negative_score = sum(1 for word in negative_words if word in text_lower)
-        positive_score = sum(1 for word in positive_words if word in text_lower)
+        negative_score = sum(1 for word in _NEGATIVE_WORDS if word in text_lower)
+        positive_score = sum(1 for word in _POSITIVE_WORDS if word in text_lower)
 
         if negative_score > positive_score:
             return 'negative'
@@ -254,12 +402,9 @@ Respond with ONLY the category name, nothing else."""
 
     def _determine_priority(self, category: str, sentiment: str, subject: str, body: str) -> str:
         """Determine email priority"""
-        # High priority indicators
-        high_priority_words = ['urgent', 'asap', 'immediately', 'emergency', 'critical']
-
         text = (subject + ' ' + body).lower()
 
-        if any(word in text for word in high_priority_words):
+        if any(word in text for word in _HIGH_PRIORITY_WORDS):
             return 'high'
 
         if category in ['complaint', 'refund_request'] or sentiment == 'negative':
@@ -276,34 +421,25 @@ Respond with ONLY the category name, nothing else."""
 
         data = {}
 
-        # Extract order numbers
-        order_patterns = [
-            r'#(\d+)',
-            r'order\s+(\d+)',
-            r'order\s+#(\d+)',
-            r'order\s+number\s+(\d+)'
-        ]
-
-        for pattern in order_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                data['order_number'] = match.group(1)
-                break
+        # Extract order numbers (the first one mentioned)
+        order_match = _ORDER_RE.search(text)
+        if order_match:
+            data['order_number'] = order_match.group(1)
 
         # Extract tracking numbers
-        tracking_match = re.search(r'(?:tracking|track)[\s:#]*([A-Z0-9]{10,})', text, re.IGNORECASE)
+        tracking_match = _TRACKING_RE.search(text)
         if tracking_match:
             data['tracking_number'] = tracking_match.group(1)
 
         # Extract dollar amounts
-        amount_match = re.search(r'\$(\d+(?:\.\d{2})?)', text)
+        amount_match = _AMOUNT_RE.search(text)
         if amount_match:
             data['amount'] = amount_match.group(1)
 
         # Extract dates (simple patterns)
-        date_match = re.search(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', text)
+        date_match = _DATE_RE.search(text)
         if date_match:
-            data['date'] = date_match.group(1)
+            data['date'] = date_match.group()
 
         return data
 
@@ -327,7 +463,8 @@ Respond with ONLY the category name, nothing else."""
         body: str,
         from_name: str,
         extracted_data: Dict[str, Any],
-        sentiment: str
+        sentiment: str,
+        use_cache: bool = True
     ) -> str:
         """Generate email response"""
         # Check for template
@@ -345,20 +482,14 @@ Respond with ONLY the category name, nothing else."""
             return self._generate_default_response(category, from_name, extracted_data)
 
         # Build context for LLM
-        context = f"""You are writing a customer service email response for {self.state['company_name']}.
-
-Original Email Subject: {subject}
-Original Email Body: {body}
-
-Customer Name: {from_name}
-Email Category: {category}
-Sentiment: {sentiment}
-Extracted Data: {extracted_data}
+        context = self._response_prompt(category, subject, body, from_name, extracted_data, sentiment)
 
-Write a professional, helpful email response. Be empathetic if the sentiment is negative.
-Keep it concise (2-3 paragraphs). Address the customer's concern directly.
-
-Do not include subject line or signature - just the body."""
+        # Identical emails get the same prompt, and the answer already given
+        key = self._response_cache_key(context)
+        if use_cache:
+            cached = self._cached_response(key)
+            if cached is not None:
+                return cached + '\n\n' + self.state['signature']
 
         try:
             if self.state['llm_provider'] == 'anthropic':
@@ -376,11 +507,94 @@ Do not include subject line or signature - just the body."""
                 )
                 email_body = response.choices[0].message.content.strip()
 
+            self._cache_response(key, email_body)
             return email_body + '\n\n' + self.state['signature']
         except Exception as e:
             self.logger.error(f"Error generating response: {e}")
             return self._generate_default_response(category, from_name, extracted_data)
 
+    async def _generate_response_async(
+        self,
+        client: Any,
+        category: str,
+        subject: str,
+        body: str,
+        from_name: str,
+        extracted_data: Dict[str, Any],
+        sentiment: str,
+        use_cache: bool = True
+    ) -> str:
+        """Generate email response with the async Anthropic client"""
+        if category in self.state['templates']:
+            return self._generate_response(category, subject, body, from_name, extracted_data, sentiment)
+
+        context = self._response_prompt(category, subject, body, from_name, extracted_data, sentiment)
+
+        key = self._response_cache_key(context)
+        if use_cache:
+            cached = self._cached_response(key)
+            if cached is not None:
+                return cached + '\n\n' + self.state['signature']
+
+        try:
+            response = await client.messages.create(
+                model=self.state['model'],
+                max_tokens=500,
+                messages=[{'role': 'user', 'content': context}]
+            )
+            email_body = response.content[0].text.strip()
+            self._cache_response(key, email_body)
+            return email_body + '\n\n' + self.state['signature']
+        except Exception as e:
+            self.logger.error(f"Error generating response: {e}")
+            return self._generate_default_response(category, from_name, extracted_data)
+
+    def _response_cache_key(self, context: str) -> str:
+        """Digest of everything that determines an LLM response"""
+        key = f"{self.state['llm_provider']}\0{self.state['model']}\0{context}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _cached_response(self, key: str) -> Optional[str]:
+        """Get a cached response body, marking it recently used"""
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            self._response_cache.move_to_end(key)
+        return cached
+
+    def _cache_response(self, key: str, email_body: str) -> None:
+        """Remember a response body, evicting the least recently used"""
+        if self._response_cache_size <= 0:
+            return
+        self._response_cache[key] = email_body
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > self._response_cache_size:
+            self._response_cache.popitem(last=False)
+
+    def _response_prompt(
+        self,
+        category: str,
+        subject: str,
+        body: str,
+        from_name: str,
+        extracted_data: Dict[str, Any],
+        sentiment: str
+    ) -> str:
+        """Build the LLM response prompt"""
+        return f"""You are writing a customer service email response for {self.state['company_name']}.
+
+Original Email Subject: {subject}
+Original Email Body: {body}
+
+Customer Name: {from_name}
+Email Category: {category}
+Sentiment: {sentiment}
+Extracted Data: {extracted_data}
+
+Write a professional, helpful email response. Be empathetic if the sentiment is negative.
+Keep it concise (2-3 paragraphs). Address the customer's concern directly.
+
+Do not include subject line or signature - just the body."""
+
     def _generate_default_response(self, category: str, from_name: str, extracted_data: Dict) -> str:
         """Generate default response without LLM"""
         responses = {
@@ -392,14 +606,13 @@ Do not include subject line or signature - just the body."""
 
         return responses.get(category, f"Hi {from_name},\n\nThank you for contacting {self.state['company_name']}. We've received your message and will respond soon.\n\n{self.state['signature']}")
 
-    def create_email_message(self, result: Dict[str, Any], subject: str = None) -> MIMEMultipart:
-        """Create email message object"""
-        msg = MIMEMultipart()
+    def create_email_message(self, result: Dict[str, Any], subject: str = None) -> EmailMessage:
+        """Create email message object (a single text/plain part)"""
+        msg = EmailMessage()
         msg['From'] = self.state['support_email']
         msg['To'] = result['from_email']
         msg['Subject'] = subject or f"Re: {result.get('original_subject', 'Your inquiry')}"
-
-        msg.attach(MIMEText(result['response'], 'plain'))
+        msg.set_content(result['response'])
 
         return msg
 
@@ -2,7 +2,27 @@
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from base.agent import BaseAgent
+from base.llm import get_anthropic_client
 from typing import List, Dict
+import json
+import threading
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# simdjson parsers are reusable but not thread-safe, so one per thread
+_parsers = threading.local()
+
+def _loads(text: str):
+    """Parse JSON, with a reused simdjson parser when it's installed"""
+    if simdjson is None:
+        return json.loads(text)
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = _parsers.parser = simdjson.Parser()
+    return parser.parse(text.encode(), True)
 
 class FAQGeneratorAgent(BaseAgent):
     def _initialize(self):
@@ -13,8 +33,7 @@ class FAQGeneratorAgent(BaseAgent):
     def _init_llm(self):
         if self.state['llm_provider'] == 'anthropic':
             try:
-                import anthropic
-                self.state['client'] = anthropic.Anthropic(api_key=self.state['llm_api_key'])
+                self.state['client'] = get_anthropic_client(self.state['llm_api_key'])
             except: self.state['client'] = None
     
     def execute(self, content: str, num_faqs: int = 10) -> List[Dict]:
@@ -34,8 +53,7 @@ Format as JSON array with "question" and "answer" fields."""
                 max_tokens=2000,
                 messages=[{'role': 'user', 'content': prompt}]
             )
-            import json
-            return json.loads(resp.content[0].text)
+            return _loads(resp.content[0].text)
         except:
             return [{"error": "Could not generate FAQs"}]
 
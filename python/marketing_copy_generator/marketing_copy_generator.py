@@ -2,46 +2,20 @@
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from base.agent import BaseAgent
+from base.llm import get_anthropic_client
 
-class MarketingCopyGenerator(BaseAgent):
-    def _initialize(self):
-        self.state['llm_provider'] = self.config.get('llm_provider', 'anthropic')
-        self.state['llm_api_key'] = self.config.get('llm_api_key', os.getenv('LLM_API_KEY'))
-        self.state['brand_voice'] = self.config.get('brand_voice', 'professional')
-        self._init_llm()
-    
-    def _init_llm(self):
-        if self.state['llm_provider'] == 'anthropic':
-            try:
-                import anthropic
-                self.state['client'] = anthropic.Anthropic(api_key=self.state['llm_api_key'])
-            except: self.state['client'] = None
-    
-    def execute(self, content_type: str, product: str, **kwargs) -> dict:
-        """
-        Generate marketing copy
-        
-        Types: product_description, email_campaign, ad_copy, landing_page, seo_content
-        """
-        if not self._initialized: self.initialize()
-        
-        templates = {
-            "product_description": f"Introducing {product} - a premium product",
-            "email_campaign": f"Subject: Special offer on {product}!\n\nDear customer...",
-            "ad_copy": f"Get {product} today! Limited time offer.",
-            "landing_page": f"# {product}\n\nThe best choice for...",
-            "seo_content": f"{product} - Top Quality Product"
-        }
-        
-        if not self.state['client']:
-            return {"copy": templates.get(content_type, "Marketing copy"), "type": content_type}
-        
-        target_audience = kwargs.get('target_audience', 'general audience')
-        key_features = kwargs.get('features', [])
-        tone = kwargs.get('tone', self.state['brand_voice'])
-        
-        prompts = {
-            "product_description": f"""Write a compelling product description for: {product}
+# Copy used without an LLM, formatted with the product name
+_TEMPLATES = {
+    "product_description": "Introducing {product} - a premium product",
+    "email_campaign": "Subject: Special offer on {product}!\n\nDear customer...",
+    "ad_copy": "Get {product} today! Limited time offer.",
+    "landing_page": "# {product}\n\nThe best choice for...",
+    "seo_content": "{product} - Top Quality Product"
+}
+
+# LLM prompt builders by content type; only the requested one is formatted
+def _product_description_prompt(product, target_audience, key_features, tone, kwargs):
+    return f"""Write a compelling product description for: {product}
 
 Target audience: {target_audience}
 Key features: {', '.join(key_features) if key_features else 'N/A'}
@@ -53,9 +27,10 @@ Include:
 - Social proof or trust elements
 - Call-to-action
 
-Length: 150-200 words""",
-            
-            "email_campaign": f"""Write an email campaign for: {product}
+Length: 150-200 words"""
+
+def _email_campaign_prompt(product, target_audience, key_features, tone, kwargs):
+    return f"""Write an email campaign for: {product}
 
 Target: {target_audience}
 Tone: {tone}
@@ -67,17 +42,19 @@ Include:
 - Clear CTA button text
 - P.S. line
 
-Make it personal and conversion-focused.""",
-            
-            "ad_copy": f"""Write 3 ad copy variations for: {product}
+Make it personal and conversion-focused."""
+
+def _ad_copy_prompt(product, target_audience, key_features, tone, kwargs):
+    return f"""Write 3 ad copy variations for: {product}
 
 Platform: {kwargs.get('platform', 'Google Ads')}
 Audience: {target_audience}
 Max length: {kwargs.get('max_length', 90)} characters
 
-Focus on benefits, use power words, include CTA.""",
-            
-            "landing_page": f"""Write landing page copy for: {product}
+Focus on benefits, use power words, include CTA."""
+
+def _landing_page_prompt(product, target_audience, key_features, tone, kwargs):
+    return f"""Write landing page copy for: {product}
 
 Sections needed:
 1. Hero headline + subheadline
@@ -89,9 +66,10 @@ Sections needed:
 7. Final CTA
 
 Tone: {tone}
-Audience: {target_audience}""",
-            
-            "seo_content": f"""Write SEO-optimized content for: {product}
+Audience: {target_audience}"""
+
+def _seo_content_prompt(product, target_audience, key_features, tone, kwargs):
+    return f"""Write SEO-optimized content for: {product}
 
 Target keyword: {kwargs.get('keyword', product)}
 Word count: {kwargs.get('word_count', 800)}
@@ -102,9 +80,50 @@ Include:
 - H1, H2, H3 structure
 - Natural keyword placement
 - Internal linking suggestions"""
-        }
+
+_PROMPT_BUILDERS = {
+    "product_description": _product_description_prompt,
+    "email_campaign": _email_campaign_prompt,
+    "ad_copy": _ad_copy_prompt,
+    "landing_page": _landing_page_prompt,
+    "seo_content": _seo_content_prompt
+}
+
+class MarketingCopyGenerator(BaseAgent):
+    def _initialize(self):
+        self.state['llm_provider'] = self.config.get('llm_provider', 'anthropic')
+        self.state['llm_api_key'] = self.config.get('llm_api_key', os.getenv('LLM_API_KEY'))
+        self.state['brand_voice'] = self.config.get('brand_voice', 'professional')
+        self._init_llm()
+    
+    def _init_llm(self):
+        if self.state['llm_provider'] == 'anthropic':
+            try:
+                self.state['client'] = get_anthropic_client(self.state['llm_api_key'])
+            except: self.state['client'] = None
+    
+    def execute(self, content_type: str, product: str, **kwargs) -> dict:
+        """
+        Generate marketing copy
+        
+        Types: product_description, email_campaign, ad_copy, landing_page, seo_content
+        """
+        if not self._initialized: self.initialize()
+        
+        if not self.state['client']:
+            template = _TEMPLATES.get(content_type)
+            copy = template.format(product=product) if template else "Marketing copy"
+            return {"copy": copy, "type": content_type}
+        
+        target_audience = kwargs.get('target_audience', 'general audience')
+        key_features = kwargs.get('features', [])
+        tone = kwargs.get('tone', self.state['brand_voice'])
         
-        prompt = prompts.get(content_type, f"Write marketing copy for {product}")
+        builder = _PROMPT_BUILDERS.get(content_type)
+        if builder is None:
+            prompt = f"Write marketing copy for {product}"
+        else:
+            prompt = builder(product, target_audience, key_features, tone, kwargs)
         
         try:
             resp = self.state['client'].messages.create(
@@ -9,8 +9,182 @@ import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from base.agent import BaseAgent
-from typing import List, Dict, Any, Optional
+from base.llm import get_anthropic_client
+from typing import AbstractSet, List, Dict, Any, Iterator, Optional, Tuple, Union
+import asyncio
+import bisect
+import copy
+import functools
+import hashlib
+import itertools
 import json
+import re
+import time
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Words of an ingredient name, except those negated as in 'soy-free'
+_WORD_RE = re.compile(r'\b[a-z]+\b(?!-free)')
+
+# Whole ingredient words that indicate each allergen; allergens not listed
+# here are matched by their own name
+_ALLERGEN_WORDS = {
+    'milk': frozenset({'milk', 'milks', 'buttermilk'}),
+    'eggs': frozenset({'egg', 'eggs', 'yolk', 'yolks'}),
+    'wheat': frozenset({'wheat'}),
+    'nuts': frozenset({'nut', 'nuts', 'almond', 'almonds', 'walnut', 'walnuts', 'pecan', 'pecans',
+                       'hazelnut', 'hazelnuts', 'cashew', 'cashews', 'pistachio', 'pistachios',
+                       'peanut', 'peanuts', 'macadamia'}),
+    'soy': frozenset({'soy', 'soya', 'soybean', 'soybeans', 'tofu'}),
+    'fish': frozenset({'fish', 'anchovy', 'anchovies'}),
+}
+
+# Ingredient words that make a recipe unsuitable for each diet
+_DIET_EXCLUDES = {
+    'dairy_free': _ALLERGEN_WORDS['milk'] | {'butter', 'cream', 'cheese', 'whey', 'casein', 'yogurt'},
+    'egg_free': _ALLERGEN_WORDS['eggs'],
+    'nut_free': _ALLERGEN_WORDS['nuts'],
+    'gluten_free': _ALLERGEN_WORDS['wheat'] | {'flour'},
+}
+_DIET_WORDS = frozenset().union(*_DIET_EXCLUDES.values())
+
+
+@functools.lru_cache(maxsize=8)
+def _allergen_database(words: Tuple[str, ...]) -> Any:
+    """
+    Compile whole-word patterns for words into one Hyperscan database, ids by position
+
+    Hyperscan's \\b only knows ASCII word characters, so matches next to
+    non-ASCII text need checking again.
+    """
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[rb'\b' + word.encode() + rb'\b' for word in words],
+        ids=list(range(len(words))),
+        elements=len(words),
+    )
+    return db
+
+
+# Tools the LLM is made to call, so responses arrive as schema-shaped objects
+_SUBSTITUTION_TOOL = {
+    'name': 'emit_substitutions',
+    'description': 'Report ingredient substitutions',
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'substitutes': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'name': {'type': 'string'},
+                        'ratio': {'type': 'string'},
+                        'notes': {'type': 'string'}
+                    },
+                    'required': ['name', 'ratio', 'notes']
+                }
+            }
+        },
+        'required': ['substitutes']
+    }
+}
+
+_NUTRITION_TOOL = {
+    'name': 'emit_nutrition',
+    'description': 'Report estimated nutrition per serving',
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'calories': {'type': 'number'},
+            'protein_g': {'type': 'number'},
+            'carbs_g': {'type': 'number'},
+            'fat_g': {'type': 'number'},
+            'sugar_g': {'type': 'number'}
+        },
+        'required': ['calories', 'protein_g', 'carbs_g', 'fat_g', 'sugar_g']
+    }
+}
+
+_OPTIMIZATION_TOOL = {
+    'name': 'emit_optimization',
+    'description': 'Report waste reduction suggestions',
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'package_sizes': {'type': 'array', 'items': {'type': 'string'}},
+            'leftover_uses': {'type': 'array', 'items': {'type': 'string'}},
+            'batch_production': {'type': 'array', 'items': {'type': 'string'}}
+        },
+        'required': ['package_sizes', 'leftover_uses', 'batch_production']
+    }
+}
+
+
+# Response cache keys start with the action, so they can be invalidated by action
+_TOOL_ACTIONS = {
+    _SUBSTITUTION_TOOL['name']: 'substitute',
+    _NUTRITION_TOOL['name']: 'nutrition',
+    _OPTIMIZATION_TOOL['name']: 'optimize',
+}
+
+# A batch result whose response didn't fit the tool's schema
+_INVALID = object()
+
+
+def _fuzzy_walk(node: Dict, prev_row: List[int], word: str, max_dist: int, found: List[str]) -> None:
+    """
+    Collect the terms below a trie node within max_dist edits of word
+
+    prev_row is the Levenshtein DP row for the node's prefix. Branches are
+    pruned once every cell of the row exceeds max_dist, since extending the
+    prefix can't bring the distance back down.
+    """
+    for ch, child in node.items():
+        if ch is None:
+            continue
+        row = [prev_row[0] + 1]
+        for j in range(1, len(word) + 1):
+            row.append(min(prev_row[j] + 1, row[j - 1] + 1, prev_row[j - 1] + (word[j - 1] != ch)))
+        if row[-1] <= max_dist and None in child:
+            found.append(child[None])
+        if min(row) <= max_dist:
+            _fuzzy_walk(child, row, word, max_dist, found)
+
+
+# Name substrings up to this long are indexed; longer queries intersect
+# the postings of their substrings of this length
+_NAME_GRAM = 3
+
+
+def _name_grams(text: str, n: int) -> Iterator[str]:
+    """Substrings of text of length n"""
+    return (text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def _event_loop_running() -> bool:
+    """Whether this thread is already running an event loop, so asyncio.run() can't be used"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
 
 
 class RecipeManagementAgent(BaseAgent):
@@ -20,19 +194,80 @@ class RecipeManagementAgent(BaseAgent):
         self.state['llm_provider'] = self.config.get('llm_provider', 'anthropic')
         self.state['llm_api_key'] = self.config.get('llm_api_key', os.getenv('LLM_API_KEY'))
         self.state['model'] = self.config.get('model', 'claude-3-5-sonnet-20241022')
+        # Model per LLM action; responses that don't fit the schema are retried on escalation_model
+        self.state['models'] = {
+            'substitute': 'claude-3-5-haiku-20241022',
+            'nutrition': self.state['model'],
+            'optimize': self.state['model'],
+            **self.config.get('models', {})
+        }
+        self.state['escalation_model'] = self.config.get('escalation_model', self.state['model'])
         self.state['recipes'] = self.config.get('recipes', {})
         self.state['allergens'] = ['milk', 'eggs', 'wheat', 'nuts', 'soy', 'fish']
+        self.state['vectorize_min_rows'] = self.config.get('vectorize_min_rows', 1000)  # ingredients, for numpy scaling
+        # Search index over state['recipes'], rebuilt on the next search after
+        # the key's state version moves (add_recipe(), remove_recipe(), mark_dirty())
+        self._inverted: Dict[str, set] = {}
+        self._trie: Dict = {}  # char -> child node; None -> the term ending there
+        self._name_grams: Dict[str, set] = {}  # lowercased name substring -> recipe keys
+        self._inv_position: Dict[str, int] = {}  # recipe key -> stored order
+        self._inv_version: Optional[Tuple[Dict, int]] = None  # (state dict, its 'recipes' version)
+        self.state['batch_mode'] = self.config.get('batch_mode', 'concurrent')  # or 'message_batches'
+        self.state['max_concurrency'] = self.config.get('max_concurrency', 8)
+        self.state['max_retries'] = self.config.get('max_retries', 4)  # per request, on 429/5xx
+        self.state['batch_poll_interval'] = self.config.get('batch_poll_interval', 10)  # seconds
+        # LLM responses by prompt, least recently used first
+        self._response_cache = OrderedDict()
+        self._response_cache_size = self.config.get('response_cache_size', 1024)
+        self._cache_hits = self._cache_misses = 0
+        self._init_disk_cache()
         self._init_llm()
 
+    def _init_disk_cache(self) -> None:
+        """Open the persistent response cache in config['cache_dir'], if set"""
+        self._disk_cache = None
+        self._cache_ttl = self.config.get('cache_ttl', 30 * 24 * 3600)  # seconds; None keeps entries forever
+        cache_dir = self.config.get('cache_dir')
+        if not cache_dir:
+            return
+        if diskcache is None:
+            self.logger.warning("cache_dir is set but diskcache is not installed; responses are only cached in memory")
+            return
+        self._disk_cache = diskcache.Cache(os.path.expanduser(cache_dir))
+
+    def _cleanup(self) -> None:
+        if getattr(self, '_disk_cache', None) is not None:
+            self._disk_cache.close()
+            self._disk_cache = None
+
     def _init_llm(self) -> None:
+        self._llm_client = None
         if self.state['llm_provider'] == 'anthropic':
             try:
-                import anthropic
-                self.state['llm_client'] = anthropic.Anthropic(api_key=self.state['llm_api_key'])
+                self._llm_client = get_anthropic_client(self.state['llm_api_key'])
             except ImportError:
-                self.state['llm_client'] = None
+                pass
+        # Hot paths read self._llm_client; state keeps it for code that inspects the state
+        self.state['llm_client'] = self._llm_client
+
+    # Method for each execute() action
+    _ACTION_METHODS = {
+        'scale': 'scale_recipe',
+        'substitute': 'suggest_substitution',
+        'allergens': 'detect_allergens',
+        'nutrition': 'calculate_nutrition',
+        'search': 'search_recipes',
+        'optimize': 'optimize_recipe',
+    }
+
+    # LLM actions that can stream: prompt builder and max_tokens (models by action in state['models'])
+    _STREAM_PROMPTS = {
+        'substitute': ('_substitution_prompt', 400),
+        'nutrition': ('_nutrition_prompt', 300),
+        'optimize': ('_optimization_prompt', 500),
+    }
 
-    def execute(self, action: str, **kwargs) -> Dict[str, Any]:
+    def execute(self, action: str, stream: bool = False, **kwargs) -> Union[Dict[str, Any], Iterator[str]]:
         """
         Execute recipe management action
         
@@ -43,22 +278,19 @@ class RecipeManagementAgent(BaseAgent):
         - nutrition: Calculate nutrition (estimated)
         - search: Search recipes
         - optimize: Optimize for waste reduction
+
+        With stream=True, the substitute, nutrition and optimize actions
+        return an iterator of the LLM's response text as it's generated.
         """
         if not self._initialized:
             self.initialize()
 
-        actions = {
-            'scale': self.scale_recipe,
-            'substitute': self.suggest_substitution,
-            'allergens': self.detect_allergens,
-            'nutrition': self.calculate_nutrition,
-            'search': self.search_recipes,
-            'optimize': self.optimize_recipe
-        }
+        if stream:
+            return self._stream_action(action, **kwargs)
 
-        func = actions.get(action)
-        if func:
-            return func(**kwargs)
+        method = self._ACTION_METHODS.get(action)
+        if method:
+            return getattr(self, method)(**kwargs)
         else:
             return {'error': f'Unknown action: {action}'}
 
@@ -88,9 +320,97 @@ class RecipeManagementAgent(BaseAgent):
             'ingredients': scaled_ingredients
         }
 
+    def scale_recipes_bulk(self, recipes: List[Dict], servings: Union[int, List[int]]) -> List[Dict]:
+        """
+        Scale many recipes at once, to one serving size or one per recipe
+
+        Gives the same results as scale_recipe() on each recipe. With numpy
+        and at least vectorize_min_rows ingredients in total, all amounts are
+        scaled in one array multiply.
+        """
+        if not isinstance(servings, (list, tuple)):
+            servings = [servings] * len(recipes)
+
+        measured = [[ing for ing in recipe.get('ingredients', []) if 'amount' in ing] for recipe in recipes]
+        counts = [len(ings) for ings in measured]
+        total = sum(counts)
+        if np is None or total < self.state['vectorize_min_rows']:
+            return [self.scale_recipe(recipe, n) for recipe, n in zip(recipes, servings)]
+
+        try:
+            amounts = np.fromiter((ing['amount'] for ings in measured for ing in ings), dtype=np.float64, count=total)
+        except (TypeError, ValueError):
+            # Non-numeric amounts: let scale_recipe() handle (or reject) them
+            return [self.scale_recipe(recipe, n) for recipe, n in zip(recipes, servings)]
+
+        originals = [recipe.get('servings', 1) for recipe in recipes]
+        factors = [n / original for n, original in zip(servings, originals)]
+        scaled = iter((amounts * np.repeat(factors, counts)).tolist())
+
+        return [
+            {
+                'recipe_name': recipe.get('name', 'Recipe'),
+                'original_servings': original,
+                'new_servings': n,
+                'scale_factor': factor,
+                'ingredients': [
+                    {
+                        'name': ing['name'],
+                        'amount': next(scaled),
+                        'unit': ing.get('unit', ''),
+                        'original_amount': ing['amount']
+                    }
+                    for ing in ings
+                ]
+            }
+            for recipe, n, original, factor, ings in zip(recipes, servings, originals, factors, measured)
+        ]
+
+    def scale_recipes(self, names: List[str], servings: Union[int, List[int]],
+                      return_array: bool = False) -> Union[List[Dict], Tuple[Any, Any]]:
+        """
+        Scale stored recipes by name, to one serving size or one per recipe
+
+        Gives the same results as scale_recipe() on each recipe (see
+        scale_recipes_bulk()). Amounts are read from the stored recipes on
+        every call, so recipes edited in place are scaled as they are now.
+
+        With return_array=True, returns just the scaled amounts as
+        (amounts, offsets) arrays instead: the k-th recipe's measured
+        ingredients (those with an amount) are scaled to
+        amounts[offsets[k]:offsets[k + 1]]. This skips building the result
+        dicts, which takes most of the time.
+
+        Raises:
+            KeyError: If a recipe isn't stored
+            ImportError: If return_array is set and numpy is not installed
+            TypeError: If return_array is set and an amount isn't a number
+        """
+        if not isinstance(servings, (list, tuple)):
+            servings = [servings] * len(names)
+
+        stored = self.state['recipes']
+        recipes = [stored[name] for name in names]
+        if not return_array:
+            return self.scale_recipes_bulk(recipes, servings)
+        if np is None:
+            raise ImportError("scale_recipes(return_array=True) requires numpy")
+
+        measured = [[ing['amount'] for ing in recipe.get('ingredients', []) if 'amount' in ing] for recipe in recipes]
+        counts = [len(amounts) for amounts in measured]
+        offsets = np.zeros(len(recipes) + 1, dtype=np.intp)
+        np.cumsum(counts, out=offsets[1:])
+        try:
+            amounts = np.fromiter(itertools.chain.from_iterable(measured), dtype=np.float64, count=offsets[-1])
+        except (TypeError, ValueError):
+            raise TypeError("Ingredient amounts must be numbers to scale them as an array")
+
+        factors = [n / recipe.get('servings', 1) for recipe, n in zip(recipes, servings)]
+        return amounts * np.repeat(factors, counts), offsets
+
     def suggest_substitution(self, ingredient: str, reason: str = 'allergy') -> Dict:
         """Suggest ingredient substitutions"""
-        if not self.state['llm_client']:
+        if not self._llm_client:
             common_subs = {
                 'butter': 'coconut oil or margarine',
                 'milk': 'almond milk or oat milk',
@@ -99,41 +419,103 @@ class RecipeManagementAgent(BaseAgent):
             }
             return {'ingredient': ingredient, 'substitutes': [common_subs.get(ingredient.lower(), 'no substitution found')]}
 
-        prompt = f"""Suggest 3 substitutions for {ingredient} in baking.
-Reason: {reason}
-
-For each substitute, provide:
-1. Name
-2. Ratio (e.g., "1:1" or "1 cup = 3/4 cup substitute")
-3. Notes on how it affects the recipe
-
-Format as JSON array."""
-
         try:
-            response = self.state['llm_client'].messages.create(
-                model=self.state['model'],
-                max_tokens=400,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
-            return {'ingredient': ingredient, 'reason': reason, 'substitutes': response.content[0].text}
+            result = self._complete(self._substitution_prompt(ingredient, reason), 400, _SUBSTITUTION_TOOL,
+                                    self.state['models']['substitute'])
+            return {'ingredient': ingredient, 'reason': reason, 'substitutes': result['substitutes']}
         except:
             return {'ingredient': ingredient, 'substitutes': ['Unable to generate substitutions']}
 
     def detect_allergens(self, recipe: Dict) -> Dict:
         """Detect common allergens in recipe"""
         ingredients_text = ' '.join([ing.get('name', '').lower() for ing in recipe.get('ingredients', [])])
-        
-        detected = []
-        for allergen in self.state['allergens']:
-            if allergen in ingredients_text:
-                detected.append(allergen)
-        
-        is_safe = {
-            'dairy_free': 'milk' not in detected and 'butter' not in ingredients_text,
-            'egg_free': 'eggs' not in detected,
-            'nut_free': 'nuts' not in detected and 'almond' not in ingredients_text,
-            'gluten_free': 'wheat' not in detected and 'flour' not in ingredients_text
-        }
+
+        # Whole words only, so e.g. 'eggplant' and 'nutmeg' don't count
+        return self._allergen_report(recipe, frozenset(_WORD_RE.findall(ingredients_text)))
+
+    def detect_allergens_bulk(self, recipes: List[Dict]) -> List[Dict]:
+        """
+        Detect allergens in many recipes, e.g. a supplier export
+
+        Gives the same results as detect_allergens() on each recipe. With
+        hyperscan installed, the ingredient text of every recipe is scanned
+        for all allergen words in one pass.
+        """
+        if hyperscan is None:
+            return [self.detect_allergens(recipe) for recipe in recipes]
+
+        texts = [' '.join([ing.get('name', '').lower() for ing in recipe.get('ingredients', [])]).encode()
+                 for recipe in recipes]
+        starts = [0, *itertools.accumulate(len(text) + 1 for text in texts[:-1])]
+        return self._scan_allergens(recipes, b'\n'.join(texts), starts)
+
+    def detect_allergens_all(self) -> Dict[str, Dict]:
+        """
+        Detect allergens in every stored recipe, by name
+
+        Gives the same results as detect_allergens() on each recipe (see
+        detect_allergens_bulk()).
+        """
+        recipes = self.state['recipes']
+        return dict(zip(recipes, self.detect_allergens_bulk(list(recipes.values()))))
+
+    def _scan_allergens(self, recipes: List[Dict], data: bytes, starts: Any) -> List[Dict]:
+        """
+        detect_allergens() for each recipe, by scanning their ingredient texts at once
+
+        data holds the recipes' lowercased ingredient names, one recipe per
+        line, and starts the offset of each recipe's line.
+        """
+        # Words that can never be a token (e.g. 'tree nuts') can't match in detect_allergens() either
+        words = tuple(sorted(
+            word for word in _DIET_WORDS.union(*(_ALLERGEN_WORDS.get(a, (a,)) for a in self.state['allergens']))
+            if _WORD_RE.fullmatch(word)
+        ))
+        matches: List[Tuple[int, int]] = []
+
+        def on_match(word_id, _, end, flags, context):
+            matches.append((word_id, end))
+
+        if words and data:
+            _allergen_database(words).scan(data, match_event_handler=on_match)
+
+        ends = [end for _, end in matches]
+        if np is not None and ends:
+            indices = (np.searchsorted(starts, ends, side='right') - 1).tolist()
+        else:
+            indices = [bisect.bisect_right(starts, end) - 1 for end in ends]
+
+        found = [set() for _ in recipes]
+        recheck = set()
+        for (word_id, end), index in zip(matches, indices):
+            word = words[word_id]
+            start = end - len(word)
+            if data[start - 1:start] >= b'\x80' or data[end:end + 1] >= b'\x80':
+                recheck.add(index)
+            elif data[end:end + 5] != b'-free':
+                found[index].add(word)
+
+        results = []
+        for i, (recipe, words_found) in enumerate(zip(recipes, found)):
+            if i in recheck:
+                results.append(self.detect_allergens(recipe))
+            elif words_found:
+                results.append(self._allergen_report(recipe, words_found))
+            else:
+                # Most rows of an export have no allergen words at all
+                results.append({
+                    'recipe_name': recipe.get('name'),
+                    'allergens_detected': [],
+                    'is_safe_for': dict.fromkeys(_DIET_EXCLUDES, True),
+                    'warning': None
+                })
+        return results
+
+    def _allergen_report(self, recipe: Dict, words: AbstractSet[str]) -> Dict:
+        """Build the detect_allergens() result from the words found in a recipe's ingredients"""
+        detected = [allergen for allergen in self.state['allergens']
+                    if not words.isdisjoint(_ALLERGEN_WORDS.get(allergen, (allergen,)))]
+        is_safe = {diet: words.isdisjoint(excluded) for diet, excluded in _DIET_EXCLUDES.items()}
         
         return {
             'recipe_name': recipe.get('name'),
@@ -144,13 +526,432 @@ Format as JSON array."""
 
     def calculate_nutrition(self, recipe: Dict) -> Dict:
         """Estimate nutrition info"""
-        if not self.state['llm_client']:
+        if not self._llm_client:
             return {'message': 'Nutrition calculation requires LLM integration'}
 
-        ingredients_list = '\n'.join([f"- {ing.get('amount', '')} {ing.get('unit', '')} {ing.get('name', '')}" 
-                                       for ing in recipe.get('ingredients', [])])
+        try:
+            result = self._complete(self._nutrition_prompt(recipe), 300, _NUTRITION_TOOL, self.state['models']['nutrition'])
+            return {'recipe_name': recipe.get('name'), 'nutrition': result, 'note': 'Estimates only'}
+        except:
+            return {'error': 'Could not calculate nutrition'}
+
+    def search_recipes(self, query: str, fuzzy: int = 0) -> List[Dict]:
+        """
+        Search stored recipes
+
+        Returns recipes whose name or ingredients contain every word of the
+        query, allowing up to `fuzzy` typos (edits) per word, and recipes
+        whose name contains the query as a substring (e.g. a partial word,
+        or 'cake' in 'Cupcakes'), in stored order.
+        """
+        recipes = self.state['recipes']
+        query_lower = query.lower()
+        if not query_lower:
+            return list(recipes.values())
+
+        indexed = self._inv_version
+        if indexed is None or indexed[0] is not self.state or indexed[1] != self.state.key_versions['recipes']:
+            self._rebuild_inverted()
+
+        matches = self._name_matches(query_lower)
+        tokens = _TOKEN_RE.findall(query_lower)
+        if tokens:
+            if fuzzy:
+                postings = [self._fuzzy_postings(token, fuzzy) for token in tokens]
+            else:
+                postings = [self._inverted.get(token) for token in tokens]
+            if all(postings):
+                matches |= set.intersection(*postings)
+
+        return [recipes[key] for key in sorted(matches, key=self._inv_position.__getitem__)]
+
+    def add_recipe(self, recipe: Dict, name: Optional[str] = None) -> None:
+        """Store a recipe under its name (or the given one), replacing any existing one"""
+        self.state['recipes'][name or recipe['name']] = recipe
+        self.state.mark_dirty('recipes')
+
+    def remove_recipe(self, name: str) -> Optional[Dict]:
+        """Remove a stored recipe, returning it (None if there was none)"""
+        self.state.mark_dirty('recipes')
+        return self.state['recipes'].pop(name, None)
+
+    def _name_matches(self, query_lower: str) -> set:
+        """Keys of recipes whose lowercased name contains query_lower"""
+        if len(query_lower) <= _NAME_GRAM:
+            return set(self._name_grams.get(query_lower, ()))
+
+        postings = [self._name_grams.get(gram) for gram in _name_grams(query_lower, _NAME_GRAM)]
+        if not all(postings):
+            return set()
+        # Every gram matching doesn't mean they're adjacent in the name
+        return {key for key in set.intersection(*postings) if query_lower in key.lower()}
+
+    def _fuzzy_postings(self, word: str, max_dist: int) -> set:
+        """Recipes containing any indexed word within max_dist edits of word"""
+        found: List[str] = []
+        _fuzzy_walk(self._trie, list(range(len(word) + 1)), word, max_dist, found)
+        postings = set()
+        for term in found:
+            postings |= self._inverted[term]
+        return postings
+
+    def _rebuild_inverted(self) -> None:
+        """Index every stored recipe by the words of its name and ingredient names, and by name substrings"""
+        inverted: Dict[str, set] = {}
+        name_grams: Dict[str, set] = {}
+        for key, recipe in self.state['recipes'].items():
+            words = [key, recipe.get('name') or '']
+            words.extend(ing.get('name', '') for ing in recipe.get('ingredients', []))
+            for token in _TOKEN_RE.findall(' '.join(words).lower()):
+                inverted.setdefault(token, set()).add(key)
+            name = key.lower()
+            for n in range(1, _NAME_GRAM + 1):
+                for gram in _name_grams(name, n):
+                    name_grams.setdefault(gram, set()).add(key)
+        trie: Dict = {}
+        for term in inverted:
+            node = trie
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[None] = term
+        self._inverted = inverted
+        self._trie = trie
+        self._name_grams = name_grams
+        self._inv_position = {key: i for i, key in enumerate(self.state['recipes'])}
+        self._inv_version = (self.state, self.state.key_versions['recipes'])
+
+    def optimize_recipe(self, recipe: Dict) -> Dict:
+        """Optimize recipe for waste reduction"""
+        if not self._llm_client:
+            return {'message': 'Optimization requires LLM'}
+
+        try:
+            result = self._complete(self._optimization_prompt(recipe), 500, _OPTIMIZATION_TOOL, self.state['models']['optimize'])
+            return {'recipe_name': recipe.get('name'), 'optimization_suggestions': result}
+        except:
+            return {'error': 'Could not optimize recipe'}
+
+    def suggest_substitutions_batch(self, items: List[Dict]) -> List[Dict]:
+        """
+        Suggest substitutions for many ingredients at once
+
+        Each item holds suggest_substitution() arguments, e.g.
+        {'ingredient': 'eggs', 'reason': 'vegan'}. Results are in item order.
+        Inside a running event loop, items are sent one at a time; await
+        asuggest_substitutions_batch() there instead.
+        """
+        if not self._llm_client or len(items) <= 1 or _event_loop_running():
+            return [self.suggest_substitution(**item) for item in items]
+        return asyncio.run(self.asuggest_substitutions_batch(items))
+
+    async def asuggest_substitutions_batch(self, items: List[Dict]) -> List[Dict]:
+        """Same as suggest_substitutions_batch(), without blocking the event loop"""
+        if not self._llm_client:
+            return [self.suggest_substitution(**item) for item in items]
+
+        reasons = [item.get('reason', 'allergy') for item in items]
+        model = self.state['models']['substitute']
+        results = await self._arun_batch([
+            (self._substitution_prompt(item['ingredient'], reason), 400, _SUBSTITUTION_TOOL, model)
+            for item, reason in zip(items, reasons)
+        ])
+        return [
+            {'ingredient': item['ingredient'], 'reason': reason, 'substitutes': result['substitutes']} if result is not None
+            else {'ingredient': item['ingredient'], 'substitutes': ['Unable to generate substitutions']}
+            for item, reason, result in zip(items, reasons, results)
+        ]
+
+    def calculate_nutrition_batch(self, recipes: List[Dict]) -> List[Dict]:
+        """Estimate nutrition info for many recipes at once (one at a time inside a running event loop)"""
+        if not self._llm_client or len(recipes) <= 1 or _event_loop_running():
+            return [self.calculate_nutrition(recipe) for recipe in recipes]
+        return asyncio.run(self.acalculate_nutrition_batch(recipes))
+
+    async def acalculate_nutrition_batch(self, recipes: List[Dict]) -> List[Dict]:
+        """Same as calculate_nutrition_batch(), without blocking the event loop"""
+        if not self._llm_client:
+            return [self.calculate_nutrition(recipe) for recipe in recipes]
+
+        model = self.state['models']['nutrition']
+        results = await self._arun_batch([(self._nutrition_prompt(recipe), 300, _NUTRITION_TOOL, model) for recipe in recipes])
+        return [
+            {'recipe_name': recipe.get('name'), 'nutrition': result, 'note': 'Estimates only'} if result is not None
+            else {'error': 'Could not calculate nutrition'}
+            for recipe, result in zip(recipes, results)
+        ]
+
+    def optimize_recipes_batch(self, recipes: List[Dict]) -> List[Dict]:
+        """Optimize many recipes for waste reduction at once (one at a time inside a running event loop)"""
+        if not self._llm_client or len(recipes) <= 1 or _event_loop_running():
+            return [self.optimize_recipe(recipe) for recipe in recipes]
+        return asyncio.run(self.aoptimize_recipes_batch(recipes))
+
+    async def aoptimize_recipes_batch(self, recipes: List[Dict]) -> List[Dict]:
+        """Same as optimize_recipes_batch(), without blocking the event loop"""
+        if not self._llm_client:
+            return [self.optimize_recipe(recipe) for recipe in recipes]
+
+        model = self.state['models']['optimize']
+        results = await self._arun_batch([(self._optimization_prompt(recipe), 500, _OPTIMIZATION_TOOL, model) for recipe in recipes])
+        return [
+            {'recipe_name': recipe.get('name'), 'optimization_suggestions': result} if result is not None
+            else {'error': 'Could not optimize recipe'}
+            for recipe, result in zip(recipes, results)
+        ]
 
-        prompt = f"""Estimate nutrition information per serving for this recipe:
+    def cache_stats(self) -> Dict[str, Any]:
+        """Response cache hits and misses since initialization, and current sizes"""
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'hit_rate': self._cache_hits / lookups if lookups else 0.0,
+            'memory_entries': len(self._response_cache),
+            'disk_entries': len(self._disk_cache) if self._disk_cache is not None else None
+        }
+
+    def cache_invalidate(self, prefix: str = '') -> int:
+        """
+        Drop cached responses whose key starts with prefix, returning how many
+
+        Keys start with the action ('substitute:', 'nutrition:', 'optimize:'),
+        or 'text:' for streamed responses; the default drops everything.
+        """
+        removed = {key for key in self._response_cache if key.startswith(prefix)}
+        for key in removed:
+            del self._response_cache[key]
+        if self._disk_cache is not None:
+            for key in list(self._disk_cache.iterkeys()):
+                if key.startswith(prefix) and self._disk_cache.delete(key):
+                    removed.add(key)
+        return len(removed)
+
+    async def _arun_batch(self, requests: List[Tuple[str, int, Dict, str]]) -> List[Optional[Dict]]:
+        """
+        Complete (prompt, max_tokens, tool, model) requests as configured by batch_mode
+
+        Responses that don't fit their tool's schema are sent again to
+        escalation_model. Returns each request's tool input in request order,
+        None for requests that didn't succeed.
+        """
+        keys = [self._response_cache_key(*request) for request in requests]
+        results = [copy.deepcopy(self._cached_response(key)) for key in keys]
+        # Identical requests in one batch are only sent once
+        missing: Dict[str, List[int]] = {}
+        for i, result in enumerate(results):
+            if result is None:
+                missing.setdefault(keys[i], []).append(i)
+        if not missing:
+            return results
+
+        pending = [requests[indices[0]] for indices in missing.values()]
+        fresh = await self._asend_batch(pending)
+
+        escalation_model = self.state['escalation_model']
+        escalate = [i for i, (request, result) in enumerate(zip(pending, fresh))
+                    if result is _INVALID and request[3] != escalation_model]
+        if escalate:
+            retried = await self._asend_batch([pending[i][:3] + (escalation_model,) for i in escalate])
+            for i, result in zip(escalate, retried):
+                fresh[i] = result
+
+        for (key, indices), result in zip(missing.items(), fresh):
+            if result is not None and result is not _INVALID:
+                self._cache_response(key, result)
+                for i in indices:
+                    results[i] = copy.deepcopy(result)
+        return results
+
+    async def _asend_batch(self, requests: List[Tuple[str, int, Dict, str]]) -> List[Any]:
+        """Send requests as configured by batch_mode; failures are None, schema misfits _INVALID"""
+        if self.state['batch_mode'] == 'message_batches':
+            # Polls with the sync client, so it waits in a worker thread
+            return await asyncio.to_thread(self._run_message_batch, requests)
+        try:
+            return await self._run_concurrent(requests)
+        except Exception as e:
+            self.logger.error("Concurrent requests failed: %s", e)
+            return [None] * len(requests)
+
+    async def _run_concurrent(self, requests: List[Tuple[str, int, Dict, str]]) -> List[Any]:
+        """Send every request at once on one async client, max_concurrency in flight"""
+        import anthropic
+
+        limit = asyncio.Semaphore(self.state['max_concurrency'])
+
+        # The SDK retries rate limits and server errors with exponential backoff
+        async with anthropic.AsyncAnthropic(api_key=self.state['llm_api_key'],
+                                            max_retries=self.state['max_retries']) as client:
+            async def _complete(prompt, max_tokens, tool, model):
+                async with limit:
+                    try:
+                        response = await client.messages.create(**self._request_params(prompt, max_tokens, tool, model))
+                        return self._tool_input(response, tool)
+                    except ValueError:
+                        return _INVALID
+                    except Exception:
+                        return None
+
+            return await asyncio.gather(*[_complete(*request) for request in requests])
+
+    def _run_message_batch(self, requests: List[Tuple[str, int, Dict, str]]) -> List[Any]:
+        """
+        Submit (prompt, max_tokens, tool, model) requests as one Message Batch and wait for it
+
+        Returns each request's tool input in request order, None for requests
+        that didn't succeed and _INVALID for responses that didn't fit the schema.
+        """
+        client = self._llm_client
+        results = [None] * len(requests)
+        try:
+            batch = client.messages.batches.create(requests=[
+                {'custom_id': str(i), 'params': self._request_params(*request)}
+                for i, request in enumerate(requests)
+            ])
+            while batch.processing_status != 'ended':
+                time.sleep(self.state['batch_poll_interval'])
+                batch = client.messages.batches.retrieve(batch.id)
+
+            for entry in client.messages.batches.results(batch.id):
+                if entry.result.type == 'succeeded':
+                    i = int(entry.custom_id)
+                    try:
+                        results[i] = self._tool_input(entry.result.message, requests[i][2])
+                    except ValueError:
+                        results[i] = _INVALID
+        except Exception as e:
+            self.logger.error("Message batch failed: %s", e)
+        return results
+
+    def _complete(self, prompt: str, max_tokens: int, tool: Dict, model: str) -> Dict:
+        """
+        Get the LLM's tool input for a prompt, reusing an earlier identical request's
+
+        A response that doesn't fit the tool's schema is retried once on
+        escalation_model.
+        """
+        key = self._response_cache_key(prompt, max_tokens, tool, model)
+        result = self._cached_response(key)
+        if result is None:
+            try:
+                response = self._llm_client.messages.create(**self._request_params(prompt, max_tokens, tool, model))
+                result = self._tool_input(response, tool)
+            except ValueError:
+                if model == self.state['escalation_model']:
+                    raise
+                result = self._complete(prompt, max_tokens, tool, self.state['escalation_model'])
+            self._cache_response(key, result)
+        # Callers get their own copy, so changing a result can't alter the cache
+        return copy.deepcopy(result)
+
+    def _request_params(self, prompt: str, max_tokens: int, tool: Optional[Dict], model: str) -> Dict:
+        """Messages API parameters for a prompt, forcing a call to tool if given"""
+        params = {
+            'model': model,
+            'max_tokens': max_tokens,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }
+        if tool is not None:
+            params['tools'] = [tool]
+            params['tool_choice'] = {'type': 'tool', 'name': tool['name']}
+        return params
+
+    def _tool_input(self, message: Any, tool: Dict) -> Dict:
+        """
+        Get the input of a response's call to tool
+
+        Raises:
+            ValueError: If the response has no such call or it lacks required fields
+        """
+        for block in message.content:
+            if block.type == 'tool_use' and block.name == tool['name']:
+                missing = [field for field in tool['input_schema']['required'] if field not in block.input]
+                if missing:
+                    raise ValueError(f"{tool['name']} call is missing {', '.join(missing)}")
+                return block.input
+        raise ValueError(f"Response has no {tool['name']} call")
+
+    def _stream_action(self, action: str, **kwargs) -> Iterator[str]:
+        """Start streaming an LLM action's response text"""
+        if action not in self._STREAM_PROMPTS:
+            raise ValueError(f'Action {action!r} does not stream; streaming actions: {", ".join(self._STREAM_PROMPTS)}')
+        if not self._llm_client:
+            raise ValueError('Streaming requires an LLM client')
+        builder, max_tokens = self._STREAM_PROMPTS[action]
+        return self._stream_text(getattr(self, builder)(**kwargs), max_tokens, self.state['models'][action])
+
+    def _stream_text(self, prompt: str, max_tokens: int, model: str) -> Iterator[str]:
+        """Yield the LLM's response text as it arrives (a cached response in one piece)"""
+        key = self._response_cache_key(prompt, max_tokens, None, model)
+        cached = self._cached_response(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        with self._llm_client.messages.stream(**self._request_params(prompt, max_tokens, None, model)) as response:
+            for text in response.text_stream:
+                chunks.append(text)
+                yield text
+
+        # Only a response that was read to the end is cached
+        self._cache_response(key, ''.join(chunks))
+
+    def _response_cache_key(self, prompt: str, max_tokens: int, tool: Optional[Dict], model: str) -> str:
+        """The action (or 'text' for streamed responses), then a digest of everything that determines the response"""
+        prefix = _TOOL_ACTIONS[tool['name']] if tool else 'text'
+        digest = hashlib.blake2b(f"{model}|{max_tokens}|{prompt}".encode(), digest_size=16).hexdigest()
+        return f"{prefix}:{digest}"
+
+    def _cached_response(self, key: str) -> Any:
+        """Get a cached response (text or tool input), marking it recently used"""
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            self._response_cache.move_to_end(key)
+        elif self._disk_cache is not None:
+            cached = self._disk_cache.get(key)
+            if cached is not None and self._response_cache_size > 0:
+                self._response_cache[key] = cached
+                if len(self._response_cache) > self._response_cache_size:
+                    self._response_cache.popitem(last=False)
+        if cached is None:
+            self._cache_misses += 1
+        else:
+            self._cache_hits += 1
+        return cached
+
+    def _cache_response(self, key: str, response: Any) -> None:
+        """Remember a response, evicting the least recently used"""
+        if self._disk_cache is not None:
+            self._disk_cache.set(key, response, expire=self._cache_ttl)
+        if self._response_cache_size <= 0:
+            return
+        self._response_cache[key] = response
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > self._response_cache_size:
+            self._response_cache.popitem(last=False)
+
+    def _substitution_prompt(self, ingredient: str, reason: str = 'allergy') -> str:
+        return f"""Suggest 3 substitutions for {ingredient} in baking.
+Reason: {reason}
+
+For each substitute, provide:
+1. Name
+2. Ratio (e.g., "1:1" or "1 cup = 3/4 cup substitute")
+3. Notes on how it affects the recipe
+
+Format as JSON array."""
+
+    def _ingredient_lines(self, recipe: Dict) -> str:
+        """One '- amount unit name' line per ingredient, as used in prompts"""
+        # %-formatting is measurably quicker than an f-string here, which matters for cache hits
+        return '\n'.join(["- %s %s %s" % (ing.get('amount', ''), ing.get('unit', ''), ing.get('name', ''))
+                          for ing in recipe.get('ingredients', [])])
+
+    def _nutrition_prompt(self, recipe: Dict) -> str:
+        ingredients_list = self._ingredient_lines(recipe)
+
+        return f"""Estimate nutrition information per serving for this recipe:
 
 {recipe.get('name', 'Recipe')}
 Servings: {recipe.get('servings', 1)}
@@ -167,36 +968,10 @@ Provide estimates for:
 
 Format as JSON."""
 
-        try:
-            response = self.state['llm_client'].messages.create(
-                model=self.state['model'],
-                max_tokens=300,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
-            return {'recipe_name': recipe.get('name'), 'nutrition': response.content[0].text, 'note': 'Estimates only'}
-        except:
-            return {'error': 'Could not calculate nutrition'}
-
-    def search_recipes(self, query: str) -> List[Dict]:
-        """Search stored recipes"""
-        results = []
-        query_lower = query.lower()
-        
-        for name, recipe in self.state['recipes'].items():
-            if query_lower in name.lower():
-                results.append(recipe)
-        
-        return results
-
-    def optimize_recipe(self, recipe: Dict) -> Dict:
-        """Optimize recipe for waste reduction"""
-        if not self.state['llm_client']:
-            return {'message': 'Optimization requires LLM'}
+    def _optimization_prompt(self, recipe: Dict) -> str:
+        ingredients_list = self._ingredient_lines(recipe)
 
-        ingredients_list = '\n'.join([f"- {ing.get('amount', '')} {ing.get('unit', '')} {ing.get('name', '')}" 
-                                       for ing in recipe.get('ingredients', [])])
-
-        prompt = f"""Analyze this recipe for waste reduction opportunities:
+        return f"""Analyze this recipe for waste reduction opportunities:
 
 {ingredients_list}
 
@@ -207,15 +982,6 @@ Suggest:
 
 Be specific and practical."""
 
-        try:
-            response = self.state['llm_client'].messages.create(
-                model=self.state['model'],
-                max_tokens=500,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
-            return {'recipe_name': recipe.get('name'), 'optimization_suggestions': response.content[0].text}
-        except:
-            return {'error': 'Could not optimize recipe'}
 
 
 if __name__ == '__main__':
@@ -2,26 +2,40 @@
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from base.agent import BaseAgent
+from base.llm import get_anthropic_client
 from typing import List, Dict
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class SalesForecastingAgent(BaseAgent):
     def _initialize(self):
         self.state['llm_provider'] = self.config.get('llm_provider', 'anthropic')
         self.state['llm_api_key'] = self.config.get('llm_api_key', os.getenv('LLM_API_KEY'))
+        self.state['ewma_alpha'] = self.config.get('ewma_alpha', 0.3)  # smoothing for the seasonal fallback
         self._init_llm()
     
     def _init_llm(self):
+        self._llm_client = None
         if self.state['llm_provider'] == 'anthropic':
             try:
-                import anthropic
-                self.state['client'] = anthropic.Anthropic(api_key=self.state['llm_api_key'])
-            except: self.state['client'] = None
+                self._llm_client = get_anthropic_client(self.state['llm_api_key'])
+            except: pass
+        self.state['client'] = self._llm_client
     
     def execute(self, historical_data: List[Dict], forecast_days: int = 30) -> Dict:
         if not self._initialized: self.initialize()
+
+        # Without an LLM, two or more weeks of history give a weekly-seasonal forecast
+        if not self._llm_client and np is not None and len(historical_data) >= 14:
+            forecast = self._seasonal_forecast(historical_data, forecast_days)
+            if forecast is not None:
+                return {"forecast": forecast, "method": "seasonal_ewma", "confidence": "low"}
         
         # Simple moving average fallback
-        if not self.state['client'] or len(historical_data) < 7:
+        if not self._llm_client or len(historical_data) < 7:
             recent = historical_data[-7:] if len(historical_data) >= 7 else historical_data
             avg = sum(d.get('sales', 0) for d in recent) / len(recent) if recent else 0
             return {
@@ -45,7 +59,7 @@ Identify:
 Format forecast as JSON array with 'day' and 'predicted_sales'."""
         
         try:
-            resp = self.state['client'].messages.create(
+            resp = self._llm_client.messages.create(
                 model='claude-3-5-sonnet-20241022',
                 max_tokens=1500,
                 messages=[{'role': 'user', 'content': prompt}]
@@ -54,4 +68,52 @@ Format forecast as JSON array with 'day' and 'predicted_sales'."""
         except:
             return {"error": "Forecasting failed"}
 
+    def forecast_array(self, sales, forecast_days: int = 30, window: int = 7):
+        """
+        Moving-average forecast for many products at once, as arrays
+
+        sales holds daily sales, one row per product (or a single 1-D series).
+        Returns an array of shape (products, forecast_days) - or (forecast_days,)
+        for one series - repeating each product's mean over its last `window`
+        days - the simple-average forecast execute() falls back to.
+
+        Raises:
+            ImportError: If numpy is not installed
+        """
+        if np is None:
+            raise ImportError("forecast_array requires numpy")
+        sales = np.asarray(sales, dtype=np.float64)
+        if sales.shape[-1] == 0:
+            return np.zeros(sales.shape[:-1] + (forecast_days,))
+        averages = sales[..., -window:].mean(axis=-1)
+        return np.repeat(averages[..., np.newaxis], forecast_days, axis=-1)
+
+    def _seasonal_forecast(self, historical_data: List[Dict], forecast_days: int):
+        """
+        Forecast from weekday seasonality and an EWMA level
+
+        Each weekday's seasonal index (its mean sales relative to the overall
+        mean) is estimated from the most recent whole weeks. Sales divided by
+        their index are smoothed with an exponentially weighted moving
+        average, and that level is projected forward through the indices.
+        Returns None when there are no positive sales to base indices on.
+        """
+        n = len(historical_data) // 7 * 7
+        sales = np.fromiter((d.get('sales', 0) for d in historical_data[-n:]), dtype=np.float64, count=n)
+
+        seasonal = sales.reshape(-1, 7).mean(axis=0)
+        if seasonal.mean() <= 0:
+            return None
+        seasonal /= seasonal.mean()
+
+        # Days whose weekday never sells (e.g. closed) carry no level information
+        indices = np.tile(seasonal, n // 7)
+        observed = indices > 0
+        weights = (1 - self.state['ewma_alpha']) ** np.arange(n - 1, -1, -1)[observed]
+        level = (weights * sales[observed] / indices[observed]).sum() / weights.sum()
+
+        # The history ends on a whole week, so day 1 has the first weekday's index
+        predicted = (level * np.resize(seasonal, forecast_days)).tolist()
+        return [{"day": i+1, "predicted_sales": p} for i, p in enumerate(predicted)]
+
 __all__ = ['SalesForecastingAgent']
@@ -15,8 +15,87 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from base.agent import BaseAgent
 from typing import List, Dict, Any, Optional
+import asyncio
+import functools
+import hashlib
 import json
 import re
+import textwrap
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+
+
+# Order number patterns, in priority order: #12345, order 12345, number 12345
+# ('order #12345' is already caught by the first)
+_ORDER_NUMBER_PATTERNS = [
+    re.compile(r'#(\d+)'),
+    re.compile(r'order\s+(\d+)', re.IGNORECASE),
+    re.compile(r'number\s+(\d+)', re.IGNORECASE),
+]
+
+# Intents and the phrases that signal them, checked in this order; anything
+# else is a general inquiry
+_INTENT_KEYWORDS = (
+    ('order_tracking', ('order', 'tracking', 'where is', 'shipped', 'delivery')),
+    ('product_inquiry', ('product', 'item', 'available', 'stock', 'price', 'cost')),
+    ('returns_refunds', ('return', 'refund', 'exchange', 'cancel')),
+    ('shipping_inquiry', ('shipping', 'delivery time', 'ship to', 'shipping cost')),
+)
+
+# Intents a store policy can answer on its own, and that policy's key
+_POLICY_INTENTS = {
+    'returns_refunds': 'returns',
+    'shipping_inquiry': 'shipping',
+}
+
+# Questions naming a policy outright. A customer talking about their own
+# order or refund (_FIRST_PERSON) is a particular case, not a general question.
+_POLICY_QUESTION = re.compile(r"\b(?:return|refund|exchange|shipping)s? polic(?:y|ies)\b", re.IGNORECASE)
+_QUESTION_START = re.compile(r"^(?:what|tell me|do you|does|how|can you|could you|where|is there)\b", re.IGNORECASE)
+_FIRST_PERSON = re.compile(r"\b(?:i|i['’](?:m|ve|d|ll)|my|mine|we|we['’](?:re|ve)|our|ours)\b", re.IGNORECASE)
+
+# Common words left out of product search keywords
+_STOP_WORDS = frozenset({'the', 'a', 'an', 'is', 'are', 'do', 'you', 'have', 'what', 'about'})
+
+
+@functools.cache
+def _shopify_http(store_url: str, api_version: str, access_token: str) -> Any:
+    """
+    Shared HTTP client for a store's Admin REST API
+
+    One per store and token, so re-initialized agents (e.g. `with agent:`
+    per request) keep reusing its open connections.
+
+    Raises:
+        ImportError: If httpx is not installed
+    """
+    import httpx
+    if not store_url.startswith(('http://', 'https://')):
+        store_url = f"https://{store_url}"
+    return httpx.Client(
+        base_url=f"{store_url.rstrip('/')}/admin/api/{api_version}/",
+        headers={'X-Shopify-Access-Token': access_token},
+        timeout=10.0
+    )
+
+
+@functools.cache
+def _token_encoding(model: str) -> Any:
+    """
+    tiktoken encoding for counting a model's tokens, or None without tiktoken
+
+    Models tiktoken doesn't know (e.g. Claude) get cl100k_base, which is close
+    enough for budgeting history.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
 
 
 class ShopifyChatbotAgent(BaseAgent):
@@ -61,6 +140,9 @@ class ShopifyChatbotAgent(BaseAgent):
             print(response)
     """
 
+    # System prompts by (store name, brand voice, policy items)
+    _SYSTEM_PROMPTS: Dict[tuple, str] = {}
+
     def _initialize(self) -> None:
         """Initialize Shopify chatbot agent"""
         # Shopify configuration
@@ -83,17 +165,38 @@ class ShopifyChatbotAgent(BaseAgent):
 
         # Chatbot settings
         self.state['max_history'] = self.config.get('max_history', 10)
+        self.state['max_history_tokens'] = self.config.get('max_history_tokens')  # None: no token budget
         self.state['enable_escalation'] = self.config.get('enable_escalation', True)
+        self.state['static_policy_replies'] = self.config.get('static_policy_replies', False)
         self.state['escalation_keywords'] = self.config.get(
             'escalation_keywords',
             ['speak to human', 'talk to person', 'representative', 'manager']
         )
 
         # Conversation state
-        self.state['messages'] = []
+        # The system message is kept apart from the conversation, which is
+        # trimmed from the front in O(1) instead of copying the list every turn
+        self.state['messages'] = deque()
+        # Token counts of the messages, while a token budget is set
+        self._message_tokens = deque()
+        self._history_tokens = 0
         self.state['conversation_id'] = None
         self.state['customer_info'] = {}
 
+        # Replies to opening messages by prompt digest, least recently used
+        # first. Kept when re-initialized, e.g. by `with agent:` per request
+        if not hasattr(self, '_response_cache'):
+            self._response_cache = OrderedDict()
+        self._response_cache_size = self.config.get('response_cache_size', 1024)
+
+        # Recent Shopify lookups: (kind, key) -> (expiry time, text), oldest first
+        if not hasattr(self, '_shopify_cache'):
+            self._shopify_cache = OrderedDict()
+        self._shopify_cache_ttl = self.config.get('shopify_cache_ttl', 60)  # seconds; 0 disables it
+
+        # Async LLM client for aexecute(), with the event loop it was made for
+        self._async_client = None
+
         # Initialize LLM client
         self._init_llm()
 
@@ -128,21 +231,25 @@ class ShopifyChatbotAgent(BaseAgent):
         else:
             self.state['llm_client'] = None
 
+        # Encoding for the history token budget (None: estimate from length)
+        self._token_encoding = None
+        if self.state['max_history_tokens']:
+            self._token_encoding = _token_encoding(self.state['model'])
+            if self._token_encoding is None:
+                self.logger.warning("tiktoken not installed, estimating history tokens. Install with: pip install tiktoken")
+
     def _init_shopify(self) -> None:
         """Initialize Shopify API client"""
         if self.state['shopify_store_url'] and self.state['shopify_access_token']:
             try:
-                import shopify
-                session = shopify.Session(
+                self.state['shopify_client'] = _shopify_http(
                     self.state['shopify_store_url'],
                     self.state['shopify_api_version'],
                     self.state['shopify_access_token']
                 )
-                shopify.ShopifyResource.activate_session(session)
-                self.state['shopify_client'] = shopify
                 self.logger.info("Shopify client initialized")
             except ImportError:
-                self.logger.warning("Shopify package not installed. Install with: pip install ShopifyAPI")
+                self.logger.warning("httpx package not installed. Install with: pip install httpx")
                 self.state['shopify_client'] = None
         else:
             self.state['shopify_client'] = None
@@ -154,14 +261,35 @@ class ShopifyChatbotAgent(BaseAgent):
         brand_voice = self.state['brand_voice']
         policies = self.state['store_policies']
 
+        # Agents for the same store (e.g. one per conversation) share the
+        # prompt; policies that can't be hashed skip the cache
+        try:
+            key = (store_name, brand_voice, tuple(policies.items()))
+            system_prompt = self._SYSTEM_PROMPTS.get(key)
+        except TypeError:
+            key = system_prompt = None
+
+        if system_prompt is None:
+            system_prompt = self._render_system_prompt(store_name, brand_voice, policies)
+            if key is not None and len(self._SYSTEM_PROMPTS) < 256:
+                self._SYSTEM_PROMPTS[key] = system_prompt
+
+        self.state['system_prompt'] = system_prompt
+        self.state['system_message'] = {
+            'role': 'system',
+            'content': system_prompt
+        }
+
+    def _render_system_prompt(self, store_name: str, brand_voice: str, policies: Dict[str, Any]) -> str:
+        """Fill in the system prompt template"""
         # Build policy information
         policy_text = ""
         if policies:
-            policy_text = "\n\nSTORE POLICIES:\n"
-            for key, value in policies.items():
-                policy_text += f"- {key.replace('_', ' ').title()}: {value}\n"
+            policy_text = "\n\nSTORE POLICIES:\n" + "".join([
+                f"- {key.replace('_', ' ').title()}: {value}\n" for key, value in policies.items()
+            ])
 
-        system_prompt = f"""You are a customer support assistant for {store_name}.
+        return f"""You are a customer support assistant for {store_name}.
 
 Your personality is {brand_voice}. Your goal is to help customers with their questions and concerns.
 
@@ -189,14 +317,6 @@ When you need to escalate to human support, respond with:
 
 Remember: You represent {store_name} - make every interaction count!"""
 
-        self.state['system_prompt'] = system_prompt
-
-        # Add system message to conversation
-        self.state['messages'].append({
-            'role': 'system',
-            'content': system_prompt
-        })
-
     def execute(
         self,
         message: str,
@@ -224,29 +344,85 @@ Remember: You represent {store_name} - make every interaction count!"""
             self.state['customer_info']['email'] = customer_email
         if customer_name:
             self.state['customer_info']['name'] = customer_name
+        if customer_email or customer_name:
+            self.state.mark_dirty('customer_info')
+
+        # Keyword checks all work on the lowercased message
+        message_lower = message.lower()
 
         # Check for escalation keywords
-        if self._should_escalate(message):
+        if self._should_escalate(message_lower):
             return self._escalate_to_human()
 
         # Extract intent and entities
-        intent = self._detect_intent(message)
+        intent = self._detect_intent(message_lower)
         self.logger.info(f"Detected intent: {intent}")
 
+        static_reply = self._static_policy_reply(message, message_lower, intent)
+        if static_reply is not None:
+            return static_reply
+
         # Gather context based on intent
-        context = self._gather_context(message, intent, customer_email)
+        context = self._gather_context(message, intent, customer_email, message_lower)
 
         # Generate response
         response = self._generate_response(message, context)
 
         return response
 
-    def _should_escalate(self, message: str) -> bool:
-        """Check if conversation should be escalated to human"""
+    async def aexecute(
+        self,
+        message: str,
+        customer_email: Optional[str] = None,
+        customer_name: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """
+        Process customer message and generate response, without blocking the event loop
+
+        Same as execute(), for async web backends: the LLM is called with
+        the provider's async client and Shopify lookups run in a worker
+        thread, so other requests are served while this one waits.
+
+        Returns:
+            Chatbot response
+        """
+        if not self._initialized:
+            self.initialize()
+
+        if customer_email:
+            self.state['customer_info']['email'] = customer_email
+        if customer_name:
+            self.state['customer_info']['name'] = customer_name
+        if customer_email or customer_name:
+            self.state.mark_dirty('customer_info')
+
+        message_lower = message.lower()
+
+        if self._should_escalate(message_lower):
+            return self._escalate_to_human()
+
+        intent = self._detect_intent(message_lower)
+        self.logger.info(f"Detected intent: {intent}")
+
+        static_reply = self._static_policy_reply(message, message_lower, intent)
+        if static_reply is not None:
+            return static_reply
+
+        # The httpx client is synchronous, so real lookups run in a worker
+        # thread; mock lookups are instant
+        if self.state['shopify_client']:
+            context = await asyncio.to_thread(self._gather_context, message, intent, customer_email, message_lower)
+        else:
+            context = self._gather_context(message, intent, customer_email, message_lower)
+
+        return await self._agenerate_response(message, context)
+
+    def _should_escalate(self, message_lower: str) -> bool:
+        """Check if conversation should be escalated to human, given the lowercased message"""
         if not self.state['enable_escalation']:
             return False
 
-        message_lower = message.lower()
         for keyword in self.state['escalation_keywords']:
             if keyword in message_lower:
                 return True
@@ -258,41 +434,56 @@ Remember: You represent {store_name} - make every interaction count!"""
         support_email = self.state['store_policies'].get('support_email', 'support@store.com')
         support_phone = self.state['store_policies'].get('support_phone', '')
 
-        response = "I understand this requires personal attention. Let me connect you with our support team.\n\n"
-        response += f"You can reach our team at:\n"
-        response += f"- Email: {support_email}\n"
+        lines = [
+            "I understand this requires personal attention. Let me connect you with our support team.\n",
+            "You can reach our team at:",
+            f"- Email: {support_email}",
+        ]
 
         if support_phone:
-            response += f"- Phone: {support_phone}\n"
+            lines.append(f"- Phone: {support_phone}")
 
-        response += "\nThey'll be happy to help you with your request!"
-
-        return response
-
-    def _detect_intent(self, message: str) -> str:
-        """Detect customer intent from message"""
-        message_lower = message.lower()
+        lines.append("\nThey'll be happy to help you with your request!")
 
-        # Order tracking
-        if any(word in message_lower for word in ['order', 'tracking', 'where is', 'shipped', 'delivery']):
-            return 'order_tracking'
+        return "\n".join(lines)
 
-        # Product inquiry
-        if any(word in message_lower for word in ['product', 'item', 'available', 'stock', 'price', 'cost']):
-            return 'product_inquiry'
+    def _detect_intent(self, message_lower: str) -> str:
+        """Detect customer intent from the lowercased message"""
+        # Plain loops rather than any() over a generator: substring checks are
+        # cheap enough that the generator's overhead dominated
+        for intent, keywords in _INTENT_KEYWORDS:
+            for keyword in keywords:
+                if keyword in message_lower:
+                    return intent
 
-        # Returns/refunds
-        if any(word in message_lower for word in ['return', 'refund', 'exchange', 'cancel']):
-            return 'returns_refunds'
+        return 'general_inquiry'
 
-        # Shipping
-        if any(word in message_lower for word in ['shipping', 'delivery time', 'ship to', 'shipping cost']):
-            return 'shipping_inquiry'
+    def _static_policy_reply(self, message: str, message_lower: str, intent: str) -> Optional[str]:
+        """
+        Answer a general question about the returns or shipping policy with the policy itself
 
-        # General inquiry
-        return 'general_inquiry'
+        Only with static_policy_replies on. The reply is added to the history
+        as if the LLM had given it. Returns None for anything else, including
+        questions mentioning an order number.
+        """
+        policy_key = _POLICY_INTENTS.get(intent)
+        if not self.state.get('static_policy_replies') or policy_key is None:
+            return None
+
+        policy = self.state['store_policies'].get(policy_key)
+        if not isinstance(policy, str) or not policy.strip():
+            return None
+        if not _POLICY_QUESTION.search(message_lower) or _FIRST_PERSON.search(message_lower):
+            return None
+        if not (_QUESTION_START.match(message_lower) or '?' in message) or self._extract_order_number(message):
+            return None
+
+        response_text = f"Our {policy_key} policy:\n{textwrap.dedent(policy).strip()}\n\nIs there anything else I can help you with?"
+        self._add_user_message(message, "")
+        self._add_assistant_message(response_text)
+        return response_text
 
-    def _gather_context(self, message: str, intent: str, customer_email: Optional[str]) -> str:
+    def _gather_context(self, message: str, intent: str, customer_email: Optional[str], message_lower: str) -> str:
         """Gather relevant context based on intent"""
         context = ""
 
@@ -306,7 +497,7 @@ Remember: You represent {store_name} - make every interaction count!"""
 
         elif intent == 'product_inquiry':
             # Extract product name/keywords
-            product_keywords = self._extract_product_keywords(message)
+            product_keywords = self._extract_product_keywords(message_lower)
             if product_keywords:
                 product_info = self._search_products(product_keywords)
                 if product_info:
@@ -325,50 +516,52 @@ Remember: You represent {store_name} - make every interaction count!"""
 
     def _extract_order_number(self, message: str) -> Optional[str]:
         """Extract order number from message"""
-        # Look for patterns like #12345, order 12345, etc.
-        patterns = [
-            r'#(\d+)',
-            r'order\s+(\d+)',
-            r'order\s+#(\d+)',
-            r'number\s+(\d+)'
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, message, re.IGNORECASE)
+        for pattern in _ORDER_NUMBER_PATTERNS:
+            match = pattern.search(message)
             if match:
                 return match.group(1)
 
         return None
 
-    def _extract_product_keywords(self, message: str) -> str:
-        """Extract product keywords from message"""
-        # Remove common words
-        stop_words = {'the', 'a', 'an', 'is', 'are', 'do', 'you', 'have', 'what', 'about'}
-        words = message.lower().split()
-        keywords = [w for w in words if w not in stop_words and len(w) > 3]
-        return ' '.join(keywords[:5])  # Top 5 keywords
+    def _extract_product_keywords(self, message_lower: str) -> str:
+        """Extract product keywords from the lowercased message"""
+        # Top 5 keywords, skipping common words
+        keywords = (w for w in message_lower.split() if len(w) > 3 and w not in _STOP_WORDS)
+        return ' '.join(islice(keywords, 5))
 
     def _get_order_info(self, order_number: str, customer_email: Optional[str]) -> Optional[str]:
         """Get order information from Shopify"""
         if not self.state['shopify_client']:
             return f"Order #{order_number} (Mock data: Your order is being processed)"
 
+        cached = self._shopify_cached('order', order_number)
+        if cached is not None:
+            return cached
+
         try:
-            shopify = self.state['shopify_client']
-            order = shopify.Order.find(order_number)
+            response = self.state['shopify_client'].get(
+                f"orders/{order_number}.json",
+                params={'fields': 'order_number,financial_status,fulfillment_status,fulfillments,total_price,currency'}
+            )
+            response.raise_for_status()
+            order = response.json().get('order')
 
             if order:
-                info = f"Order #{order.order_number}\n"
-                info += f"Status: {order.financial_status} / {order.fulfillment_status or 'Unfulfilled'}\n"
+                lines = [
+                    f"Order #{order['order_number']}",
+                    f"Status: {order['financial_status']} / {order.get('fulfillment_status') or 'Unfulfilled'}",
+                ]
 
-                if order.fulfillments:
-                    fulfillment = order.fulfillments[0]
-                    info += f"Tracking: {fulfillment.tracking_number or 'Not available yet'}\n"
-                    if fulfillment.tracking_url:
-                        info += f"Track at: {fulfillment.tracking_url}\n"
+                if order.get('fulfillments'):
+                    fulfillment = order['fulfillments'][0]
+                    lines.append(f"Tracking: {fulfillment.get('tracking_number') or 'Not available yet'}")
+                    if fulfillment.get('tracking_url'):
+                        lines.append(f"Track at: {fulfillment['tracking_url']}")
 
-                info += f"Total: ${order.total_price} {order.currency}\n"
+                lines.append(f"Total: ${order['total_price']} {order['currency']}\n")
+                info = "\n".join(lines)
 
+                self._shopify_cache_put('order', order_number, info)
                 return info
 
         except Exception as e:
@@ -381,19 +574,30 @@ Remember: You represent {store_name} - make every interaction count!"""
         if not self.state['shopify_client']:
             return f"Product search results for '{keywords}' (Mock data)"
 
+        # The same products are listed whatever the keywords
+        cached = self._shopify_cached('products', '')
+        if cached is not None:
+            return cached
+
         try:
-            shopify = self.state['shopify_client']
-            products = shopify.Product.find(limit=3)
+            response = self.state['shopify_client'].get(
+                'products.json',
+                params={'limit': 3, 'fields': 'title,variants'}
+            )
+            response.raise_for_status()
+            products = response.json().get('products')
 
             if products:
-                info = ""
+                lines = []
                 for product in products[:3]:
-                    info += f"\n- {product.title}\n"
-                    if product.variants:
-                        variant = product.variants[0]
-                        info += f"  Price: ${variant.price}\n"
-                        info += f"  Available: {'Yes' if variant.inventory_quantity > 0 else 'No'}\n"
-
+                    lines.append(f"\n- {product['title']}\n")
+                    if product.get('variants'):
+                        variant = product['variants'][0]
+                        lines.append(f"  Price: ${variant['price']}\n")
+                        lines.append(f"  Available: {'Yes' if (variant.get('inventory_quantity') or 0) > 0 else 'No'}\n")
+                info = "".join(lines)
+
+                self._shopify_cache_put('products', '', info)
                 return info
 
         except Exception as e:
@@ -401,58 +605,78 @@ Remember: You represent {store_name} - make every interaction count!"""
 
         return None
 
+    def _shopify_cached(self, kind: str, key: str) -> Optional[str]:
+        """Get a Shopify lookup made within the last shopify_cache_ttl seconds"""
+        entry = self._shopify_cache.get((kind, key))
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._shopify_cache[(kind, key)]
+            return None
+        return entry[1]
+
+    def _shopify_cache_put(self, kind: str, key: str, text: str) -> None:
+        """Remember a Shopify lookup, dropping the oldest beyond 256 entries"""
+        if self._shopify_cache_ttl <= 0:
+            return
+        self._shopify_cache.pop((kind, key), None)
+        self._shopify_cache[(kind, key)] = (time.monotonic() + self._shopify_cache_ttl, text)
+        if len(self._shopify_cache) > 256:
+            self._shopify_cache.popitem(last=False)
+
     def _generate_response(self, message: str, context: str = "") -> str:
         """Generate chatbot response using LLM"""
-        # Add user message to history
-        user_message = message
-        if context:
-            user_message = f"{message}\n\n[Context: {context}]"
-
-        self.state['messages'].append({
-            'role': 'user',
-            'content': user_message
-        })
+        cache_key = self._add_user_message(message, context)
 
         # Generate response
         if not self.state['llm_client']:
             response_text = f"I'd be happy to help you with: {message}\n\n{context}"
         else:
-            try:
-                provider = self.state['llm_provider']
+            response_text = self._cached_response(cache_key) if cache_key else None
+            if response_text is None:
+                response_text = self._request_response(cache_key)
 
-                if provider == 'anthropic':
-                    client = self.state['llm_client']
+        self._add_assistant_message(response_text)
+        return response_text
 
-                    # Separate system message
-                    system_msg = self.state['system_prompt']
-                    conversation = [m for m in self.state['messages'] if m['role'] != 'system']
+    async def _agenerate_response(self, message: str, context: str = "") -> str:
+        """Generate chatbot response using the async LLM client"""
+        cache_key = self._add_user_message(message, context)
 
-                    response = client.messages.create(
-                        model=self.state['model'],
-                        max_tokens=512,
-                        system=system_msg,
-                        messages=conversation
-                    )
-                    response_text = response.content[0].text
+        if not self.state['llm_client']:
+            response_text = f"I'd be happy to help you with: {message}\n\n{context}"
+        else:
+            response_text = self._cached_response(cache_key) if cache_key else None
+            if response_text is None:
+                response_text = await self._arequest_response(cache_key)
 
-                elif provider == 'openai':
-                    client = self.state['llm_client']
+        self._add_assistant_message(response_text)
+        return response_text
 
-                    response = client.chat.completions.create(
-                        model=self.state.get('model', 'gpt-4'),
-                        messages=self.state['messages'],
-                        max_tokens=512
-                    )
-                    response_text = response.choices[0].message.content
+    def _add_user_message(self, message: str, context: str) -> Optional[str]:
+        """
+        Add the customer's message, with its context, to the history
 
-                else:
-                    response_text = "I'm here to help! Please let me know what you need."
+        Returns the response cache key if this opens the conversation: an
+        opening message gets the reply it got last time, while later ones
+        depend on the conversation.
+        """
+        user_message = message
+        if context:
+            user_message = f"{message}\n\n[Context: {context}]"
 
-            except Exception as e:
-                self.logger.error(f"LLM error: {e}")
-                response_text = "I apologize, but I'm having trouble processing that. Could you please rephrase?"
+        self.state['messages'].append({
+            'role': 'user',
+            'content': user_message
+        })
+        self.state.mark_dirty('messages')
 
-        # Add response to history
+        if len(self.state['messages']) == 1 and self.state['llm_client']:
+            return self._response_cache_key(user_message)
+        return None
+
+    def _add_assistant_message(self, response_text: str) -> None:
+        """Add the reply to the history and trim it"""
         self.state['messages'].append({
             'role': 'assistant',
             'content': response_text
@@ -460,24 +684,202 @@ Remember: You represent {store_name} - make every interaction count!"""
 
         # Trim history
         self._trim_history()
+        self.state.mark_dirty('messages')
+
+    def _request_response(self, cache_key: Optional[str]) -> str:
+        """Ask the LLM to reply to the conversation, caching the reply under cache_key if given"""
+        try:
+            provider = self.state['llm_provider']
+
+            if provider == 'anthropic':
+                client = self.state['llm_client']
+
+                response = client.messages.create(
+                    model=self.state['model'],
+                    max_tokens=512,
+                    system=self.state['system_prompt'],
+                    messages=list(self.state['messages'])
+                )
+                response_text = response.content[0].text
 
+            elif provider == 'openai':
+                client = self.state['llm_client']
+
+                response = client.chat.completions.create(
+                    model=self.state.get('model', 'gpt-4'),
+                    messages=self.get_conversation_history(),
+                    max_tokens=512
+                )
+                response_text = response.choices[0].message.content
+
+            else:
+                return "I'm here to help! Please let me know what you need."
+
+        except Exception as e:
+            self.logger.error(f"LLM error: {e}")
+            return "I apologize, but I'm having trouble processing that. Could you please rephrase?"
+
+        if cache_key:
+            self._cache_response(cache_key, response_text)
         return response_text
 
+    async def _arequest_response(self, cache_key: Optional[str]) -> str:
+        """_request_response() with the async LLM client"""
+        try:
+            provider = self.state['llm_provider']
+            client = self._async_llm_client()
+
+            if provider == 'anthropic':
+                response = await client.messages.create(
+                    model=self.state['model'],
+                    max_tokens=512,
+                    system=self.state['system_prompt'],
+                    messages=list(self.state['messages'])
+                )
+                response_text = response.content[0].text
+
+            elif provider == 'openai':
+                response = await client.chat.completions.create(
+                    model=self.state.get('model', 'gpt-4'),
+                    messages=self.get_conversation_history(),
+                    max_tokens=512
+                )
+                response_text = response.choices[0].message.content
+
+            else:
+                return "I'm here to help! Please let me know what you need."
+
+        except Exception as e:
+            self.logger.error(f"LLM error: {e}")
+            return "I apologize, but I'm having trouble processing that. Could you please rephrase?"
+
+        if cache_key:
+            self._cache_response(cache_key, response_text)
+        return response_text
+
+    def _async_llm_client(self) -> Any:
+        """
+        Get the async LLM client for the running event loop
+
+        Async clients hold connections bound to the loop they were used on,
+        so a new one is made when aexecute() runs under a different loop
+        (e.g. successive asyncio.run() calls).
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client[0] is not loop:
+            if self.state['llm_provider'] == 'anthropic':
+                import anthropic
+                client = anthropic.AsyncAnthropic(api_key=self.state['llm_api_key'])
+            else:
+                import openai
+                client = openai.AsyncOpenAI(api_key=self.state['llm_api_key'])
+            self._async_client = (loop, client)
+        return self._async_client[1]
+
+    def _response_cache_key(self, user_message: str) -> str:
+        """Digest of everything that determines the reply to an opening message"""
+        key = f"{self.state['llm_provider']}\0{self.state['model']}\0{self.state['system_prompt']}\0{user_message}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _cached_response(self, key: str) -> Optional[str]:
+        """Get a cached reply, marking it recently used"""
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            self._response_cache.move_to_end(key)
+        return cached
+
+    def _cache_response(self, key: str, response_text: str) -> None:
+        """Remember a reply, evicting the least recently used"""
+        if self._response_cache_size <= 0:
+            return
+        self._response_cache[key] = response_text
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > self._response_cache_size:
+            self._response_cache.popitem(last=False)
+
     def _trim_history(self) -> None:
-        """Trim message history"""
+        """Trim message history to max_history messages and max_history_tokens tokens"""
+        messages = self.state['messages']
+        if not isinstance(messages, deque):
+            # Restored from a saved state without load_state(), as a plain list
+            self._upgrade_state()
+            messages = self.state['messages']
+
+        # Not deque(maxlen=...): the next user message would then push out the
+        # oldest message, leaving an assistant turn first
         max_history = self.state['max_history']
+        max_tokens = self.state['max_history_tokens']
+        if not max_tokens:
+            while len(messages) > max_history:
+                messages.popleft()
+            return
+
+        # Count only the messages added since the last trim; the running
+        # total drops with each message trimmed
+        counts = self._message_tokens
+        if len(counts) > len(messages):
+            counts.clear()
+            self._history_tokens = 0
+        for message in islice(messages, len(counts), None):
+            count = self._count_tokens(message['content'])
+            counts.append(count)
+            self._history_tokens += count
+
+        while len(messages) > max_history or self._history_tokens > max_tokens:
+            messages.popleft()
+            self._history_tokens -= counts.popleft()
+        # Start the history on a customer message
+        while messages and messages[0]['role'] != 'user':
+            messages.popleft()
+            self._history_tokens -= counts.popleft()
+
+    def _count_tokens(self, text: str) -> int:
+        """Number of tokens in text, or about a quarter of its length without tiktoken"""
+        if self._token_encoding is not None:
+            return len(self._token_encoding.encode(text))
+        return len(text) // 4 + 1
+
+    def load_state(self, filepath: str) -> None:
+        """Load agent state from file, including files saved by older versions"""
+        super().load_state(filepath)
+        self._upgrade_state()
+
+    def _upgrade_state(self) -> None:
+        """
+        Bring restored state up to date and turn its history back into a deque
 
-        if len(self.state['messages']) > max_history + 1:
-            system_msg = self.state['messages'][0]
-            self.state['messages'] = [system_msg] + self.state['messages'][-(max_history):]
+        State saved before the system message was kept apart has it at the
+        start of 'messages', and lacks the keys added since.
+        """
+        state = self.state
+        messages = list(state.get('messages', []))
+        if messages and messages[0].get('role') == 'system':
+            system_msg = messages.pop(0)
+            state.setdefault('system_prompt', system_msg['content'])
+        if 'system_message' not in state:
+            if 'system_prompt' in state:
+                state['system_message'] = {'role': 'system', 'content': state['system_prompt']}
+            else:
+                self._build_system_prompt()
+        if 'max_history_tokens' not in state:
+            state['max_history_tokens'] = self.config.get('max_history_tokens')
+        if 'static_policy_replies' not in state:
+            state['static_policy_replies'] = self.config.get('static_policy_replies', False)
+        state['messages'] = deque(messages)
+        # Token counts are taken again at the next trim
+        self._message_tokens = deque()
+        self._history_tokens = 0
 
     def get_conversation_history(self) -> List[Dict[str, str]]:
-        """Get conversation history"""
-        return self.state['messages']
+        """Get conversation history, starting with the system message"""
+        return [self.state['system_message'], *self.state['messages']]
 
     def reset_conversation(self) -> None:
         """Reset conversation"""
-        self.state['messages'] = [self.state['messages'][0]]  # Keep system message
+        self.state['messages'].clear()  # The system message is kept apart
+        self.state.mark_dirty('messages')
+        self._message_tokens.clear()
+        self._history_tokens = 0
         self.state['customer_info'] = {}
         self.logger.info("Conversation reset")
 
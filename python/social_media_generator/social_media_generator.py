@@ -11,9 +11,23 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from base.agent import BaseAgent
 from typing import List, Dict, Any, Optional
+import asyncio
 import json
 
 
+# Hashtags to ask for, by platform
+_HASHTAG_COUNTS = {'instagram': 15, 'facebook': 5, 'twitter': 3, 'linkedin': 5}
+
+
+def _event_loop_running() -> bool:
+    """Whether this thread is already running an event loop, so asyncio.run() can't be used"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
 class SocialMediaGenerator(BaseAgent):
     """Generate social media content for multiple platforms"""
 
@@ -24,6 +38,7 @@ class SocialMediaGenerator(BaseAgent):
         self.state['brand_voice'] = self.config.get('brand_voice', 'friendly and engaging')
         self.state['target_audience'] = self.config.get('target_audience', 'general audience')
         self.state['business_type'] = self.config.get('business_type', 'business')
+        self.state['max_concurrency'] = self.config.get('max_concurrency', 8)  # LLM requests at once
         
         self._init_llm()
 
@@ -63,12 +78,57 @@ class SocialMediaGenerator(BaseAgent):
         if not self._initialized:
             self.initialize()
 
+        # The caption and hashtags are independent, so their LLM calls run
+        # concurrently - unless this is already inside an event loop (e.g. a
+        # notebook), where they run one after the other
+        if self.state['llm_client'] and not _event_loop_running():
+            return asyncio.run(self.aexecute(topic, platform, content_type, product_name, image_description))
+
         # Generate caption
         caption = self._generate_caption(topic, platform, content_type, product_name, image_description)
         
         # Generate hashtags
         hashtags = self._generate_hashtags(topic, platform)
-        
+
+        return self._build_post(caption, hashtags, platform, content_type)
+
+    async def aexecute(
+        self,
+        topic: str,
+        platform: str = 'instagram',
+        content_type: str = 'promotional',
+        product_name: Optional[str] = None,
+        image_description: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Generate social media content from async code
+
+        Same as execute(); the caption and hashtag LLM calls run concurrently.
+        """
+        if not self._initialized:
+            self.initialize()
+
+        if not self.state['llm_client']:
+            return self.execute(topic, platform, content_type, product_name, image_description)
+
+        import anthropic
+        async with anthropic.AsyncAnthropic(api_key=self.state['llm_api_key']) as client:
+            return await self._agenerate_post(
+                client, asyncio.Semaphore(self.state['max_concurrency']),
+                topic, platform, content_type, product_name, image_description
+            )
+
+    async def _agenerate_post(self, client, limit, topic, platform, content_type='promotional',
+                              product_name=None, image_desc=None) -> Dict[str, Any]:
+        """Generate one post's caption and hashtags concurrently on an async client"""
+        caption, hashtags = await asyncio.gather(
+            self._agenerate_caption(client, limit, topic, platform, content_type, product_name, image_desc),
+            self._agenerate_hashtags(client, limit, topic, platform)
+        )
+        return self._build_post(caption, hashtags, platform, content_type)
+
+    def _build_post(self, caption: str, hashtags: List[str], platform: str, content_type: str) -> Dict[str, Any]:
         # Suggest posting time
         best_time = self._suggest_posting_time(platform, content_type)
         
@@ -89,6 +149,29 @@ class SocialMediaGenerator(BaseAgent):
         if not self.state['llm_client']:
             return f"Check out our amazing {topic}! #awesome #{topic.replace(' ', '')}"
 
+        try:
+            response = self.state['llm_client'].messages.create(
+                model=self.state['model'],
+                max_tokens=300,
+                messages=[{'role': 'user', 'content': self._caption_prompt(topic, platform, content_type, product_name, image_desc)}]
+            )
+            return response.content[0].text.strip()
+        except:
+            return f"Exciting news about {topic}! Learn more."
+
+    async def _agenerate_caption(self, client, limit, topic, platform, content_type, product_name, image_desc) -> str:
+        try:
+            async with limit:
+                response = await client.messages.create(
+                    model=self.state['model'],
+                    max_tokens=300,
+                    messages=[{'role': 'user', 'content': self._caption_prompt(topic, platform, content_type, product_name, image_desc)}]
+                )
+            return response.content[0].text.strip()
+        except:
+            return f"Exciting news about {topic}! Learn more."
+
+    def _caption_prompt(self, topic, platform, content_type, product_name, image_desc) -> str:
         platform_limits = {
             'instagram': 2200,
             'twitter': 280,
@@ -96,7 +179,7 @@ class SocialMediaGenerator(BaseAgent):
             'linkedin': 700
         }
 
-        prompt = f"""Create a {content_type} social media caption for {platform}.
+        return f"""Create a {content_type} social media caption for {platform}.
 
 Topic: {topic}
 Product: {product_name or 'N/A'}
@@ -114,24 +197,38 @@ Requirements:
 
 Write just the caption:"""
 
+    def _generate_hashtags(self, topic: str, platform: str) -> List[str]:
+        max_tags = _HASHTAG_COUNTS.get(platform, 5)
+        
+        if not self.state['llm_client']:
+            return [f"#{topic.replace(' ', '')}", "#business", "#today"]
+
         try:
             response = self.state['llm_client'].messages.create(
                 model=self.state['model'],
-                max_tokens=300,
-                messages=[{'role': 'user', 'content': prompt}]
+                max_tokens=150,
+                messages=[{'role': 'user', 'content': self._hashtag_prompt(topic, platform, max_tags)}]
             )
-            return response.content[0].text.strip()
+            return self._parse_hashtags(response.content[0].text, max_tags)
         except:
-            return f"Exciting news about {topic}! Learn more."
+            return [f"#{topic.replace(' ', '')}"]
 
-    def _generate_hashtags(self, topic: str, platform: str) -> List[str]:
-        counts = {'instagram': 15, 'facebook': 5, 'twitter': 3, 'linkedin': 5}
-        max_tags = counts.get(platform, 5)
-        
-        if not self.state['llm_client']:
-            return [f"#{topic.replace(' ', '')}", "#business", "#today"]
+    async def _agenerate_hashtags(self, client, limit, topic: str, platform: str) -> List[str]:
+        max_tags = _HASHTAG_COUNTS.get(platform, 5)
 
-        prompt = f"""Generate {max_tags} relevant hashtags for a {platform} post about: {topic}
+        try:
+            async with limit:
+                response = await client.messages.create(
+                    model=self.state['model'],
+                    max_tokens=150,
+                    messages=[{'role': 'user', 'content': self._hashtag_prompt(topic, platform, max_tags)}]
+                )
+            return self._parse_hashtags(response.content[0].text, max_tags)
+        except:
+            return [f"#{topic.replace(' ', '')}"]
+
+    def _hashtag_prompt(self, topic: str, platform: str, max_tags: int) -> str:
+        return f"""Generate {max_tags} relevant hashtags for a {platform} post about: {topic}
 
 Requirements:
 - Mix of popular and niche hashtags
@@ -139,16 +236,9 @@ Requirements:
 - No spaces in hashtags
 - Return ONLY hashtags, one per line, starting with #"""
 
-        try:
-            response = self.state['llm_client'].messages.create(
-                model=self.state['model'],
-                max_tokens=150,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
-            tags = [line.strip() for line in response.content[0].text.strip().split('\n') if line.strip().startswith('#')]
-            return tags[:max_tags]
-        except:
-            return [f"#{topic.replace(' ', '')}"]
+    def _parse_hashtags(self, text: str, max_tags: int) -> List[str]:
+        tags = [line.strip() for line in text.strip().split('\n') if line.strip().startswith('#')]
+        return tags[:max_tags]
 
     def _suggest_posting_time(self, platform: str, content_type: str) -> str:
         best_times = {
@@ -169,12 +259,30 @@ Requirements:
             return f"{caption}\n\n{' '.join(hashtags)}"
 
     def generate_campaign(self, topic: str, platforms: List[str]) -> Dict[str, Any]:
-        """Generate content for multiple platforms"""
+        """Generate content for multiple platforms, with all LLM calls running concurrently"""
+        if not self._initialized:
+            self.initialize()
+
+        if self.state['llm_client'] and not _event_loop_running():
+            posts = asyncio.run(self._agenerate_campaign(topic, platforms))
+            return dict(zip(platforms, posts))
+
         return {
             platform: self.execute(topic, platform)
             for platform in platforms
         }
 
+    async def _agenerate_campaign(self, topic: str, platforms: List[str]) -> List[Dict[str, Any]]:
+        """Generate every platform's post concurrently on one async client"""
+        import anthropic
+
+        limit = asyncio.Semaphore(self.state['max_concurrency'])
+
+        async with anthropic.AsyncAnthropic(api_key=self.state['llm_api_key']) as client:
+            return await asyncio.gather(*[
+                self._agenerate_post(client, limit, topic, platform) for platform in platforms
+            ])
+
 
 if __name__ == '__main__':
     print("Social Media Content Generator Example")
@@ -15,9 +15,16 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from base.agent import BaseAgent
 from typing import Callable, Dict, Any, Optional, List
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import time
 import threading
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 class Task:
     """Represents a scheduled task"""
@@ -59,7 +66,7 @@ class TaskSchedulerAgent(BaseAgent):
     - Schedule one-time or recurring tasks
     - Interval-based scheduling (every N seconds/minutes/hours)
     - Task dependencies
-    - Async execution
+    - Async execution (one asyncio event loop, task bodies on a shared thread pool)
     - Task history
 
     Example:
@@ -77,7 +84,10 @@ class TaskSchedulerAgent(BaseAgent):
         self.state['tasks'] = {}
         self.state['running'] = False
         self.state['thread'] = None
+        self.state['loop'] = None
+        self.state['executor'] = None
         self.state['history'] = []
+        self.max_workers = self.config.get('max_workers', 4)
 
     def add_task(
         self,
@@ -134,6 +144,11 @@ class TaskSchedulerAgent(BaseAgent):
         self.state['tasks'][name] = task
         self.logger.info(f"Task '{name}' added to scheduler")
 
+        # Tasks added while the scheduler runs get their own timer right away
+        loop = self.state['loop']
+        if self.state['running'] and loop is not None:
+            asyncio.run_coroutine_threadsafe(self._task_loop(task), loop)
+
         return self
 
     def remove_task(self, name: str) -> None:
@@ -236,6 +251,12 @@ class TaskSchedulerAgent(BaseAgent):
             return
 
         self.state['running'] = True
+        # libuv-based loop when available, otherwise the stdlib one
+        self.state['loop'] = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+        self.state['executor'] = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=self.name
+        )
         self.logger.info("Starting scheduler")
 
         if blocking:
@@ -247,19 +268,73 @@ class TaskSchedulerAgent(BaseAgent):
     def stop(self) -> None:
         """Stop the scheduler"""
         self.state['running'] = False
+
+        loop = self.state['loop']
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(loop.stop)
+            except RuntimeError:
+                pass  # Loop closed in the meantime
+
         if self.state['thread']:
             self.state['thread'].join(timeout=5)
+            self.state['thread'] = None
         self.logger.info("Scheduler stopped")
 
     def _run_loop(self) -> None:
-        """Main scheduler loop"""
-        while self.state['running']:
+        """
+        Run the scheduler event loop until stop() is called
+
+        Each task gets one timer coroutine on this loop, so the scheduler uses
+        a single thread no matter how many tasks are registered.
+        """
+        loop = self.state['loop']
+        asyncio.set_event_loop(loop)
+
+        try:
+            for task in list(self.state['tasks'].values()):
+                loop.create_task(self._task_loop(task))
+            loop.run_forever()
+        finally:
+            self.state['running'] = False
+
+            pending = asyncio.all_tasks(loop)
+            for pending_task in pending:
+                pending_task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+            self.state['executor'].shutdown(wait=False)
+            self.state['loop'] = None
+            self.state['executor'] = None
+
+    async def _task_loop(self, task: Task) -> None:
+        """Sleep until a task is due, run it on the thread pool, repeat"""
+        loop = asyncio.get_running_loop()
+        # Bound once, outside the loop
+        run_in_executor = loop.run_in_executor
+        execute_task = self._execute_task
+
+        # Stop once the task is removed (or replaced) or has no next run
+        while self.state['running'] and self.state['tasks'].get(task.name) is task:
+            if task.next_run is None:
+                return
+
+            delay = (task.next_run - datetime.now()).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            if not task.enabled:
+                await asyncio.sleep(1.0)
+                continue
+
             try:
-                self.execute()
+                await run_in_executor(self.state['executor'], execute_task, task)
             except Exception as e:
                 self.logger.error(f"Scheduler error: {str(e)}")
-
-            time.sleep(1)  # Check every second
+                # A failed run stays due; retry after a second like before
+                await asyncio.sleep(1.0)
 
     def get_tasks(self) -> Dict[str, Dict]:
         """Get all tasks and their status"""